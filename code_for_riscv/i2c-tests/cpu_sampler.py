@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Загрузка CPU по приращениям счетчиков /proc/stat.
+
+Счетчики в /proc/stat накапливаются с момента загрузки, поэтому загрузка
+за интервал считается как разность двух снимков. Файл открывается один
+раз, каждый снимок - это один os.pread с нулевого смещения (procfs
+формирует содержимое заново при чтении с начала).
+
+Столбцы строки cpuN: user nice system idle iowait irq softirq steal
+guest guest_nice. guest и guest_nice уже входят в user и nice, поэтому в
+сумму не добавляются.
+"""
+
+import os
+from collections import namedtuple
+
+STAT_PATH = "/proc/stat"
+FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+# Доли времени за интервал, %; busy - всё, кроме idle и iowait
+CpuUsage = namedtuple('CpuUsage', ['busy', 'user', 'system', 'iowait', 'irq', 'softirq', 'steal', 'idle'])
+IDLE_USAGE = CpuUsage(0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 100.0)
+
+
+def parse_stat(text):
+    """Текст /proc/stat -> {'cpu': (счетчики), 'cpu0': ..., ...}"""
+    counters = {}
+    for line in text.splitlines():
+        if not line.startswith('cpu'):
+            # Строки cpu идут первыми
+            if counters:
+                break
+            continue
+        parts = line.split()
+        values = [int(value) for value in parts[1:len(FIELDS) + 1]]
+        values += [0] * (len(FIELDS) - len(values))
+        counters[parts[0]] = tuple(values)
+    return counters
+
+
+def usage_between(old, new):
+    """Загрузка между двумя снимками счетчиков одного процессора"""
+    delta = [max(b - a, 0) for a, b in zip(old, new)]
+    total = sum(delta)
+    if total == 0:
+        return IDLE_USAGE
+    user, nice, system, idle, iowait, irq, softirq, steal = (100.0 * value / total for value in delta)
+    return CpuUsage(busy=100.0 - idle - iowait, user=user + nice, system=system, iowait=iowait,
+                    irq=irq, softirq=softirq, steal=steal, idle=idle)
+
+
+class CpuSampler:
+    """Загрузка всех процессоров за интервал между вызовами sample()"""
+
+    def __init__(self, path=STAT_PATH):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buffer_size = 8192
+        self.previous = self.read()
+        self.usage = {name: IDLE_USAGE for name in self.previous}
+
+    def read(self):
+        """Текущие счетчики одним чтением"""
+        while True:
+            data = os.pread(self.fd, self.buffer_size, 0)
+            if len(data) < self.buffer_size:
+                return parse_stat(data.decode('ascii', errors='replace'))
+            # Много ядер - файл не поместился в буфер
+            self.buffer_size *= 2
+
+    def sample(self):
+        """Загрузка с прошлого вызова: {'cpu': CpuUsage, 'cpu0': CpuUsage, ...}"""
+        current = self.read()
+        self.usage = {name: usage_between(self.previous.get(name, values), values)
+                      for name, values in current.items()}
+        self.previous = current
+        return self.usage
+
+    @property
+    def total(self):
+        """Общая загрузка по последнему sample()"""
+        return self.usage.get('cpu', IDLE_USAGE)
+
+    def cores(self):
+        """Загрузка отдельных процессоров по номеру"""
+        return [self.usage[name] for name in sorted((n for n in self.usage if n != 'cpu'),
+                                                     key=lambda n: int(n[3:]))]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+if __name__ == "__main__":
+    import time
+
+    sampler = CpuSampler()
+    try:
+        while True:
+            time.sleep(1)
+            usage = sampler.sample()
+            print("  ".join(f"{name}: {u.busy:5.1f}% io {u.iowait:4.1f} irq {u.irq + u.softirq:4.1f}"
+                            for name, u in usage.items()))
+    except KeyboardInterrupt:
+        pass
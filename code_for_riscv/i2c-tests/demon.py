@@ -3,19 +3,29 @@
 Программа для вывода системной информации и всех логов ядра на SSD1306 дисплей
 """
 
-import time
-import subprocess
+import argparse
+import sys
 from datetime import datetime
-from luma.core.interface.serial import i2c
-from luma.oled.device import ssd1306
-from luma.core.render import canvas
-from PIL import ImageFont
+from PIL import ImageDraw, ImageFont
+
+from cpu_sampler import CpuSampler
+from kmsg_reader import KernelLog
+import low_interference
+import monitor_profiler
+import oled_backend
+from oled_framebuffer import FramebufferDisplay
+from oled_scheduler import OledScheduler
+from oled_text import LogView, TextRenderer
 
 class SystemInfoDisplay:
-    def __init__(self):
+    def __init__(self, device=None):
         # Инициализация дисплея
-        self.serial = i2c(port=0, address=0x3C)
-        self.device = ssd1306(self.serial, width=128, height=64)
+        # Устройство luma по умолчанию; эмулятор или native - через oled_backend
+        self.device = device if device is not None else oled_backend.create_device()
+        # По I2C передаются только изменившиеся страницы экрана
+        self.screen = FramebufferDisplay(self.device)
+        self.kernel_log = KernelLog(maxlen=8)
+        self.cpu = CpuSampler()
         
         # Загрузка шрифтов
         try:
@@ -25,116 +35,81 @@ class SystemInfoDisplay:
             print("Шрифты не найдены, используем встроенные")
             self.font_small = None
             self.font_medium = None
+
+        # Строки растеризуются один раз и берутся из кэша; сообщения
+        # переносятся по ширине экрана при поступлении, а не в каждом кадре
+        self.header_text = TextRenderer(self.font_medium, width=128, line_height=14)
+        self.log_text = TextRenderer(self.font_small, width=128, line_height=10)
+        self.log_view = LogView(self.log_text, lines=5)
     
     def get_cpu_usage(self):
-        """Получение загрузки CPU"""
-        try:
-            with open('/proc/stat', 'r') as f:
-                first_line = f.readline().strip()
-            
-            parts = first_line.split()
-            if len(parts) >= 5:
-                user = int(parts[1])
-                nice = int(parts[2])
-                system = int(parts[3])
-                idle = int(parts[4])
-                total = user + nice + system + idle
-                usage = ((total - idle) / total) * 100
-                return usage
-            return 0.0
-        except:
-            return 0.0
-    
-    def wrap_text(self, text, max_length=24):
-        """Разбивает текст на строки с переносами"""
-        if len(text) <= max_length:
-            return [text]
-        
-        lines = []
-        words = text.split()
-        current_line = ""
-        
-        for word in words:
-            if len(current_line + " " + word) <= max_length:
-                if current_line:
-                    current_line += " " + word
-                else:
-                    current_line = word
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        
-        if current_line:
-            lines.append(current_line)
-        
-        return lines
+        """Получение загрузки CPU с прошлого обновления экрана"""
+        return self.cpu.sample()['cpu'].busy
     
     def get_kernel_logs(self, max_lines=5):
-        """Получение ВСЕХ логов ядра без фильтрации"""
-        try:
-            # Получаем все сообщения из dmesg без фильтров
-            result = subprocess.check_output(
-                ["dmesg"],  # Без параметров уровня - выводим всё
-                stderr=subprocess.DEVNULL,
-                timeout=2
-            ).decode('utf-8', errors='ignore')
-            
-            all_lines = []
-            raw_lines = result.strip().split('\n')[-8:]  # Берем последние 8 строк
-            
-            for line in raw_lines:
-                if line.strip():
-                    # Извлекаем сообщение (после временной метки)
-                    if ']' in line:
-                        message = line.split(']', 1)[1].strip()
-                    else:
-                        message = line.strip()
-                    
-                    # Разбиваем на строки с переносами
-                    wrapped_lines = self.wrap_text(message)
-                    all_lines.extend(wrapped_lines)
-            
-            return all_lines[-max_lines:] if all_lines else ["No kernel messages"]
-            
-        except subprocess.TimeoutExpired:
-            return ["Logs timeout"]
-        except Exception as e:
-            return [f"Error: {str(e)[:20]}"]
+        """Получение ВСЕХ логов ядра без фильтрации; возвращает видимые строки"""
+        # Дочитываем только новые записи /dev/kmsg, без запуска dmesg
+        added = self.kernel_log.poll()
+        if added:
+            for message in self.kernel_log.messages(min(added, len(self.kernel_log.records))):
+                if message.strip():
+                    self.log_view.append(message)
+        if self.kernel_log.error and not self.kernel_log.records:
+            self.log_view.set_placeholder(f"Error: {self.kernel_log.error[:20]}")
+        else:
+            self.log_view.set_placeholder("No kernel messages")
+
+        self.log_view.lines = max_lines
+        return tuple(self.log_view.visible())
     
     def display_system_info(self):
         """Отображение системной информации и логов"""
-        cpu_usage = self.get_cpu_usage()
-        
-        with canvas(self.device) as draw:
+        self.render({
+            'clock': datetime.now().strftime('%H:%M'),
+            'cpu': self.get_cpu_usage(),
+            'logs': self.get_kernel_logs(5),
+        })
+
+    def render(self, values):
+        """Кадр по текущим значениям источников"""
+        with self.screen.canvas() as image:
             # Заголовок с временем и CPU в printf-стиле
-            header_text = "Time: %s CPU: %.1f%%" % (datetime.now().strftime('%H:%M'), cpu_usage)
-            draw.text((0, 0), header_text, font=self.font_medium, fill="white")
+            header_text = "Time: %s CPU: %.1f%%" % (values['clock'], values['cpu'])
+            image.paste(self.header_text.line(header_text), (0, 0))
             
             # Разделительная линия
-            draw.line((0, 14, 128, 14), fill="white", width=1)
+            ImageDraw.Draw(image).line((0, 14, 128, 14), fill="white", width=1)
             
-            # Логи ядра - 5 строк с переносами
-            logs = self.get_kernel_logs(5)
-            
-            # Выводим логи на оставшееся пространство
-            for i, log in enumerate(logs):
-                y_position = 16 + i * 10
-                draw.text((0, y_position), log, font=self.font_small, fill="white")
+            # Логи ядра - готовые строки из кэша, по 10 пикселей
+            for i, log in enumerate(values['logs']):
+                image.paste(self.log_text.line(log), (0, 16 + i * 10))
     
     def run(self):
-        """Основной цикл"""
+        """Основной цикл: экран обновляется только при изменении данных"""
         print("Запуск монитора системы на SSD1306...")
         print("Вывод ВСЕХ логов ядра без фильтрации")
+        scheduler = OledScheduler(self.render)
+        scheduler.every('clock', 1, lambda: datetime.now().strftime('%H:%M'))
+        scheduler.every('cpu', 3, lambda: round(self.get_cpu_usage(), 1))
+        scheduler.on_readable('logs', self.kernel_log.fileno(), lambda: self.get_kernel_logs(5))
         try:
-            while True:
-                self.display_system_info()
-                time.sleep(3)
-        except KeyboardInterrupt:
+            scheduler.run()
             print("\nОстановка...")
         finally:
             self.device.clear()
 
 if __name__ == "__main__":
-    display = SystemInfoDisplay()
+    parser = argparse.ArgumentParser(description="Системная информация и логи ядра на SSD1306")
+    monitor_profiler.add_arguments(parser)
+    low_interference.add_arguments(parser)
+    oled_backend.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = monitor_profiler.from_arguments(args)
+
+    display = SystemInfoDisplay(device=oled_backend.from_arguments(args))
+    if profiler:
+        profiler.instrument_display(display)
+    low_interference.from_arguments(args)
     display.run()
+    if profiler and not profiler.report(args.profile or None):
+        sys.exit(1)
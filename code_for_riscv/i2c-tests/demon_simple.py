@@ -3,85 +3,79 @@
 Упрощенная версия с надежным получением CPU использования
 """
 
-import time
-import subprocess
+import argparse
+import sys
 from datetime import datetime
-from luma.core.interface.serial import i2c
-from luma.oled.device import ssd1306
-from luma.core.render import canvas
+
+from cpu_sampler import CpuSampler
+from kmsg_reader import KernelLog
+import low_interference
+import monitor_profiler
+import oled_backend
+from oled_framebuffer import FramebufferDisplay
+from oled_scheduler import OledScheduler
 
 class SimpleLogDisplay:
-    def __init__(self):
-        self.serial = i2c(port=0, address=0x3C)
-        self.device = ssd1306(self.serial, width=128, height=64)
+    def __init__(self, device=None):
+        # Устройство luma по умолчанию; эмулятор или native - через oled_backend
+        self.device = device if device is not None else oled_backend.create_device()
+        self.screen = FramebufferDisplay(self.device)
+        self.kernel_log = KernelLog(maxlen=4, levels="err,warn")
+        self.cpu = CpuSampler()
     
     def get_cpu_usage(self):
-        """Надежное получение загрузки CPU через /proc/stat"""
-        try:
-            with open('/proc/stat', 'r') as f:
-                first_line = f.readline().strip()
-            
-            parts = first_line.split()
-            if len(parts) >= 5:
-                user = int(parts[1])
-                nice = int(parts[2])
-                system = int(parts[3])
-                idle = int(parts[4])
-                total = user + nice + system + idle
-                usage = ((total - idle) / total) * 100
-                return usage
-            return 0.0
-        except:
-            return 0.0
+        """Загрузка CPU за интервал по приращениям /proc/stat"""
+        return self.cpu.sample()['cpu'].busy
     
     def get_kernel_logs(self):
-        """Получение логов ядра"""
-        try:
-            result = subprocess.check_output(
-                ["dmesg", "--level=err,warn", "-n", "4"],
-                stderr=subprocess.DEVNULL,
-                timeout=2
-            ).decode('utf-8', errors='ignore')
-            
-            lines = result.strip().split('\n')[-4:]
-            processed = []
-            
-            for line in lines:
-                if line.strip():
-                    # Берем только последнюю часть сообщения
-                    if ']' in line:
-                        msg = line.split(']')[-1].strip()[:22]
-                    else:
-                        msg = line.strip()[:22]
-                    processed.append(msg)
-            
-            return processed if processed else ["No messages"]
-        except:
-            return ["Reading logs..."]
+        """Получение логов ядра (только ошибки и предупреждения)"""
+        self.kernel_log.poll()
+        # Берем только начало сообщения
+        processed = [message.strip()[:22] for message in self.kernel_log.messages(4) if message.strip()]
+        if processed:
+            return processed
+        return ["No messages"] if self.kernel_log.fd is not None else ["Reading logs..."]
     
     def display_info(self):
         """Отображение информации"""
-        cpu = self.get_cpu_usage()
-        logs = self.get_kernel_logs()
-        
-        with canvas(self.device) as draw:
+        self.render({
+            'clock': datetime.now().strftime('%H:%M'),
+            'cpu': self.get_cpu_usage(),
+            'logs': self.get_kernel_logs(),
+        })
+
+    def render(self, values):
+        with self.screen.frame() as draw:
             # Верхняя строка
-            draw.text((0, 0), "%s CPU:%.1f%%" % (datetime.now().strftime('%H:%M'), cpu), fill="white")
+            draw.text((0, 0), "%s CPU:%.1f%%" % (values['clock'], values['cpu']), fill="white")
             
             # Разделитель
             draw.line((0, 12, 128, 12), fill="white")
             
             # Логи
-            for i, log in enumerate(logs):
+            for i, log in enumerate(values['logs']):
                 draw.text((0, 14 + i * 12), log, fill="white")
     
     def run(self):
-        try:
-            while True:
-                self.display_info()
-                time.sleep(3)
-        except KeyboardInterrupt:
-            self.device.clear()
+        scheduler = OledScheduler(self.render)
+        scheduler.every('clock', 1, lambda: datetime.now().strftime('%H:%M'))
+        scheduler.every('cpu', 3, lambda: round(self.get_cpu_usage(), 1))
+        scheduler.on_readable('logs', self.kernel_log.fileno(), self.get_kernel_logs)
+        scheduler.run()
+        self.device.clear()
 
 if __name__ == "__main__":
-    SimpleLogDisplay().run()
+    parser = argparse.ArgumentParser(description="Загрузка CPU и ошибки ядра на SSD1306")
+    monitor_profiler.add_arguments(parser)
+    low_interference.add_arguments(parser)
+    oled_backend.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = monitor_profiler.from_arguments(args)
+
+    display = SimpleLogDisplay(device=oled_backend.from_arguments(args))
+    if profiler:
+        profiler.instrument_display(display)
+    low_interference.from_arguments(args)
+    display.run()
+    if profiler and not profiler.report(args.profile or None):
+        sys.exit(1)
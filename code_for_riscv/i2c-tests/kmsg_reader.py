@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Чтение журнала ядра из /dev/kmsg без запуска dmesg.
+
+/dev/kmsg открывается один раз в неблокирующем режиме; каждый read()
+возвращает одну запись вида
+
+    <приоритет>,<номер>,<время, мкс>,<флаги>[,...];<сообщение>
+     КЛЮЧ=значение                 (строки продолжения, пропускаются)
+
+poll() дочитывает только новые записи и складывает последние из них в
+кольцевой буфер. Уровень (приоритет & 7) фильтруется здесь же, как
+dmesg --level.
+"""
+
+import errno
+import os
+from collections import deque, namedtuple
+
+KMSG_PATH = "/dev/kmsg"
+# Запись kmsg не длиннее 8 КиБ (CONSOLE_EXT_LOG_MAX в ядре)
+RECORD_SIZE = 8192
+
+LEVELS = {
+    'emerg': 0,
+    'alert': 1,
+    'crit': 2,
+    'err': 3,
+    'warn': 4,
+    'notice': 5,
+    'info': 6,
+    'debug': 7,
+}
+
+KmsgRecord = namedtuple('KmsgRecord', ['level', 'seq', 'timestamp_us', 'message'])
+
+
+def parse_levels(levels):
+    """'err,warn' или список имен/номеров -> множество номеров уровней"""
+    if levels is None:
+        return None
+    if isinstance(levels, str):
+        levels = levels.split(',')
+    result = set()
+    for level in levels:
+        level = str(level).strip().lower()
+        if level.isdigit():
+            result.add(int(level))
+        elif level in LEVELS:
+            result.add(LEVELS[level])
+        else:
+            raise ValueError(f"Неизвестный уровень журнала: {level}")
+    return result
+
+
+def parse_record(raw):
+    """Разбор одной записи /dev/kmsg; None, если формат не распознан"""
+    text = raw.decode('utf-8', errors='replace')
+    header, sep, body = text.partition(';')
+    if not sep:
+        return None
+    fields = header.split(',')
+    if len(fields) < 3:
+        return None
+    try:
+        priority, seq, timestamp = int(fields[0]), int(fields[1]), int(fields[2])
+    except ValueError:
+        return None
+    # Строки продолжения (словарь SUBSYSTEM=..., DEVICE=...) начинаются с пробела
+    message = body.split('\n', 1)[0]
+    return KmsgRecord(priority & 7, seq, timestamp, message)
+
+
+class KernelLog:
+    """Последние записи журнала ядра с инкрементальным дочитыванием"""
+
+    def __init__(self, maxlen=32, levels=None, path=KMSG_PATH):
+        self.records = deque(maxlen=maxlen)
+        self.levels = parse_levels(levels)
+        self.path = path
+        self.fd = None
+        self.error = None
+        # Записей, перезаписанных ядром до того, как мы их прочитали
+        self.missed = 0
+        self.last_seq = None
+        self.open()
+
+    def open(self):
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            self.error = None
+        except OSError as e:
+            self.fd = None
+            self.error = f"{self.path}: {e.strerror}"
+        return self.fd is not None
+
+    def fileno(self):
+        """Дескриптор для select/poll (готов к чтению, когда есть новые записи)"""
+        return self.fd
+
+    def poll(self):
+        """Чтение всех новых записей; возвращает число добавленных"""
+        if self.fd is None:
+            return 0
+
+        added = 0
+        while True:
+            try:
+                raw = os.read(self.fd, RECORD_SIZE)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EPIPE:
+                    # Ядро перезаписало непрочитанные записи; чтение продолжается со следующей
+                    continue
+                self.error = f"{self.path}: {e.strerror}"
+                break
+            if not raw:
+                break
+
+            record = parse_record(raw)
+            if record is None:
+                continue
+            if self.last_seq is not None and record.seq > self.last_seq + 1:
+                self.missed += record.seq - self.last_seq - 1
+            self.last_seq = record.seq
+            if self.levels is not None and record.level not in self.levels:
+                continue
+            self.records.append(record)
+            added += 1
+        return added
+
+    def messages(self, count=None):
+        """Тексты последних count записей"""
+        records = list(self.records)
+        if count is not None:
+            records = records[-count:]
+        return [record.message for record in records]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Режим минимального влияния OLED-демона на RT-замеры.
+
+На той же плате rt-tests/lichee_example.c отвечает на импульсы с
+SCHED_FIFO 99. Демон экрана не должен вытеснять его в неудачный момент
+и подкачивать страницы, поэтому apply():
+
+- привязывает процесс к выбранному CPU (sched_setaffinity), чтобы
+  отвести монитору ядро, не занятое RT-задачей (на одноядерной D1 не
+  нужно);
+- переводит процесс в SCHED_IDLE, а если это не разрешено - в nice 19;
+- закрепляет память mlockall(MCL_CURRENT | MCL_FUTURE) через ctypes,
+  чтобы в установившемся цикле не было page fault;
+- собирает мусор и замораживает (gc.freeze) все объекты, созданные при
+  запуске: сборщик больше их не обходит, а пороги поколений подняты,
+  чтобы редкие выделения в цикле не запускали полную сборку.
+
+Буферы кадра заранее выделены в FramebufferDisplay, так что вызывать
+apply() нужно после создания демона и перед его циклом:
+
+    display = SystemInfoDisplay()
+    low_interference.apply(cpu=1)
+    display.run()
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import resource
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+# Пороги поколений gc в установившемся цикле (по умолчанию 700, 10, 10)
+GC_THRESHOLDS = (50000, 50, 100)
+
+
+def set_affinity(cpu):
+    """Привязка к одному CPU; возвращает итоговый набор CPU"""
+    os.sched_setaffinity(0, {cpu})
+    return os.sched_getaffinity(0)
+
+
+def set_idle_priority(nice=19):
+    """SCHED_IDLE, иначе SCHED_OTHER с nice; возвращает описание политики"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+        return "SCHED_IDLE"
+    except (AttributeError, OSError):
+        pass
+    current = os.getpriority(os.PRIO_PROCESS, 0)
+    if nice > current:
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+    return f"nice {os.getpriority(os.PRIO_PROCESS, 0)}"
+
+
+def lock_memory():
+    """mlockall через ctypes; возвращает примененные флаги, при ошибке OSError"""
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or "libc.so.6", use_errno=True)
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    if os.geteuid() != 0 and soft != resource.RLIM_INFINITY:
+        # С MCL_FUTURE при малом RLIMIT_MEMLOCK новые mmap будут падать с ENOMEM
+        flags, name = MCL_CURRENT, "mlockall(MCL_CURRENT)"
+    else:
+        flags, name = MCL_CURRENT | MCL_FUTURE, "mlockall(MCL_CURRENT | MCL_FUTURE)"
+    if libc.mlockall(flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"mlockall: {os.strerror(errno)}")
+    return name
+
+
+def freeze_heap():
+    """Сборка мусора, заморозка живых объектов и редкие сборки в цикле"""
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(*GC_THRESHOLDS)
+    return gc.get_freeze_count()
+
+
+def apply(cpu=None, idle=True, nice=19, lock=True, freeze=True):
+    """Все меры сразу; печатает, что удалось применить"""
+    applied = []
+    if cpu is not None:
+        try:
+            applied.append(f"CPU {sorted(set_affinity(cpu))}")
+        except OSError as e:
+            print(f"Не удалось привязать к CPU {cpu}: {e}")
+    if idle:
+        try:
+            applied.append(set_idle_priority(nice))
+        except OSError as e:
+            print(f"Не удалось понизить приоритет: {e}")
+    if lock:
+        try:
+            applied.append(lock_memory())
+        except OSError as e:
+            print(f"Не удалось закрепить память: {e}")
+    if freeze:
+        applied.append(f"gc.freeze ({freeze_heap()} объектов)")
+    print("Режим минимального влияния: " + ", ".join(applied))
+    return applied
+
+
+def add_arguments(parser):
+    """Ключи --low-interference и --cpu для демонов"""
+    parser.add_argument('--low-interference', action='store_true',
+                        help="SCHED_IDLE, mlockall и gc.freeze, чтобы не мешать RT-замерам")
+    parser.add_argument('--cpu', type=int, help="привязать демон к CPU с этим номером")
+
+
+def from_arguments(args):
+    """Применение режима по ключам командной строки"""
+    if args.low_interference or args.cpu is not None:
+        full = args.low_interference
+        return apply(cpu=args.cpu, idle=full, lock=full, freeze=full)
+    return None
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Сбор метрик платы с раздачей в несколько приемников.
+
+MetricsCollector раз в interval секунд снимает загрузку CPU (по
+приращениям /proc/stat), память (/proc/meminfo), диск (statvfs) и
+среднюю нагрузку, кладет снимок в кольцевой буфер MetricRing и отдает
+его всем приемникам - каждый приемник получает один и тот же снимок,
+повторного опроса системы нет:
+
+- OledSink    - строки на экран SSD1306 (перерисовка только при изменении);
+- FileSink    - CSV-файл с ротацией по размеру;
+- PrometheusSink - текстовый формат Prometheus по HTTP на локальном
+  сокете (TCP или unix), отдается последний снимок.
+
+Собственная стоимость сборщика видна в тех же метриках:
+collector_cpu_seconds_total, collector_rss_bytes и
+collector_sample_seconds (время снятия и раздачи одного снимка).
+
+Без экрана, только файл и Prometheus:
+
+    python3 metrics_collector.py --interval 2 --prometheus 9105 --file /var/log/board.csv
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import socket
+import stat
+import time
+from array import array
+
+from cpu_sampler import CpuSampler
+
+MEMINFO_PATH = "/proc/meminfo"
+STATM_PATH = "/proc/self/statm"
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+METRIC_HELP = {
+    'cpu_busy_percent': "Загрузка CPU за интервал, %",
+    'cpu_iowait_percent': "Ожидание ввода-вывода за интервал, %",
+    'memory_used_percent': "Занятая память (без MemAvailable), %",
+    'memory_available_bytes': "MemAvailable, байт",
+    'disk_used_percent': "Занято на корневой ФС, %",
+    'load1': "Средняя нагрузка за минуту",
+    'collector_cpu_seconds_total': "Процессорное время сборщика, с",
+    'collector_rss_bytes': "Резидентная память сборщика, байт",
+    'collector_sample_seconds': "Время снятия и раздачи одного снимка, с",
+}
+
+
+class MetricRing:
+    """Кольцевой буфер снимков: одна плоская array('d') на все метрики"""
+
+    def __init__(self, names, capacity=900):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.capacity = capacity
+        self.width = len(self.names) + 1           # первый столбец - время
+        self.data = array('d', [math.nan]) * (capacity * self.width)
+        self.count = 0
+
+    def append(self, timestamp, values):
+        """values - значения в порядке names"""
+        offset = (self.count % self.capacity) * self.width
+        self.data[offset] = timestamp
+        self.data[offset + 1:offset + self.width] = array('d', values)
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def rows(self, count=None):
+        """Последние count снимков от старых к новым: (время, [значения])"""
+        size = len(self)
+        count = size if count is None else min(count, size)
+        for n in range(self.count - count, self.count):
+            offset = (n % self.capacity) * self.width
+            yield self.data[offset], self.data[offset + 1:offset + self.width].tolist()
+
+    def latest(self):
+        """Последний снимок {метрика: значение} или None"""
+        if not self.count:
+            return None
+        _, values = next(self.rows(1))
+        return dict(zip(self.names, values))
+
+    def column(self, name, count=None):
+        """Ряд значений одной метрики"""
+        column = self.index[name]
+        return [values[column] for _, values in self.rows(count)]
+
+
+class MetricsCollector:
+    """Периодический снимок метрик и раздача приемникам"""
+
+    def __init__(self, interval=2, capacity=900, sinks=(), disk_path="/"):
+        self.interval = interval
+        self.sinks = list(sinks)
+        self.disk_path = disk_path
+        self.cpu = CpuSampler()
+        self.meminfo_fd = os.open(MEMINFO_PATH, os.O_RDONLY)
+        self.statm_fd = os.open(STATM_PATH, os.O_RDONLY)
+        self.cores = [f"cpu{i}_busy_percent" for i in range(len(self.cpu.cores()))]
+        self.ring = MetricRing(list(METRIC_HELP) + self.cores, capacity)
+        self.last_sample_seconds = 0.0
+
+    def read_memory(self):
+        """(занято %, доступно байт) из /proc/meminfo одним pread"""
+        fields = {}
+        for line in os.pread(self.meminfo_fd, 4096, 0).split(b'\n'):
+            name, _, rest = line.partition(b':')
+            if name in (b'MemTotal', b'MemAvailable'):
+                fields[name] = int(rest.split()[0]) * 1024
+                if len(fields) == 2:
+                    break
+        total = fields.get(b'MemTotal', 0)
+        available = fields.get(b'MemAvailable', 0)
+        return (100.0 * (total - available) / total if total else 0.0), available
+
+    def read_disk(self):
+        """Занятое место как в df/psutil: used / (used + доступно пользователю)"""
+        stat = os.statvfs(self.disk_path)
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        available = stat.f_bavail * stat.f_frsize
+        return 100.0 * used / (used + available) if used + available else 0.0
+
+    def read_rss(self):
+        return int(os.pread(self.statm_fd, 128, 0).split()[1]) * PAGE_SIZE
+
+    def collect(self):
+        """Один снимок: в буфер и во все приемники; возвращает словарь метрик"""
+        started = time.perf_counter()
+        timestamp = time.time()
+        usage = self.cpu.sample()
+        total = usage['cpu']
+        memory_percent, memory_available = self.read_memory()
+
+        values = [
+            total.busy,
+            total.iowait,
+            memory_percent,
+            memory_available,
+            self.read_disk(),
+            os.getloadavg()[0],
+            time.process_time(),
+            self.read_rss(),
+            self.last_sample_seconds,
+        ]
+        values += [core.busy for core in self.cpu.cores()[:len(self.cores)]]
+        values += [0.0] * (len(self.ring.names) - len(values))
+        self.ring.append(timestamp, values)
+
+        sample = dict(zip(self.ring.names, values))
+        for sink in self.sinks:
+            try:
+                sink.publish(timestamp, sample)
+            except Exception as e:
+                print(f"Ошибка приемника {type(sink).__name__}: {e}")
+        self.last_sample_seconds = time.perf_counter() - started
+        return sample
+
+    def attach(self, scheduler, name='metrics'):
+        """Опрос по планировщику OledScheduler; приемники с сокетом - по готовности"""
+        def tick():
+            # Снимок сам раздается приемникам, в values планировщика ничего не кладется
+            self.collect()
+
+        scheduler.every(name, self.interval, tick)
+        for sink in self.sinks:
+            if hasattr(sink, 'fileno'):
+                scheduler.on_readable(f"{name}:{type(sink).__name__}", sink.fileno(), sink.handle)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.cpu.close()
+        for fd in (self.meminfo_fd, self.statm_fd):
+            os.close(fd)
+
+
+class OledSink:
+    """Строки на экран; format_lines(sample) -> список строк"""
+
+    def __init__(self, screen, format_lines, line_height=15):
+        self.screen = screen
+        self.format_lines = format_lines
+        self.line_height = line_height
+        self.lines = None
+
+    def publish(self, timestamp, sample):
+        lines = self.format_lines(sample)
+        if lines == self.lines:
+            return
+        self.lines = lines
+        with self.screen.frame() as draw:
+            for i, line in enumerate(lines):
+                draw.text((0, i * self.line_height), line, fill="white")
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """CSV: время и метрики в порядке первого снимка; ротация в <path>.1"""
+
+    def __init__(self, path, max_bytes=1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.names = None
+        self.file = None
+
+    def _open(self, names):
+        self.file = open(self.path, 'a', buffering=1)
+        if self.file.tell() == 0:
+            self.file.write(','.join(['timestamp'] + names) + '\n')
+
+    def publish(self, timestamp, sample):
+        if self.file is None:
+            self.names = list(sample)
+            self._open(self.names)
+        self.file.write(f"{timestamp:.3f}," + ','.join(f"{sample[name]:.10g}" for name in self.names) + '\n')
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.file.close()
+            os.replace(self.path, self.path + '.1')
+            self._open(self.names)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class PrometheusSink:
+    """Последний снимок в текстовом формате Prometheus по HTTP.
+
+    address - порт на 127.0.0.1, (host, port) или путь unix-сокета.
+    Сокет неблокирующий; handle() вызывается планировщиком, когда есть
+    входящее соединение, и отдает его задаче asyncio: медленный или
+    молчащий клиент не задерживает цикл планировщика и перерисовку экрана.
+    """
+
+    # Сколько ждать запроса и отправки ответа одному клиенту, с
+    CLIENT_TIMEOUT = 2.0
+    MAX_CLIENTS = 8
+
+    def __init__(self, address=9105, prefix="board_", labels=None):
+        self.prefix = prefix
+        self.labels = labels if labels is not None else {'host': socket.gethostname()}
+        self.body = b""
+        self.requests = 0
+        self._clients = set()
+        if isinstance(address, str):
+            _remove_stale_socket(address)
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            if isinstance(address, int):
+                address = ("127.0.0.1", address)
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.address = address
+        self.socket.bind(address)
+        self.socket.listen(4)
+        self.socket.setblocking(False)
+
+    def publish(self, timestamp, sample):
+        # Текст формируется раз на снимок, а не на каждый запрос
+        labels = ','.join(f'{key}="{value}"' for key, value in self.labels.items())
+        lines = []
+        for name, value in sample.items():
+            metric = self.prefix + name
+            kind = 'counter' if name.endswith('_total') else 'gauge'
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {metric} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric}{{{labels}}} {value:.10g} {int(timestamp * 1000)}")
+        self.body = ('\n'.join(lines) + '\n').encode()
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def handle(self):
+        """Прием всех ожидающих соединений; ответы отправляют задачи asyncio"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return None
+            if len(self._clients) >= self.MAX_CLIENTS:
+                connection.close()
+                continue
+            connection.setblocking(False)
+            # Ответ - снимок на момент подключения
+            response = (b"HTTP/1.0 200 OK\r\n"
+                        b"Content-Type: text/plain; version=0.0.4\r\n"
+                        b"Content-Length: " + str(len(self.body)).encode() + b"\r\n\r\n"
+                        + self.body)
+            task = loop.create_task(self._respond(loop, connection, response))
+            self._clients.add(task)
+            task.add_done_callback(self._clients.discard)
+
+    async def _respond(self, loop, connection, response):
+        with connection:
+            try:
+                await asyncio.wait_for(loop.sock_recv(connection, 1024), self.CLIENT_TIMEOUT)
+                await asyncio.wait_for(loop.sock_sendall(connection, response), self.CLIENT_TIMEOUT)
+                self.requests += 1
+            except (OSError, asyncio.TimeoutError):
+                pass
+
+    def close(self):
+        self.socket.close()
+        if isinstance(self.address, str):
+            _remove_stale_socket(self.address)
+
+
+def _remove_stale_socket(path):
+    """Удаление оставшегося unix-сокета; другой файл по этому пути не трогается"""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    from oled_scheduler import OledScheduler
+
+    parser = argparse.ArgumentParser(description="Сбор метрик платы")
+    parser.add_argument('--interval', type=float, default=2, help="период снимков, с")
+    parser.add_argument('--file', help="CSV-файл с метриками")
+    parser.add_argument('--prometheus', help="порт на 127.0.0.1 или путь unix-сокета")
+    args = parser.parse_args()
+
+    sinks = []
+    if args.file:
+        sinks.append(FileSink(args.file))
+    if args.prometheus:
+        sinks.append(PrometheusSink(int(args.prometheus) if args.prometheus.isdigit() else args.prometheus))
+    collector = MetricsCollector(args.interval, sinks=sinks)
+
+    scheduler = OledScheduler(None)
+    collector.attach(scheduler)
+    try:
+        scheduler.run()
+    finally:
+        collector.close()
+
+
+if __name__ == "__main__":
+    main()
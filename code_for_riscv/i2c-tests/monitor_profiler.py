@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Самопрофилирование OLED-демонов: сколько стоит монитор на плате.
+
+Этапы цикла (опрос CPU, чтение журнала, отрисовка, передача по I2C)
+оборачиваются методами wrap()/instrument_device(); для каждого этапа
+накапливаются время (настенное и процессорное), число выделенных блоков
+памяти (sys.getallocatedblocks, почти бесплатно) и, по желанию, байты
+через tracemalloc. Этапы могут быть вложенными - время считается без
+вложенных (render не включает bus). За весь запуск добавляются доля
+процессорного времени, пиковый RSS и число переключений контекста
+(добровольные - это пробуждения демона).
+
+    profiler = MonitorProfiler(budget=1.0)
+    profiler.instrument_display(display)     # sample, logs, render, bus
+    ...
+    profiler.report()          # сводка; False, если бюджет превышен
+
+В демонах включается ключом --profile [файл.json] (и --budget, %).
+"""
+
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+# Методы устройства, время которых относится к передаче по шине
+BUS_METHODS = ('command', 'data', 'write_window')
+# Методы классов демонов и соответствующие этапы
+DISPLAY_STAGES = {
+    'get_cpu_usage': 'sample',
+    'get_kernel_logs': 'logs',
+    'render': 'render',
+}
+
+
+class StageStats:
+    """Накопленная статистика одного этапа"""
+
+    def __init__(self, name, keep=4096):
+        self.name = name
+        self.calls = 0
+        self.wall_ns = 0
+        self.cpu_ns = 0
+        self.blocks = 0
+        self.alloc_bytes = 0
+        self.bytes = 0
+        # Последние длительности для перцентилей
+        self.recent = deque(maxlen=keep)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def percentile(q):
+            return recent[min(int(q * len(recent)), len(recent) - 1)] / 1000 if recent else 0.0
+
+        calls = max(self.calls, 1)
+        return {
+            'calls': self.calls,
+            'wall_mean_us': self.wall_ns / calls / 1000,
+            'wall_p50_us': percentile(0.5),
+            'wall_p95_us': percentile(0.95),
+            'wall_max_us': recent[-1] / 1000 if recent else 0.0,
+            'cpu_mean_us': self.cpu_ns / calls / 1000,
+            'cpu_total_ms': self.cpu_ns / 1e6,
+            'blocks_per_call': self.blocks / calls,
+            'alloc_bytes_per_call': self.alloc_bytes / calls,
+            'bus_bytes': self.bytes,
+        }
+
+
+class MonitorProfiler:
+    """Поэтапные замеры и итоговая сводка накладных расходов"""
+
+    def __init__(self, budget=None, trace_allocations=False):
+        """budget - допустимая доля одного CPU, %; trace_allocations -
+        байты через tracemalloc (заметно замедляет, только для поиска утечек)"""
+        self.budget = budget
+        self.trace_allocations = trace_allocations
+        self.stages = {}
+        self._stack = []
+        if trace_allocations:
+            tracemalloc.start()
+        self.started_wall = time.monotonic()
+        self.started_cpu = time.process_time()
+        self.started_usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def begin(self, name):
+        traced = tracemalloc.get_traced_memory()[0] if self.trace_allocations else 0
+        # [этап, время, CPU, блоки, байты, время вложенных, CPU вложенных, блоки вложенных]
+        self._stack.append([name, time.perf_counter_ns(), time.thread_time_ns(),
+                            sys.getallocatedblocks(), traced, 0, 0, 0])
+
+    def end(self, transferred=0):
+        name, wall, cpu, blocks, traced, child_wall, child_cpu, child_blocks = self._stack.pop()
+        wall = time.perf_counter_ns() - wall
+        cpu = time.thread_time_ns() - cpu
+        blocks = sys.getallocatedblocks() - blocks
+        stats = self._stats(name)
+        stats.calls += 1
+        stats.wall_ns += wall - child_wall
+        stats.cpu_ns += cpu - child_cpu
+        stats.blocks += blocks - child_blocks
+        stats.bytes += transferred
+        stats.recent.append(wall - child_wall)
+        if self.trace_allocations:
+            stats.alloc_bytes += max(tracemalloc.get_traced_memory()[0] - traced, 0)
+        if self._stack:
+            parent = self._stack[-1]
+            parent[5] += wall
+            parent[6] += cpu
+            parent[7] += blocks
+
+    def wrap(self, obj, method, stage):
+        """Замена метода объекта на версию с замером (атрибут экземпляра)"""
+        original = getattr(obj, method)
+
+        @functools.wraps(original)
+        def measured(*args, **kwargs):
+            self.begin(stage)
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.end()
+
+        setattr(obj, method, measured)
+        return measured
+
+    def instrument_device(self, device, stage='bus'):
+        """Замер передачи по шине: методы устройства luma или ssd1306_i2c"""
+        for method in BUS_METHODS:
+            original = getattr(device, method, None)
+            if original is None:
+                continue
+
+            def measured(*args, _original=original, **kwargs):
+                self.begin(stage)
+                transferred = 0
+                try:
+                    return _original(*args, **kwargs)
+                finally:
+                    if args and isinstance(args[-1], (bytes, bytearray, list)):
+                        transferred = len(args[-1])
+                    self.end(transferred)
+
+            setattr(device, method, measured)
+
+    def instrument_display(self, display):
+        """Этапы демона (SystemInfoDisplay и т.п.) и его устройство"""
+        for method, stage in DISPLAY_STAGES.items():
+            if hasattr(display, method):
+                self.wrap(display, method, stage)
+        self.instrument_device(display.device)
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started_wall, 1e-9)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = time.process_time() - self.started_cpu
+        result = {
+            'elapsed_s': elapsed,
+            'cpu_s': cpu,
+            'cpu_percent': 100.0 * cpu / elapsed,
+            'max_rss_kb': usage.ru_maxrss,
+            'wakeups_per_s': (usage.ru_nvcsw - self.started_usage.ru_nvcsw) / elapsed,
+            'preemptions_per_s': (usage.ru_nivcsw - self.started_usage.ru_nivcsw) / elapsed,
+            'budget_percent': self.budget,
+            'stages': {name: stats.summary() for name, stats in self.stages.items()},
+        }
+        if self.trace_allocations:
+            result['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        return result
+
+    def report(self, path=None):
+        """Печать сводки и запись в JSON; возвращает False при превышении бюджета"""
+        summary = self.summary()
+        print(f"\nПрофиль монитора за {summary['elapsed_s']:.1f} с: "
+              f"CPU {summary['cpu_percent']:.2f}%, RSS {summary['max_rss_kb']} КиБ, "
+              f"пробуждений {summary['wakeups_per_s']:.1f}/с, вытеснений {summary['preemptions_per_s']:.1f}/с")
+        print(f"{'этап':<10}{'вызовов':>9}{'сред, мкс':>11}{'p95, мкс':>10}{'макс, мкс':>11}"
+              f"{'CPU, мс':>10}{'блоков':>9}{'байт I2C':>10}")
+        for name, stats in sorted(summary['stages'].items(), key=lambda item: -item[1]['cpu_total_ms']):
+            print(f"{name:<10}{stats['calls']:>9}{stats['wall_mean_us']:>11.0f}{stats['wall_p95_us']:>10.0f}"
+                  f"{stats['wall_max_us']:>11.0f}{stats['cpu_total_ms']:>10.1f}"
+                  f"{stats['blocks_per_call']:>9.1f}{stats['bus_bytes']:>10}")
+
+        within = self.budget is None or summary['cpu_percent'] <= self.budget
+        if self.budget is not None:
+            print(f"Бюджет {self.budget}% CPU: {'в пределах' if within else 'ПРЕВЫШЕН'}")
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            print(f"Профиль сохранен: {os.path.abspath(path)}")
+        return within
+
+
+def add_arguments(parser):
+    """Ключи --profile/--budget/--trace-allocations для демонов"""
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='JSON',
+                        help="замерять этапы и вывести сводку при выходе (и сохранить в JSON)")
+    parser.add_argument('--budget', type=float, help="допустимая загрузка CPU монитором, %%")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="считать байты выделений через tracemalloc")
+
+
+def from_arguments(args):
+    """MonitorProfiler по ключам командной строки или None"""
+    if args.profile is None:
+        return None
+    return MonitorProfiler(budget=args.budget, trace_allocations=args.trace_allocations)
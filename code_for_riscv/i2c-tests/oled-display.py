@@ -1,97 +1,93 @@
 #!/usr/bin/env python3
 
-import time
-import subprocess
+import argparse
 import sys
 from datetime import datetime
 from pathlib import Path
 
 try:
-    from luma.core.interface.serial import i2c
-    from luma.oled.device import ssd1306
-    from luma.core.render import canvas
+    from cpu_sampler import CpuSampler
+    from kmsg_reader import KernelLog
+    import low_interference
+    import monitor_profiler
+    import oled_backend
+    from oled_framebuffer import FramebufferDisplay
+    from oled_scheduler import OledScheduler
 except ImportError as e:
     print(f"Error: {e}")
     sys.exit(1)
 
 class OLEDDisplay:
-    def __init__(self):
+    def __init__(self, device=None, args=None):
         print("Starting OLED display...")
         try:
-            self.serial = i2c(port=0, address=0x3C)
-            self.device = ssd1306(self.serial, width=128, height=64)
+            if device is None:
+                # Backend and bus settings from the command line, if given
+                device = oled_backend.from_arguments(args) if args is not None else oled_backend.create_device()
+            self.device = device
+            self.screen = FramebufferDisplay(self.device)
+            self.kernel_log = KernelLog(maxlen=10)
+            self.cpu = CpuSampler()
             print("Display initialized")
         except Exception as e:
             print(f"Display error: {e}")
             sys.exit(1)
     
     def get_cpu_usage(self):
-        try:
-            with open('/proc/stat', 'r') as f:
-                first_line = f.readline().strip()
-            parts = first_line.split()
-            user = int(parts[1])
-            nice = int(parts[2])
-            system = int(parts[3])
-            idle = int(parts[4])
-            total = user + nice + system + idle
-            return ((total - idle) / total) * 100
-        except:
-            return 0.0
+        return self.cpu.sample()['cpu'].busy
     
     def get_kernel_logs(self, lines=5):
-        try:
-            result = subprocess.check_output(
-                ["dmesg"],
-                timeout=2
-            ).decode('utf-8', errors='ignore')
-            
-            all_logs = []
-            raw_lines = result.strip().split('\n')[-lines*2:]
-            
-            for line in raw_lines:
-                if line.strip():
-                    if ']' in line:
-                        msg = line.split(']', 1)[1].strip()
-                    else:
-                        msg = line.strip()
-                    
-                    if len(msg) > 24:
-                        msg = msg[:24]
-                    all_logs.append(msg)
-            
-            return all_logs[-lines:] if all_logs else ["No messages"]
-        except:
-            return ["Reading logs..."]
+        self.kernel_log.poll()
+        all_logs = [message.strip()[:24] for message in self.kernel_log.messages(lines) if message.strip()]
+        if all_logs:
+            return all_logs
+        return ["No messages"] if self.kernel_log.fd is not None else ["Reading logs..."]
     
     def display_info(self):
-        cpu = self.get_cpu_usage()
-        logs = self.get_kernel_logs(5)
-        
-        with canvas(self.device) as draw:
-            draw.text((0, 0), f"{datetime.now().strftime('%H:%M')} CPU:{cpu:.1f}%", fill="white")
+        self.render({
+            'clock': datetime.now().strftime('%H:%M'),
+            'cpu': self.get_cpu_usage(),
+            'logs': self.get_kernel_logs(5),
+        })
+
+    def render(self, values):
+        with self.screen.frame() as draw:
+            draw.text((0, 0), f"{values['clock']} CPU:{values['cpu']:.1f}%", fill="white")
             draw.line((0, 12, 128, 12), fill="white")
             
-            for i, log in enumerate(logs):
+            for i, log in enumerate(values['logs']):
                 y_pos = 14 + i * 10
                 draw.text((0, y_pos), log, fill="white")
     
     def run(self):
         print("OLED monitor running...")
+        scheduler = OledScheduler(self.render)
+        scheduler.every('clock', 1, lambda: datetime.now().strftime('%H:%M'))
+        scheduler.every('cpu', 3, lambda: round(self.get_cpu_usage(), 1))
+        scheduler.on_readable('logs', self.kernel_log.fileno(), lambda: self.get_kernel_logs(5))
         try:
-            while True:
-                self.display_info()
-                time.sleep(3)
-        except KeyboardInterrupt:
+            scheduler.run()
             print("Stopping...")
         finally:
             self.device.clear()
 
 if __name__ == "__main__":
-    # Check I2C
-    if not Path('/dev/i2c-0').exists():
+    parser = argparse.ArgumentParser(description="OLED system monitor")
+    monitor_profiler.add_arguments(parser)
+    low_interference.add_arguments(parser)
+    oled_backend.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = monitor_profiler.from_arguments(args)
+
+    # Check I2C (the emulator backend runs without it)
+    if oled_backend.needs_i2c(args.backend) and not Path(f'/dev/i2c-{args.port}').exists():
         print("I2C device not found")
         sys.exit(1)
     
-    display = OLEDDisplay()
+    display = OLEDDisplay(args=args)
+    if profiler:
+        profiler.instrument_display(display)
+    low_interference.from_arguments(args)
     display.run()
+    if profiler and not profiler.report(args.profile or None):
+        sys.exit(1)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Выбор устройства SSD1306 для демонов и эмулятор дисплея без платы.
+
+create_device(backend) возвращает объект с интерфейсом устройства luma
+(width, height, command(), data(), clear()):
+
+- 'luma'            - luma.oled на /dev/i2c-N (как было в демонах);
+- 'native'          - ssd1306_i2c.SSD1306, блочная запись через I2C_RDWR;
+- 'emulator'        - luma-подобное устройство поверх EmulatedBus;
+- 'emulator-native' - ssd1306_i2c.SSD1306 поверх EmulatedBus.
+
+EmulatedBus разбирает поток команд и данных контроллера SSD1306 (окна
+0x21/0x22, режимы адресации 0x20) в видеопамять 128x64, считает
+транзакции и байты и оценивает время на шине для заданной частоты
+(100/400 кГц); с realtime=True запись еще и ждет это время, тогда
+замер времени кадра учитывает скорость шины.
+
+Замер всех демонов на ПК или в CI:
+
+    python3 oled_backend.py --benchmark --frames 300 --bus-speed 100000
+"""
+
+import argparse
+import importlib.util
+import os
+import time
+
+from PIL import Image
+
+BACKENDS = ('luma', 'native', 'emulator', 'emulator-native')
+BUS_SPEEDS = (100000, 400000)
+
+# Число байт аргументов у команд SSD1306 (остальные - без аргументов)
+COMMAND_ARGUMENTS = {
+    0x20: 1, 0x21: 2, 0x22: 2, 0x26: 6, 0x27: 6, 0x29: 5, 0x2A: 5,
+    0x81: 1, 0x8D: 1, 0xA3: 2, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1,
+    0xDA: 1, 0xDB: 1,
+}
+
+HORIZONTAL, VERTICAL, PAGE = 0, 1, 2
+
+
+def transaction_bits(length):
+    """Тактов SCL на запись length байт: START, адрес, байты с ACK, STOP"""
+    return 9 * (length + 1) + 2
+
+
+class EmulatedBus:
+    """Шина I2C с контроллером SSD1306 в памяти; интерфейс как у ssd1306_i2c.I2cBus"""
+
+    def __init__(self, width=128, height=64, bus_hz=400000, realtime=False):
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.bus_hz = bus_hz
+        self.realtime = realtime
+        self.ram = bytearray(width * self.pages)
+        self.mode = PAGE                 # режим после сброса контроллера
+        self.column_window = (0, width - 1)
+        self.page_window = (0, self.pages - 1)
+        self.column = 0
+        self.page = 0
+        self.display_on = False
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes_written = 0
+        self.data_bytes = 0
+        self.bus_seconds = 0.0
+
+    def write(self, address, messages):
+        """Каждое сообщение - отдельная транзакция: управляющий байт и поток"""
+        seconds = 0.0
+        for message in messages:
+            message = bytes(message)
+            self.transactions += 1
+            self.bytes_written += len(message)
+            seconds += transaction_bits(len(message)) / self.bus_hz
+            if not message:
+                continue
+            if message[0] & 0x40:
+                self._data(message[1:])
+            else:
+                self._commands(message[1:])
+        self.bus_seconds += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def close(self):
+        pass
+
+    def _commands(self, stream):
+        i = 0
+        while i < len(stream):
+            command = stream[i]
+            count = COMMAND_ARGUMENTS.get(command, 0)
+            arguments = stream[i + 1:i + 1 + count]
+            i += 1 + count
+            if command == 0x20:
+                self.mode = arguments[0] & 0x03
+            elif command == 0x21:
+                self.column_window = (arguments[0] % self.width, arguments[1] % self.width)
+                self.column = self.column_window[0]
+            elif command == 0x22:
+                self.page_window = (arguments[0] % self.pages, arguments[1] % self.pages)
+                self.page = self.page_window[0]
+            elif 0xB0 <= command <= 0xB7:
+                self.page = (command & 0x07) % self.pages
+            elif command <= 0x0F:
+                self.column = (self.column & 0xF0) | command
+            elif 0x10 <= command <= 0x1F:
+                self.column = ((command & 0x0F) << 4) | (self.column & 0x0F)
+            elif command in (0xAE, 0xAF):
+                self.display_on = command == 0xAF
+
+    def _data(self, stream):
+        self.data_bytes += len(stream)
+        first_column, last_column = self.column_window
+        first_page, last_page = self.page_window
+        for value in stream:
+            if self.column < self.width:
+                self.ram[self.page * self.width + self.column] = value
+            if self.mode == PAGE:
+                self.column = min(self.column + 1, self.width - 1)
+            elif self.mode == VERTICAL:
+                self.page += 1
+                if self.page > last_page:
+                    self.page = first_page
+                    self.column = first_column if self.column >= last_column else self.column + 1
+            else:
+                self.column += 1
+                if self.column > last_column:
+                    self.column = first_column
+                    self.page = first_page if self.page >= last_page else self.page + 1
+
+    def image(self):
+        """Содержимое видеопамяти как изображение "1" (для проверок и снимков)"""
+        image = Image.new("1", (self.width, self.height))
+        pixels = image.load()
+        for page in range(self.pages):
+            for column in range(self.width):
+                value = self.ram[page * self.width + column]
+                for bit in range(8):
+                    if value >> bit & 1:
+                        pixels[column, page * 8 + bit] = 1
+        return image
+
+
+class EmulatedLuma:
+    """Устройство с поведением luma ssd1306 на EmulatedBus.
+
+    luma.core на smbus2 отправляет data() одним сообщением; со старым
+    smbus - блоками по 32 байта (chunk=32).
+    """
+
+    def __init__(self, bus, width=128, height=64, address=0x3C, chunk=None):
+        self.bus = bus
+        self.width = width
+        self.height = height
+        self.address = address
+        self.chunk = chunk
+        self._colstart = 0
+        # Последовательность инициализации luma.oled ssd1306
+        self.command(0xAE, 0xD5, 0x80, 0xA8, height - 1, 0xD3, 0x00, 0x40, 0x8D, 0x14,
+                     0x20, 0x00, 0xA1, 0xC8, 0xDA, 0x12, 0xD9, 0xF1, 0xDB, 0x40, 0xA4, 0xA6)
+        self.command(0x81, 0xCF)
+        self.clear()
+        self.command(0xAF)
+
+    def command(self, *commands):
+        self.bus.write(self.address, [bytes((0x00,) + commands)])
+
+    def data(self, data):
+        data = bytes(data)
+        chunk = self.chunk or len(data) or 1
+        self.bus.write(self.address, [b"\x40" + data[i:i + chunk] for i in range(0, len(data), chunk)])
+
+    def display(self, image):
+        from oled_framebuffer import image_to_pages
+        self.command(0x21, 0, self.width - 1, 0x22, 0, self.height // 8 - 1)
+        self.data(b"".join(image_to_pages(image.convert("1"))))
+
+    def clear(self):
+        self.display(Image.new("1", (self.width, self.height)))
+
+    def cleanup(self):
+        self.clear()
+        self.command(0xAE)
+
+
+def create_device(backend='luma', port=0, address=0x3C, width=128, height=64,
+                  bus_hz=400000, realtime=False):
+    """Устройство SSD1306 выбранного типа"""
+    if backend == 'luma':
+        from luma.core.interface.serial import i2c
+        from luma.oled.device import ssd1306
+        return ssd1306(i2c(port=port, address=address), width=width, height=height)
+    if backend == 'native':
+        from ssd1306_i2c import SSD1306
+        return SSD1306(port, address, width, height)
+    if backend == 'emulator':
+        return EmulatedLuma(EmulatedBus(width, height, bus_hz, realtime), width, height, address)
+    if backend == 'emulator-native':
+        from ssd1306_i2c import SSD1306
+        return SSD1306(port, address, width, height, bus=EmulatedBus(width, height, bus_hz, realtime))
+    raise ValueError(f"Неизвестный тип устройства: {backend}")
+
+
+def needs_i2c(backend):
+    """Нужен ли для устройства /dev/i2c-N"""
+    return not backend.startswith('emulator')
+
+
+def add_arguments(parser):
+    """Ключи выбора устройства для демонов"""
+    parser.add_argument('--backend', choices=BACKENDS, default='luma',
+                        help="устройство: luma, native (I2C_RDWR) или эмулятор без платы")
+    parser.add_argument('--port', type=int, default=0, help="номер шины /dev/i2c-N")
+    parser.add_argument('--bus-speed', type=int, default=400000,
+                        help="частота шины эмулятора, Гц (100000 или 400000)")
+    parser.add_argument('--realtime-bus', action='store_true',
+                        help="эмулятор ждет расчетное время передачи")
+
+
+def from_arguments(args):
+    return create_device(args.backend, port=args.port, bus_hz=args.bus_speed, realtime=args.realtime_bus)
+
+
+def load_daemon(filename, class_name):
+    """Класс демона из файла рядом (oled-display.py не импортируется по имени)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)
+
+
+DAEMONS = (
+    ('demon.py', 'SystemInfoDisplay'),
+    ('demon_simple.py', 'SimpleLogDisplay'),
+    ('oled-display.py', 'OLEDDisplay'),
+)
+
+SAMPLE_LOGS = [
+    "usb 1-1: new high-speed USB device number 2 using ehci-platform",
+    "EXT4-fs (mmcblk0p2): re-mounted. Quota mode: none.",
+    "sun20i-d1-pinctrl 2000000.pinctrl: initialized sunXi PIO driver",
+    "random: crng init done",
+    "rtl8723ds: wlan0: link becomes ready",
+]
+
+
+def sample_logs(display, frame):
+    """Строки журнала для кадра: новое сообщение каждые 10 кадров"""
+    shift = frame // 10 % len(SAMPLE_LOGS)
+    if hasattr(display, 'log_view'):
+        # demon.py: перенос при поступлении сообщения, в кадр - готовые строки
+        if frame % 10 == 0:
+            display.log_view.append(SAMPLE_LOGS[shift])
+        return tuple(display.log_view.visible())
+    return [message[:22] for message in SAMPLE_LOGS[shift:] + SAMPLE_LOGS[:shift]][:4]
+
+
+def benchmark(frames=300, backend='emulator', bus_speeds=BUS_SPEEDS):
+    """Время отрисовки кадра и трафик по шине для каждого демона"""
+    print(f"{'демон':<18}{'шина, Гц':>10}{'кадр, мкс':>11}{'транз./кадр':>13}"
+          f"{'байт/кадр':>11}{'шина, мс/кадр':>15}{'макс. кадр/с':>14}")
+    results = []
+    for filename, class_name in DAEMONS:
+        display_class = load_daemon(filename, class_name)
+        for bus_hz in bus_speeds:
+            display = display_class(device=create_device(backend, bus_hz=bus_hz))
+            bus = display.device.bus
+            bus.reset_counters()
+
+            started = time.perf_counter()
+            for i in range(frames):
+                # Часы и CPU меняются каждый кадр
+                display.render({
+                    'clock': f"{i // 60 % 24:02d}:{i % 60:02d}",
+                    'cpu': (i * 7) % 1000 / 10,
+                    'logs': sample_logs(display, i),
+                })
+            elapsed = time.perf_counter() - started
+
+            row = {
+                'daemon': filename,
+                'bus_hz': bus_hz,
+                'frame_us': elapsed / frames * 1e6,
+                'transactions': bus.transactions / frames,
+                'bytes': bus.bytes_written / frames,
+                'bus_ms': bus.bus_seconds / frames * 1000,
+            }
+            # Предел частоты кадров: отрисовка плюс передача
+            row['max_fps'] = 1000 / (row['bus_ms'] + row['frame_us'] / 1000)
+            results.append(row)
+            print(f"{filename:<18}{bus_hz:>10}{row['frame_us']:>11.0f}{row['transactions']:>13.1f}"
+                  f"{row['bytes']:>11.0f}{row['bus_ms']:>15.2f}{row['max_fps']:>14.1f}")
+            display.cpu.close()
+            display.kernel_log.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Устройства SSD1306 и замер демонов на эмуляторе")
+    parser.add_argument('--benchmark', action='store_true', help="замер всех демонов")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--backend', choices=('emulator', 'emulator-native'), default='emulator')
+    parser.add_argument('--bus-speed', type=int, action='append',
+                        help="частота шины, Гц (можно несколько раз)")
+    parser.add_argument('--snapshot', help="сохранить последний кадр эмулятора в PNG")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.frames, args.backend, args.bus_speed or BUS_SPEEDS)
+    if args.snapshot:
+        display = load_daemon(*DAEMONS[0])(device=create_device(args.backend))
+        display.display_system_info()
+        display.device.bus.image().save(args.snapshot)
+        print(f"Кадр сохранен: {args.snapshot}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Вывод на SSD1306 с передачей только изменившихся страниц.
+
+Память SSD1306 разбита на 8 страниц по 8 строк; байт страницы - это
+столбец из 8 пикселей (бит 0 - верхний). FramebufferDisplay хранит
+предыдущий кадр постранично, сравнивает с новым и для каждой
+изменившейся страницы отправляет только диапазон столбцов от первого до
+последнего отличающегося байта (команды 0x21/0x22 задают окно записи).
+Если на экране поменялись только часы, по I2C уходит несколько десятков
+байт вместо 1 КиБ.
+
+Использование вместо luma.core.render.canvas:
+
+    screen = FramebufferDisplay(device)
+    with screen.frame() as draw:
+        draw.text((0, 0), "12:00", fill="white")
+
+Вместо устройства luma можно передать ssd1306_i2c.SSD1306 - тогда
+каждая страница уходит одним вызовом ioctl.
+"""
+
+from contextlib import contextmanager
+
+from PIL import Image, ImageDraw
+
+SET_COLUMN_ADDRESS = 0x21
+SET_PAGE_ADDRESS = 0x22
+PAGE_HEIGHT = 8
+
+
+def image_to_pages(image):
+    """Кадр в формате "1" -> список байтовых строк по страницам.
+
+    После поворота на 270 градусов строка изображения - это столбец
+    экрана, а каждый ее байт - столбец одной страницы в нужном порядке
+    бит (старший бит - нижняя строка страницы, страницы в обратном
+    порядке). Один поворот и срезы с шагом вместо crop на каждую страницу.
+    """
+    width, height = image.size
+    pages = height // PAGE_HEIGHT
+    raw = image.transpose(Image.Transpose.ROTATE_270).tobytes()
+    return [raw[pages - 1 - page::pages] for page in range(pages)]
+
+
+def changed_range(old, new):
+    """Первый и последний отличающийся столбец страницы или None"""
+    if old == new:
+        return None
+    first = next(i for i, (a, b) in enumerate(zip(old, new)) if a != b)
+    last = len(new) - 1 - next(i for i, (a, b) in enumerate(zip(reversed(old), reversed(new))) if a != b)
+    return first, last
+
+
+class FramebufferDisplay:
+    """Инкрементальный вывод кадров на устройство luma ssd1306"""
+
+    def __init__(self, device):
+        self.device = device
+        self.width = device.width
+        self.height = device.height
+        # Смещение столбцов у некоторых размеров дисплея (в luma - _colstart)
+        self.column_offset = getattr(device, '_colstart', 0)
+        self.pages = None
+        # Кадр и ImageDraw выделяются один раз и очищаются перед каждым кадром
+        self.image = Image.new("1", (self.width, self.height))
+        self.draw = ImageDraw.Draw(self.image)
+        # Статистика для оценки нагрузки на шину
+        self.frames = 0
+        self.pages_sent = 0
+        self.bytes_sent = 0
+
+    @contextmanager
+    def frame(self):
+        """Аналог canvas(device): рисование на пустом кадре и вывод изменений"""
+        self.image.paste(0, (0, 0, self.width, self.height))
+        yield self.draw
+        self.show(self.image)
+
+    @contextmanager
+    def canvas(self):
+        """То же, но с самим изображением - для копирования готовых растров (paste)"""
+        self.image.paste(0, (0, 0, self.width, self.height))
+        yield self.image
+        self.show(self.image)
+
+    def show(self, image):
+        """Вывод кадра; возвращает число отправленных байт данных"""
+        if hasattr(self.device, 'preprocess'):
+            image = self.device.preprocess(image)
+        if image.mode != "1":
+            image = image.convert("1")
+
+        pages = image_to_pages(image)
+        sent = 0
+        for page, data in enumerate(pages):
+            if self.pages is None:
+                columns = (0, self.width - 1)
+            else:
+                columns = changed_range(self.pages[page], data)
+                if columns is None:
+                    continue
+            first, last = columns
+            if hasattr(self.device, 'write_window'):
+                # ssd1306_i2c: окно и данные одним ioctl
+                self.device.write_window(self.column_offset + first, self.column_offset + last,
+                                         page, page, data[first:last + 1])
+            else:
+                self.device.command(SET_COLUMN_ADDRESS,
+                                    self.column_offset + first, self.column_offset + last)
+                self.device.command(SET_PAGE_ADDRESS, page, page)
+                self.device.data(list(data[first:last + 1]))
+            sent += last - first + 1
+            self.pages_sent += 1
+
+        self.pages = pages
+        self.frames += 1
+        self.bytes_sent += sent
+        return sent
+
+    def invalidate(self):
+        """Следующий кадр будет отправлен целиком (например, после сбоя на шине)"""
+        self.pages = None
+
+    def clear(self):
+        self.image.paste(0, (0, 0, self.width, self.height))
+        self.show(self.image)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Планировщик обновления OLED-экрана на asyncio.
+
+Каждый источник данных (часы, CPU, память, журнал ядра) опрашивается
+со своим периодом или по готовности дескриптора (/dev/kmsg), и экран
+перерисовывается только когда значение какого-либо источника
+изменилось. Периодические источники привязаны к границам секунд
+настенного времени: следующий момент вычисляется от time.time(), а не
+прибавлением периода, поэтому время отрисовки не накапливается и часы
+не отстают.
+
+    scheduler = OledScheduler(render)          # render(values) рисует кадр
+    scheduler.every('clock', 1, lambda: datetime.now().strftime('%H:%M'))
+    scheduler.every('cpu', 3, sampler_function)
+    scheduler.on_readable('logs', kernel_log.fileno(), read_logs)
+    scheduler.run()
+"""
+
+import asyncio
+import math
+import signal
+import time
+
+# Таймер срабатывает чуть позже границы, чтобы часы уже показывали новое значение
+TICK_SLACK = 0.002
+
+
+class OledScheduler:
+    """Источники данных и перерисовка экрана по изменениям"""
+
+    def __init__(self, render, min_interval=0.1):
+        """render(values) получает словарь {имя источника: значение};
+        перерисовки не чаще min_interval секунд (например, при потоке
+        сообщений ядра); render=None - только опрос источников без экрана"""
+        self.render = render
+        self.min_interval = min_interval
+        self.values = {}
+        self.redraws = 0
+        self._periodic = []
+        self._readers = []
+        self._loop = None
+        self._stopped = None
+        self._redraw_handle = None
+        self._last_redraw = 0.0
+
+    def every(self, name, interval, read):
+        """Опрос read() каждые interval секунд по настенным часам"""
+        self._periodic.append((name, interval, read))
+
+    def on_readable(self, name, fd, read, fallback_interval=3):
+        """Вызов read(), когда дескриптор fd готов к чтению.
+
+        Если дескриптора нет (например, нет доступа к /dev/kmsg), источник
+        опрашивается раз в fallback_interval секунд.
+        """
+        if fd is None:
+            self.every(name, fallback_interval, read)
+        else:
+            self._readers.append((name, fd, read))
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            pass
+
+    def stop(self):
+        """Остановка; можно вызывать из другого потока"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._finish)
+
+    def _finish(self):
+        if not self._stopped.done():
+            self._stopped.set_result(None)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = self._loop.create_future()
+        try:
+            self._loop.add_signal_handler(signal.SIGTERM, self._finish)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        for name, _, read in self._periodic + self._readers:
+            self.values[name] = read()
+        self._redraw()
+
+        for name, interval, read in self._periodic:
+            self._schedule(name, interval, read)
+        for name, fd, read in self._readers:
+            self._loop.add_reader(fd, self._update, name, read)
+
+        try:
+            await self._stopped
+        finally:
+            for _, fd, _ in self._readers:
+                self._loop.remove_reader(fd)
+
+    def _schedule(self, name, interval, read):
+        # Следующая граница периода по настенным часам
+        now = time.time()
+        next_tick = math.floor(now / interval + 1) * interval
+        self._loop.call_later(next_tick - now + TICK_SLACK, self._tick, name, interval, read)
+
+    def _tick(self, name, interval, read):
+        self._update(name, read)
+        self._schedule(name, interval, read)
+
+    def _update(self, name, read):
+        try:
+            value = read()
+        except Exception as e:
+            print(f"Ошибка источника {name}: {e}")
+            return
+        if value != self.values.get(name):
+            self.values[name] = value
+            self._request_redraw()
+
+    def _request_redraw(self):
+        if self._redraw_handle is not None:
+            return
+        delay = self._last_redraw + self.min_interval - self._loop.time()
+        self._redraw_handle = self._loop.call_later(max(delay, 0), self._redraw)
+
+    def _redraw(self):
+        self._redraw_handle = None
+        if self.render is None:
+            return
+        self._last_redraw = self._loop.time()
+        self.redraws += 1
+        try:
+            self.render(dict(self.values))
+        except Exception as e:
+            print(f"Ошибка отрисовки: {e}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Текстовый слой для OLED: кэш растровых строк и окно журнала.
+
+draw.text() заново растеризует каждый глиф шрифта в каждом кадре, а
+перенос строк в wrap_text() повторялся при каждом обновлении. Здесь:
+
+- TextRenderer растеризует строку один раз в 1-битное изображение
+  ширины экрана и хранит его в LRU-кэше, ограниченном по памяти;
+  ширины символов для переноса тоже кэшируются;
+- LogView переносит сообщение по ширине экрана в пикселях один раз,
+  при поступлении, и хранит готовые строки; кадр собирается копированием
+  (paste) закэшированных изображений строк, прокрутка - это сдвиг
+  индекса первой видимой строки.
+
+    renderer = TextRenderer(font, width=128, line_height=10)
+    log_view = LogView(renderer, lines=5)
+    log_view.append("usb 1-1: new high-speed USB device")
+    log_view.draw(image, 0, 16)
+"""
+
+from collections import OrderedDict, deque
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Память под одну строку сверх самого растра (объект Image и ключ кэша), байт
+LINE_OVERHEAD = 200
+# По умолчанию 256 КиБ - около тысячи строк 128x10, заметно меньше 1% от 64 МБ
+DEFAULT_CACHE_BYTES = 256 * 1024
+
+
+class TextRenderer:
+    """Растеризация строк с LRU-кэшем готовых изображений"""
+
+    def __init__(self, font=None, width=128, line_height=10, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.font = font if font is not None else ImageFont.load_default()
+        self.width = width
+        self.line_height = line_height
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.char_widths = {}
+        # Статистика кэша
+        self.hits = 0
+        self.misses = 0
+
+    def line(self, text):
+        """Изображение строки в формате "1" (width x line_height)"""
+        bitmap = self.cache.get(text)
+        if bitmap is not None:
+            self.cache.move_to_end(text)
+            self.hits += 1
+            return bitmap
+
+        self.misses += 1
+        bitmap = Image.new("1", (self.width, self.line_height))
+        ImageDraw.Draw(bitmap).text((0, 0), text, font=self.font, fill="white")
+        self.cache[text] = bitmap
+        self.cached_bytes += self._cost(bitmap)
+        while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= self._cost(evicted)
+        return bitmap
+
+    def _cost(self, bitmap):
+        return (bitmap.width + 7) // 8 * bitmap.height + LINE_OVERHEAD
+
+    def text_width(self, text):
+        """Ширина текста в пикселях по кэшу ширин символов (без кернинга)"""
+        total = 0
+        for char in text:
+            width = self.char_widths.get(char)
+            if width is None:
+                width = self.font.getlength(char)
+                self.char_widths[char] = width
+            total += width
+        return total
+
+    def wrap(self, text, width=None):
+        """Перенос по словам в пределах width пикселей; длинные слова режутся по символам"""
+        width = self.width if width is None else width
+        space = self.text_width(" ")
+        lines = []
+        current, current_width = "", 0
+
+        for word in text.split():
+            word_width = self.text_width(word)
+            if current and current_width + space + word_width <= width:
+                current += " " + word
+                current_width += space + word_width
+                continue
+            if current:
+                lines.append(current)
+            current, current_width = "", 0
+
+            while word_width > width:
+                # Слово не помещается в строку целиком
+                piece, piece_width = "", 0
+                for char in word:
+                    char_width = self.char_widths[char]
+                    if piece and piece_width + char_width > width:
+                        break
+                    piece += char
+                    piece_width += char_width
+                lines.append(piece)
+                word = word[len(piece):]
+                word_width -= piece_width
+            current, current_width = word, word_width
+
+        if current:
+            lines.append(current)
+        return lines
+
+
+class LogView:
+    """Окно журнала из заранее перенесенных строк с прокруткой"""
+
+    def __init__(self, renderer, lines=5, history=64):
+        self.renderer = renderer
+        self.lines = lines
+        self.wrapped = deque(maxlen=history)
+        # Смещение окна от конца журнала в строках (0 - последние строки)
+        self.offset = 0
+        # Меняется при каждом изменении содержимого или прокрутке
+        self.version = 0
+        self.placeholder = False
+
+    def append(self, message):
+        """Перенос нового сообщения один раз, при поступлении"""
+        new_lines = self.renderer.wrap(message.strip())
+        if not new_lines:
+            return
+        if self.placeholder:
+            self.clear()
+        self.wrapped.extend(new_lines)
+        if self.offset:
+            # Прокрученное окно остается на месте
+            self.offset = min(self.offset + len(new_lines), self.max_offset())
+        self.version += 1
+
+    def set_placeholder(self, text):
+        """Текст на пустом журнале ("No kernel messages", ошибка доступа)"""
+        if not self.wrapped:
+            self.wrapped.extend(self.renderer.wrap(text))
+            self.placeholder = True
+            self.version += 1
+
+    def clear(self):
+        self.wrapped.clear()
+        self.placeholder = False
+        self.offset = 0
+        self.version += 1
+
+    def max_offset(self):
+        return max(len(self.wrapped) - self.lines, 0)
+
+    def scroll(self, delta):
+        """Прокрутка на delta строк назад (delta > 0) или вперед"""
+        offset = min(max(self.offset + delta, 0), self.max_offset())
+        if offset != self.offset:
+            self.offset = offset
+            self.version += 1
+        return self.offset
+
+    def visible(self):
+        """Строки, видимые в окне"""
+        end = len(self.wrapped) - self.offset
+        start = max(end - self.lines, 0)
+        return [self.wrapped[i] for i in range(start, end)]
+
+    def draw(self, image, x=0, y=0):
+        """Копирование закэшированных строк в кадр"""
+        for i, text in enumerate(self.visible()):
+            image.paste(self.renderer.line(text), (x, y + i * self.renderer.line_height))
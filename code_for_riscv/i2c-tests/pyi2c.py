@@ -1,33 +1,61 @@
 #!/usr/bin/env python3
 
-import time
-import psutil
-from luma.core.interface.serial import i2c
-from luma.oled.device import ssd1306
-from luma.core.render import canvas
-
-def get_system_info():
-    cpu = psutil.cpu_percent()
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
+import argparse
+import sys
+
+import low_interference
+import monitor_profiler
+import oled_backend
+from metrics_collector import FileSink, MetricsCollector, OledSink, PrometheusSink
+from oled_framebuffer import FramebufferDisplay
+from oled_scheduler import OledScheduler
+
+def get_system_info(sample):
     return {
-        'cpu': f"CPU: {cpu}%",
-        'mem': f"MEM: {memory.percent}%",
-        'disk': f"DISK: {disk.percent}%"
+        'cpu': f"CPU: {sample['cpu_busy_percent']:.1f}%",
+        'mem': f"MEM: {sample['memory_used_percent']:.1f}%",
+        'disk': f"DISK: {sample['disk_used_percent']:.1f}%"
     }
 
+def format_lines(sample):
+    info = get_system_info(sample)
+    return ["System Info:", info['cpu'], info['mem'], info['disk']]
+
 def main():
-    serial = i2c(port=0, address=0x3C)
-    device = ssd1306(serial)
-    
-    while True:
-        info = get_system_info()
-        with canvas(device) as draw:
-            draw.text((0, 0), "System Info:", fill="white")
-            draw.text((0, 15), info['cpu'], fill="white")
-            draw.text((0, 30), info['mem'], fill="white")
-            draw.text((0, 45), info['disk'], fill="white")
-        time.sleep(2)
+    parser = argparse.ArgumentParser(description="Метрики платы на SSD1306")
+    parser.add_argument('--interval', type=float, default=2, help="период снимков, с")
+    parser.add_argument('--file', help="дополнительно писать метрики в CSV-файл")
+    parser.add_argument('--prometheus', help="порт на 127.0.0.1 или путь unix-сокета для Prometheus")
+    monitor_profiler.add_arguments(parser)
+    low_interference.add_arguments(parser)
+    oled_backend.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = monitor_profiler.from_arguments(args)
+
+    device = oled_backend.from_arguments(args)
+    screen = FramebufferDisplay(device)
+
+    # Один снимок метрик на период; экран, файл и Prometheus получают его же
+    sinks = [OledSink(screen, format_lines)]
+    if args.file:
+        sinks.append(FileSink(args.file))
+    if args.prometheus:
+        sinks.append(PrometheusSink(int(args.prometheus) if args.prometheus.isdigit() else args.prometheus))
+    collector = MetricsCollector(args.interval, sinks=sinks)
+    if profiler:
+        profiler.wrap(collector, 'collect', 'sample')
+        profiler.wrap(sinks[0], 'publish', 'render')
+        profiler.instrument_device(device)
+
+    scheduler = OledScheduler(None)
+    collector.attach(scheduler)
+    low_interference.from_arguments(args)
+    try:
+        scheduler.run()
+    finally:
+        collector.close()
+    if profiler and not profiler.report(args.profile or None):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
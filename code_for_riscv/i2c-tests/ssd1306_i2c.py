@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Драйвер SSD1306 напрямую через /dev/i2c-N (ioctl I2C_RDWR).
+
+Вместо побайтовой записи (i2cset в test.sh) или общего интерфейса luma
+данные уходят блоками: одно сообщение I2C - управляющий байт 0x40 и до
+max_block байт видеопамяти, несколько сообщений - один вызов ioctl.
+Окно записи (команды 0x21/0x22) и данные передаются в одном вызове,
+поэтому обновление одной страницы - это один системный вызов.
+
+Методы command(), data(), display(), clear() и атрибуты width/height
+совместимы с luma.oled.device.ssd1306, так что устройство можно
+передать в FramebufferDisplay.
+
+Замер скорости:
+
+    python3 ssd1306_i2c.py --benchmark --port 0 --frames 200
+"""
+
+import argparse
+import ctypes
+import fcntl
+import os
+import subprocess
+import time
+
+I2C_RDWR = 0x0707
+I2C_RDWR_MAX_MSGS = 42        # I2C_RDWR_IOCTL_MAX_MSGS в ядре
+I2C_MAX_MSG_LEN = 8192        # ограничение i2c-dev на одно сообщение
+
+CONTROL_COMMAND = 0x00
+CONTROL_DATA = 0x40
+
+SET_COLUMN_ADDRESS = 0x21
+SET_PAGE_ADDRESS = 0x22
+
+
+class I2cMsg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+class I2cRdwrData(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(I2cMsg)),
+        ('nmsgs', ctypes.c_uint32),
+    ]
+
+
+class I2cBus:
+    """Запись нескольких сообщений одним ioctl I2C_RDWR"""
+
+    def __init__(self, port=0):
+        self.port = port
+        self.fd = os.open(f"/dev/i2c-{port}", os.O_RDWR)
+        self.transactions = 0
+        self.bytes_written = 0
+
+    def write(self, address, messages):
+        """messages - список bytes; каждое уходит отдельным сообщением (с повторным START)"""
+        for start in range(0, len(messages), I2C_RDWR_MAX_MSGS):
+            chunk = messages[start:start + I2C_RDWR_MAX_MSGS]
+            buffers = [(ctypes.c_uint8 * len(message)).from_buffer_copy(message) for message in chunk]
+            msgs = (I2cMsg * len(chunk))()
+            for msg, buffer in zip(msgs, buffers):
+                msg.addr = address
+                msg.flags = 0
+                msg.len = len(buffer)
+                msg.buf = ctypes.cast(buffer, ctypes.POINTER(ctypes.c_uint8))
+            request = I2cRdwrData(msgs, len(chunk))
+            fcntl.ioctl(self.fd, I2C_RDWR, ctypes.addressof(request))
+            self.transactions += 1
+            self.bytes_written += sum(len(message) for message in chunk)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class SSD1306:
+    """SSD1306 в режиме горизонтальной адресации"""
+
+    def __init__(self, port=0, address=0x3C, width=128, height=64, max_block=1024, bus=None):
+        self.bus = bus if bus is not None else I2cBus(port)
+        self.address = address
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        # Некоторые контроллеры I2C ограничивают длину сообщения - тогда max_block меньше
+        self.max_block = max(1, min(max_block, I2C_MAX_MSG_LEN - 1))
+        self.init_display()
+
+    def init_display(self):
+        self.command(
+            0xAE,                          # дисплей выключен
+            0xD5, 0x80,                    # частота тактирования
+            0xA8, self.height - 1,         # multiplex ratio
+            0xD3, 0x00,                    # без вертикального смещения
+            0x40,                          # начальная строка 0
+            0x8D, 0x14,                    # charge pump включен
+            0x20, 0x00,                    # горизонтальная адресация
+            0xA1,                          # SEG remap
+            0xC8,                          # COM снизу вверх
+            0xDA, 0x12 if self.height == 64 else 0x02,
+            0x81, 0xCF,                    # контраст
+            0xD9, 0xF1,                    # pre-charge
+            0xDB, 0x40,                    # VCOMH
+            0xA4,                          # вывод содержимого RAM
+            0xA6,                          # без инверсии
+        )
+        self.clear()
+        self.command(0xAF)                 # дисплей включен
+
+    def command(self, *commands):
+        """Команды одним сообщением: 0x00 и байты команд"""
+        self.bus.write(self.address, [bytes((CONTROL_COMMAND,) + commands)])
+
+    def _data_messages(self, data):
+        data = bytes(data)
+        return [bytes((CONTROL_DATA,)) + data[start:start + self.max_block]
+                for start in range(0, len(data), self.max_block)]
+
+    def data(self, data):
+        """Данные видеопамяти блоками по max_block байт"""
+        self.bus.write(self.address, self._data_messages(data))
+
+    def write_window(self, first_column, last_column, first_page, last_page, data):
+        """Окно записи и данные одним вызовом ioctl"""
+        window = bytes((CONTROL_COMMAND, SET_COLUMN_ADDRESS, first_column, last_column,
+                        SET_PAGE_ADDRESS, first_page, last_page))
+        self.bus.write(self.address, [window] + self._data_messages(data))
+
+    def write_frame(self, frame):
+        """Полный кадр: width * pages байт по страницам"""
+        self.write_window(0, self.width - 1, 0, self.pages - 1, frame)
+
+    def display(self, image):
+        """Вывод изображения PIL целиком (как luma device.display)"""
+        from oled_framebuffer import image_to_pages
+        if image.mode != "1":
+            image = image.convert("1")
+        self.write_frame(b"".join(image_to_pages(image)))
+
+    def clear(self):
+        self.write_frame(bytes(self.width * self.pages))
+
+    def cleanup(self):
+        self.clear()
+        self.command(0xAE)
+        self.bus.close()
+
+
+def benchmark(port, address, frames, max_block):
+    """Кадров и байт в секунду: этот драйвер, luma (если установлена) и i2cset"""
+    results = []
+    frame_a = bytes([0xFF]) * 1024
+    frame_b = bytes(1024)
+
+    device = SSD1306(port, address, max_block=max_block)
+    started = time.perf_counter()
+    for i in range(frames):
+        device.write_frame(frame_a if i % 2 else frame_b)
+    elapsed = time.perf_counter() - started
+    results.append(("I2C_RDWR, полный кадр", frames / elapsed, frames * 1024 / elapsed))
+
+    started = time.perf_counter()
+    for i in range(frames):
+        page = i % device.pages
+        device.write_window(0, device.width - 1, page, page, frame_a[:device.width] if i % 2 else frame_b[:device.width])
+    elapsed = time.perf_counter() - started
+    results.append(("I2C_RDWR, одна страница", frames / elapsed, frames * device.width / elapsed))
+    device.bus.close()
+
+    try:
+        from PIL import Image
+        from luma.core.interface.serial import i2c
+        from luma.oled.device import ssd1306
+
+        luma_device = ssd1306(i2c(port=port, address=address), width=128, height=64)
+        images = [Image.new("1", (128, 64), color) for color in (0, 1)]
+        count = max(frames // 4, 1)
+        started = time.perf_counter()
+        for i in range(count):
+            luma_device.display(images[i % 2])
+        elapsed = time.perf_counter() - started
+        results.append(("luma.oled", count / elapsed, count * 1024 / elapsed))
+    except ImportError:
+        results.append(("luma.oled (не установлена)", None, None))
+
+    # i2cset - по процессу на байт; замер на 64 байтах и пересчет на кадр
+    try:
+        count = 64
+        started = time.perf_counter()
+        for _ in range(count):
+            subprocess.run(["i2cset", "-y", str(port), hex(address), "0x40", "0x00"], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - started
+        results.append(("i2cset (test.sh)", count / 1024 / elapsed, count / elapsed))
+    except (OSError, subprocess.CalledProcessError):
+        results.append(("i2cset (недоступен)", None, None))
+
+    print(f"\n{'способ':<28}{'кадров/с':>12}{'байт/с':>14}")
+    for name, fps, bps in results:
+        if fps is None:
+            print(f"{name:<28}{'-':>12}{'-':>14}")
+        else:
+            print(f"{name:<28}{fps:>12.2f}{bps:>14,.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSD1306 через I2C_RDWR")
+    parser.add_argument('--port', type=int, default=0, help="номер шины /dev/i2c-N")
+    parser.add_argument('--address', type=lambda value: int(value, 0), default=0x3C)
+    parser.add_argument('--max-block', type=int, default=1024,
+                        help="наибольшая длина сообщения с данными")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--benchmark', action='store_true', help="замер скорости вывода")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.port, args.address, args.frames, args.max_block)
+        return
+
+    # Без аргументов - то же, что test.sh: заливка, очистка и узор
+    device = SSD1306(args.port, args.address, max_block=args.max_block)
+    device.write_frame(bytes([0xFF]) * 1024)
+    time.sleep(1)
+    device.clear()
+    device.write_frame((bytes([1, 4, 16, 64, 16, 4, 1]) * 147)[:1024])
+    device.bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,21 @@
 const int PIN_OUT = 7;        // Arduino → Lichee (сигнал "начал")
 const int PIN_IN  = 20;       // Lichee → Arduino (ответный импульс)
 
-const int GROUP_SIZE = 500;       // Количество импульсов в группе
-const int NUM_GROUPS = 50;        // Количество групп
+const int GROUP_SIZE = 500;       // Количество импульсов в группе (максимум для CONFIG)
+const int NUM_GROUPS = 50;        // Количество групп (максимум для CONFIG)
 
 volatile bool active = false;
 const unsigned int DELAY_MICROSECONDS = 300;
 
+// Текущие параметры измерений, меняются командой CONFIG
+int groupSize = GROUP_SIZE;
+int groupsCount = NUM_GROUPS;
+unsigned int pulseDelayUs = DELAY_MICROSECONDS;
+
+// 115200 не хватает для потокового режима (8 байт на импульс),
+// 500000 делится без ошибки при 16 МГц
+const unsigned long SERIAL_BAUD = 500000;
+
 // Массивы для статистики
 float groupAvgLatency[NUM_GROUPS];     // Средняя задержка по группам
 float groupMinLatency[NUM_GROUPS];     // Минимальная задержка по группам
@@ -34,8 +43,38 @@ uint8_t pin7Mask;
 volatile uint8_t* portInputRegisterPin20;
 uint8_t pin20Mask;
 
+// Потоковый режим: каждое измерение отправляется отдельной записью
+// (формат см. binary_stream.py)
+const uint8_t STREAM_SYNC = 0xA5;
+const uint8_t STREAM_RING_SIZE = 64;      // степень двойки
+const uint8_t STREAM_RING_MASK = STREAM_RING_SIZE - 1;
+
+struct StreamSample {
+  uint16_t seq;
+  uint16_t latency;
+  uint16_t jitter;
+};
+
+volatile StreamSample streamRing[STREAM_RING_SIZE];
+volatile uint8_t streamHead = 0;          // пишет прерывание
+volatile uint8_t streamTail = 0;          // читает loop()
+volatile bool streaming = false;
+volatile uint16_t streamSeq = 0;
+volatile unsigned long streamCount = 0;
+volatile unsigned long streamDropped = 0;
+volatile unsigned long lastStreamLatency = 0;
+unsigned long streamLimit = 0;            // 0 - до команды STOP
+
+// Итоги каждой группы для живого графика (команда LIVE), по умолчанию выключены
+bool liveProgress = false;
+
+// Номер запроса из префикса "#<номер> " команды; повторяется полем seq
+// в ответе на эту команду, -1 - команда без номера (ответ без seq)
+long requestSeq = -1;
+long sendSeq = -1;                        // номер SEND для отложенной отправки данных
+
 void setup() {
-  Serial.begin(115200);
+  Serial.begin(SERIAL_BAUD);
   
   // Инициализация прямого доступа к портам для PIN_OUT (пин 7)
   pinMode(PIN_OUT, OUTPUT);
@@ -60,31 +99,40 @@ void loop() {
   checkSerialCommands();
 
   // Если флаг установлен, отправляем данные
-  if (sendDataFlag && (groupIndex == NUM_GROUPS)) {
+  if (sendDataFlag && (groupIndex == groupsCount)) {
     sendAveragedJsonData();
     sendDataFlag = false;
     collectingData = false;
   }
   
-  // Отправляем импульсы, если собираем данные
-  if (collectingData && (groupIndex < NUM_GROUPS)) {
-    // Посылаем импульс на Lichee
-    t_start = micros();
-    active = !active;
-    if (active) {
-      *portOutputRegisterPin7 |= pin7Mask;   // Установить HIGH
+  // Потоковый режим: отдаем накопленные записи и посылаем следующий импульс
+  if (streaming) {
+    drainStreamRing();
+    noInterrupts();
+    unsigned long count = streamCount;
+    interrupts();
+    if (streamLimit && count >= streamLimit) {
+      stopStreaming();
     } else {
-      *portOutputRegisterPin7 &= ~pin7Mask;  // Установить LOW
+      sendPulse();
     }
-    delayMicroseconds(DELAY_MICROSECONDS);
+    return;
+  }
+
+  // Отправляем импульсы, если собираем данные
+  if (collectingData && (groupIndex < groupsCount)) {
+    sendPulse();
     
     // Если группа завершена, обрабатываем статистику
-    if (measurementInGroup >= GROUP_SIZE) {
+    if (measurementInGroup >= groupSize) {
       processGroupStatistics();
+      if (liveProgress) {
+        sendGroupProgress();
+      }
       groupIndex++;      
       measurementInGroup = 0;
 
-      if (groupIndex == NUM_GROUPS) {
+      if (groupIndex == groupsCount) {
         Serial.println(F("{\"status\":\"data_ready\",\"message\":\"All groups collected\"}"));
         collectingData = false;
       }
@@ -92,8 +140,43 @@ void loop() {
   }
 }
 
+void sendPulse() {
+  // Посылаем импульс на Lichee
+  t_start = micros();
+  active = !active;
+  if (active) {
+    *portOutputRegisterPin7 |= pin7Mask;   // Установить HIGH
+  } else {
+    *portOutputRegisterPin7 &= ~pin7Mask;  // Установить LOW
+  }
+  delayMicroseconds(pulseDelayUs);
+}
+
 void onResponse() {
-  if (collectingData && groupIndex < NUM_GROUPS && measurementInGroup < GROUP_SIZE) {
+  if (streaming) {
+    unsigned long latency = micros() - t_start;
+    unsigned long jitter = 0;
+    if (streamCount > 0) {
+      jitter = abs((long)(latency - lastStreamLatency));
+    }
+    lastStreamLatency = latency;
+
+    uint8_t next = (streamHead + 1) & STREAM_RING_MASK;
+    if (next == streamTail) {
+      // Порт не успевает - пропуск виден на ПК по разрыву номеров
+      streamDropped++;
+    } else {
+      streamRing[streamHead].seq = streamSeq;
+      streamRing[streamHead].latency = latency > 0xFFFF ? 0xFFFF : latency;
+      streamRing[streamHead].jitter = jitter > 0xFFFF ? 0xFFFF : jitter;
+      streamHead = next;
+    }
+    streamSeq++;
+    streamCount++;
+    return;
+  }
+
+  if (collectingData && groupIndex < groupsCount && measurementInGroup < groupSize) {
     unsigned long currentTime = micros();
     
     // Рассчитываем задержку (latency)
@@ -112,7 +195,7 @@ void onResponse() {
 }
 
 void processGroupStatistics() {
-  if (GROUP_SIZE == 0) return;
+  if (groupSize == 0) return;
   
   // Для latency считаем min, max и среднее
   unsigned long minLatency = currentGroupLatency[0];
@@ -123,7 +206,7 @@ void processGroupStatistics() {
   unsigned long sumJitter = currentGroupJitter[0];
   
   // Обрабатываем остальные измерения
-  for (int i = 1; i < GROUP_SIZE; i++) {
+  for (int i = 1; i < groupSize; i++) {
     unsigned long latency = currentGroupLatency[i];
     
     // Обновляем min/max для latency
@@ -135,16 +218,65 @@ void processGroupStatistics() {
   }
   
   // Сохраняем статистику группы
-  groupAvgLatency[groupIndex] = (float)sumLatency / GROUP_SIZE;
+  groupAvgLatency[groupIndex] = (float)sumLatency / groupSize;
   groupMinLatency[groupIndex] = (float)minLatency;
   groupMaxLatency[groupIndex] = (float)maxLatency;
-  groupAvgJitter[groupIndex] = (float)sumJitter / (GROUP_SIZE-1);
+  groupAvgJitter[groupIndex] = (float)sumJitter / (groupSize-1);
+}
+
+void sendGroupProgress() {
+  // Строка после каждой группы для живого графика на ПК. Она длиннее
+  // буфера передачи (64 байта), поэтому Serial.print ждет, а прерывания
+  // передачи идут во время импульсов следующей группы - отсюда только
+  // по LIVE 1, обычные запуски измеряются без нее
+  Serial.print(F("{\"status\":\"group\",\"session_id\":"));
+  Serial.print(sessionId);
+  Serial.print(F(",\"group\":"));
+  Serial.print(groupIndex);
+  Serial.print(F(",\"groups\":"));
+  Serial.print(groupsCount);
+  Serial.print(F(",\"avg\":"));
+  Serial.print(groupAvgLatency[groupIndex], 1);
+  Serial.print(F(",\"min\":"));
+  Serial.print(groupMinLatency[groupIndex], 0);
+  Serial.print(F(",\"max\":"));
+  Serial.print(groupMaxLatency[groupIndex], 0);
+  Serial.print(F(",\"jitter\":"));
+  Serial.print(groupAvgJitter[groupIndex], 1);
+  Serial.println(F("}"));
+}
+
+void beginReply(const __FlashStringHelper* status) {
+  // Начало ответа {"status":"...","seq":N - остальные поля дописывает вызывающий
+  Serial.print(F("{\"status\":\""));
+  Serial.print(status);
+  Serial.print('"');
+  if (requestSeq >= 0) {
+    Serial.print(F(",\"seq\":"));
+    Serial.print(requestSeq);
+  }
+}
+
+void replyError(const __FlashStringHelper* message) {
+  beginReply(F("error"));
+  Serial.print(F(",\"message\":\""));
+  Serial.print(message);
+  Serial.println(F("\"}"));
 }
 
 void checkSerialCommands() {
   if (Serial.available() > 0) {
     String command = Serial.readStringUntil('\n');
     command.trim();
+
+    // Команда с номером запроса: "#17 STATUS"
+    requestSeq = -1;
+    if (command.startsWith("#")) {
+      int space = command.indexOf(' ');
+      requestSeq = command.substring(1, space > 0 ? space : command.length()).toInt();
+      command = space > 0 ? command.substring(space + 1) : "";
+      command.trim();
+    }
     
     if (command == "START") {
       // Начинаем сбор данных
@@ -152,18 +284,53 @@ void checkSerialCommands() {
       measurementInGroup = 0;
       sendDataFlag = false;
       collectingData = true;
+      // Каждый запуск - своя сессия (начало отсчета случайное при включении)
+      sessionId++;
       
-      Serial.println(F("{\"status\":\"started\",\"message\":\"Measurement started 20 groups 50 pulses\"}"));
+      beginReply(F("started"));
+      Serial.print(F(",\"session_id\":"));
+      Serial.print(sessionId);
+      Serial.print(F(",\"message\":\"Measurement started "));
+      Serial.print(groupsCount);
+      Serial.print(F(" groups "));
+      Serial.print(groupSize);
+      Serial.println(F(" pulses\"}"));
     }
     else if (command == "SEND") {
       // Запрашиваем отправку данных
-      if (groupIndex == NUM_GROUPS) {
-        Serial.println(F("{\"status\":\"sending\",\"message\":\"Preparing to send averaged data\"}"));
+      if (groupIndex == groupsCount) {
+        beginReply(F("sending"));
+        Serial.println(F(",\"message\":\"Preparing to send averaged data\"}"));
+        sendSeq = requestSeq;
         sendDataFlag = true;
       } else {
-        Serial.println(F("{\"status\":\"error\",\"message\":\"Data not ready yet\"}"));
+        replyError(F("Data not ready yet"));
       }
     }
+    else if (command.startsWith("CONFIG")) {
+      // CONFIG <задержка, мкс> <групп> <импульсов в группе>
+      configure(command.substring(6));
+    }
+    else if (command.startsWith("STREAM")) {
+      // Потоковый режим: STREAM [количество импульсов]
+      streamLimit = command.length() > 6 ? command.substring(6).toInt() : 0;
+      startStreaming();
+    }
+    else if (command == "STOP") {
+      if (streaming) {
+        stopStreaming();
+      } else {
+        replyError(F("Streaming is not active"));
+      }
+    }
+    else if (command.startsWith("LIVE")) {
+      // LIVE [1|0] - отправлять итоги каждой группы (без аргумента - включить)
+      liveProgress = command.length() > 4 ? command.substring(4).toInt() != 0 : true;
+      beginReply(F("live"));
+      Serial.print(F(",\"enabled\":"));
+      Serial.print(liveProgress ? F("true") : F("false"));
+      Serial.println(F("}"));
+    }
     else if (command == "STATUS") {
       // Отправляем текущий статус
       StaticJsonDocument<200> doc;
@@ -171,21 +338,32 @@ void checkSerialCommands() {
       doc["groups_collected"] = groupIndex;
       doc["measurements_in_current_group"] = measurementInGroup;
       doc["session_id"] = sessionId;
+      doc["streaming"] = streaming;
+      doc["stream_count"] = streamCount;
+      if (requestSeq >= 0) {
+        doc["seq"] = requestSeq;
+      }
       serializeJson(doc, Serial);
+      Serial.println();  // ПК разбирает поток построчно
     }
     else if (command == "RESET") {
       // Сброс измерений
+      streaming = false;
       groupIndex = 0;
       measurementInGroup = 0;
       sendDataFlag = false;
       collectingData = false;
-      Serial.println(F("{\"status\":\"reset\",\"message\":\"Measurements reset\"}"));
+      beginReply(F("reset"));
+      Serial.println(F(",\"message\":\"Measurements reset\"}"));
     }
     else {
-      Serial.print(F("{\"status\":\"error\",\"message\":\"Unknown command: "));
+      beginReply(F("error"));
+      Serial.print(F(",\"message\":\"Unknown command: "));
       Serial.print(command);
       Serial.println(F("\"}"));
     }
+    // Сообщения, отправленные позже из loop(), уже не ответ на эту команду
+    requestSeq = -1;
   }
 }
 
@@ -195,11 +373,15 @@ void sendAveragedJsonData() {
   
   // Базовая информация
   doc["session_id"] = sessionId;
-  doc["groups_count"] = NUM_GROUPS;
-  doc["measurements_per_group"] = GROUP_SIZE;
-  doc["total_measurements"] = NUM_GROUPS * GROUP_SIZE;
+  doc["groups_count"] = groupsCount;
+  doc["measurements_per_group"] = groupSize;
+  doc["total_measurements"] = groupsCount * groupSize;
   doc["timestamp"] = millis();
   doc["device"] = "Arduino Mega";
+  if (sendSeq >= 0) {
+    doc["seq"] = sendSeq;
+    sendSeq = -1;
+  }
   
   // Массивы со статистикой по группам
   JsonArray avgLatencyArray = doc.createNestedArray("avg_latency_us");
@@ -214,7 +396,7 @@ void sendAveragedJsonData() {
   float totalAvgJitter = 0;
   
   // Заполняем массивы и считаем общую статистику
-  for (int i = 0; i < NUM_GROUPS; i++) {
+  for (int i = 0; i < groupsCount; i++) {
     avgLatencyArray.add(groupAvgLatency[i]);
     minLatencyArray.add(groupMinLatency[i]);
     maxLatencyArray.add(groupMaxLatency[i]);
@@ -229,8 +411,8 @@ void sendAveragedJsonData() {
   }
   
   // Средние значения по всем группам
-  totalAvgLatency /= NUM_GROUPS;
-  totalAvgJitter /= NUM_GROUPS;
+  totalAvgLatency /= groupsCount;
+  totalAvgJitter /= groupsCount;
   
   // Статистика
   JsonObject stats = doc.createNestedObject("statistics");
@@ -246,11 +428,119 @@ void sendAveragedJsonData() {
   
   // Информация о параметрах
   JsonObject params = doc.createNestedObject("parameters");
-  params["delay_between_pulses_us"] = DELAY_MICROSECONDS;
-  params["groups"] = NUM_GROUPS;
-  params["measurements_per_group"] = GROUP_SIZE;
+  params["delay_between_pulses_us"] = pulseDelayUs;
+  params["groups"] = groupsCount;
+  params["measurements_per_group"] = groupSize;
 
   // Сериализуем и отправляем
   serializeJson(doc, Serial);
   Serial.println();
-}
\ No newline at end of file
+}
+
+void startStreaming() {
+  collectingData = false;
+  sendDataFlag = false;
+  sessionId++;
+
+  noInterrupts();
+  streamHead = 0;
+  streamTail = 0;
+  streamSeq = 0;
+  streamCount = 0;
+  streamDropped = 0;
+  lastStreamLatency = 0;
+  interrupts();
+
+  beginReply(F("stream_started"));
+  Serial.print(F(",\"session_id\":"));
+  Serial.print(sessionId);
+  Serial.print(F(",\"delay_between_pulses_us\":"));
+  Serial.print(pulseDelayUs);
+  Serial.print(F(",\"limit\":"));
+  Serial.print(streamLimit);
+  Serial.println(F("}"));
+
+  streaming = true;
+}
+
+void stopStreaming() {
+  streaming = false;
+  drainStreamRing();
+
+  beginReply(F("stream_stopped"));
+  Serial.print(F(",\"session_id\":"));
+  Serial.print(sessionId);
+  Serial.print(F(",\"pulses\":"));
+  Serial.print(streamCount);
+  Serial.print(F(",\"dropped\":"));
+  Serial.print(streamDropped);
+  Serial.println(F("}"));
+}
+
+uint8_t crc8(const uint8_t* data, uint8_t len) {
+  // CRC-8, полином 0x07
+  uint8_t crc = 0;
+  while (len--) {
+    crc ^= *data++;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+void drainStreamRing() {
+  uint8_t frame[8];
+
+  while (streamTail != streamHead) {
+    StreamSample sample;
+    sample.seq = streamRing[streamTail].seq;
+    sample.latency = streamRing[streamTail].latency;
+    sample.jitter = streamRing[streamTail].jitter;
+    streamTail = (streamTail + 1) & STREAM_RING_MASK;
+
+    frame[0] = STREAM_SYNC;
+    frame[1] = sample.seq & 0xFF;
+    frame[2] = sample.seq >> 8;
+    frame[3] = sample.latency & 0xFF;
+    frame[4] = sample.latency >> 8;
+    frame[5] = sample.jitter & 0xFF;
+    frame[6] = sample.jitter >> 8;
+    frame[7] = crc8(frame + 1, 6);
+    Serial.write(frame, sizeof(frame));
+  }
+}
+
+void configure(String args) {
+  args.trim();
+  int first = args.indexOf(' ');
+  int second = args.indexOf(' ', first + 1);
+  long delayUs = args.substring(0, first).toInt();
+  long groups = first > 0 ? args.substring(first + 1, second).toInt() : 0;
+  long size = second > 0 ? args.substring(second + 1).toInt() : 0;
+
+  if (collectingData || streaming) {
+    replyError(F("Cannot configure while measuring"));
+    return;
+  }
+  if (delayUs <= 0 || delayUs > 16383 || groups <= 0 || groups > NUM_GROUPS ||
+      size < 2 || size > GROUP_SIZE) {
+    replyError(F("Bad CONFIG arguments"));
+    return;
+  }
+
+  pulseDelayUs = delayUs;
+  groupsCount = groups;
+  groupSize = size;
+  groupIndex = 0;
+  measurementInGroup = 0;
+
+  beginReply(F("configured"));
+  Serial.print(F(",\"delay_between_pulses_us\":"));
+  Serial.print(pulseDelayUs);
+  Serial.print(F(",\"groups\":"));
+  Serial.print(groupsCount);
+  Serial.print(F(",\"measurements_per_group\":"));
+  Serial.print(groupSize);
+  Serial.println(F("}"));
+}
@@ -0,0 +1,545 @@
+"""
+Программная замена Arduino Mega на псевдотерминале.
+
+ArduinoSimulator открывает пару pty (os.openpty) и отвечает на те же
+команды, что arduino_example.ino (START, SEND, CONFIG, STREAM, STOP,
+LIVE, STATUS, RESET), теми же строками JSON и бинарными записями
+потокового режима. Номер запроса из префикса ``#N`` повторяется полем
+seq в ответе, как в скетче; sequence_ids=False эмулирует прежний скетч
+без номеров. pc_example.py подключается к нему как к обычному порту:
+
+    python arduino_sim.py                       # печатает /dev/pts/N
+    python pc_example.py --port /dev/pts/N
+
+Задержки берутся из модели (база + гамма-шум + редкие выбросы), темп
+импульсов - из задержки между импульсами или явно (--rate); скорость
+порта ограничивается по baudrate (10 бит на байт). Можно вносить
+повреждения: с заданной вероятностью в записи или строке JSON меняется
+байт.
+
+Замер пропускной способности стороны ПК (сообщений/с, время разбора,
+задержка от записи в pty до обработчика):
+
+    python arduino_sim.py --benchmark --pulses 200000 --rate 0
+"""
+
+import argparse
+import json
+import os
+import random
+import select
+import tempfile
+import threading
+import time
+import tty
+
+import numpy as np
+
+from binary_stream import encode_frames
+
+MAX_GROUPS = 50
+MAX_GROUP_SIZE = 500
+
+
+class LatencyModel:
+    """Задержка ответа Lichee, мкс: база + гамма-шум + редкие выбросы"""
+
+    def __init__(self, base_us=40, noise_shape=2.0, noise_scale_us=4.0,
+                 spike_rate=0.001, spike_us=(200, 2000), seed=None):
+        self.base_us = base_us
+        self.noise_shape = noise_shape
+        self.noise_scale_us = noise_scale_us
+        self.spike_rate = spike_rate
+        self.spike_us = spike_us
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, count):
+        latency = self.base_us + self.rng.gamma(self.noise_shape, self.noise_scale_us, count)
+        spikes = self.rng.random(count) < self.spike_rate
+        latency[spikes] += self.rng.uniform(*self.spike_us, int(spikes.sum()))
+        return np.round(latency).astype(np.int64)
+
+    @property
+    def mean_us(self):
+        return self.base_us + self.noise_shape * self.noise_scale_us
+
+
+class ArduinoSimulator(threading.Thread):
+    """Эмуляция скетча arduino_example.ino на pty"""
+
+    def __init__(self, model=None, delay_us=300, baudrate=500000, rate=None,
+                 batch=64, corruption=0.0, max_groups=MAX_GROUPS, seed=None, sequence_ids=True):
+        """rate - импульсов в секунду (None - по задержке и модели, 0 - без
+        ограничения, кроме скорости порта); batch - записей потока в одной
+        записи в pty; corruption - вероятность испортить запись или строку"""
+        super().__init__(name="arduino-sim", daemon=True)
+        self.model = model if model is not None else LatencyModel(seed=seed)
+        self.delay_us = delay_us
+        self.baudrate = baudrate
+        self.rate = rate
+        self.batch = batch
+        self.corruption = corruption
+        self.max_groups = max_groups
+        self.sequence_ids = sequence_ids
+        # Номер текущей команды (#N), None - ответ без номера
+        self.request_seq = None
+        self.random = random.Random(seed)
+        self.session_id = self.random.randint(100000, 999999)
+
+        # Как в скетче: NUM_GROUPS x GROUP_SIZE до первой команды CONFIG
+        self.groups_count = min(MAX_GROUPS, max_groups)
+        self.group_size = MAX_GROUP_SIZE
+        # Итоги каждой группы (команда LIVE), как в скетче - по умолчанию выключены
+        self.live_progress = False
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        self._stop_event = threading.Event()
+        self._command_buffer = bytearray()
+        self._next_event = None
+        self._port_free_at = 0.0
+        self._reset_state()
+
+        # Время записи в pty: номер последней записи пачки или группы -> perf_counter
+        # (заполняется, только если включен track_delivery)
+        self.track_delivery = False
+        self.sent_at = {}
+        self.bytes_sent = 0
+        self.corrupted = 0
+
+    def _reset_state(self):
+        self.collecting = False
+        self.streaming = False
+        self.group_index = 0
+        self.groups = []
+        self.stream_limit = 0
+        self.stream_seq = 0
+        self.stream_count = 0
+        self.last_latency = None
+        self._next_event = None
+
+    def pulse_interval(self):
+        """Секунд на импульс"""
+        if self.rate == 0:
+            return 0.0
+        if self.rate:
+            return 1.0 / self.rate
+        return (self.delay_us + self.model.mean_us) / 1e6
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(2)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def run(self):
+        while not self._stop_event.is_set():
+            timeout = 0.1
+            if self._next_event is not None:
+                timeout = max(min(self._next_event - time.perf_counter(), 0.1), 0)
+            try:
+                readable, _, _ = select.select([self.master], [], [], timeout)
+            except (OSError, ValueError):
+                return
+            if readable:
+                try:
+                    chunk = os.read(self.master, 4096)
+                except OSError:
+                    return
+                self._command_buffer += chunk
+                while b"\n" in self._command_buffer:
+                    line, _, rest = bytes(self._command_buffer).partition(b"\n")
+                    self._command_buffer = bytearray(rest)
+                    self.handle_line(line.decode("ascii", errors="replace").strip())
+
+            if self._next_event is not None and time.perf_counter() >= self._next_event:
+                if self.streaming:
+                    self._emit_stream_batch()
+                elif self.collecting:
+                    self._emit_group()
+
+    # Вывод в порт
+
+    def _write(self, data, key=None):
+        """Запись в pty с учетом скорости порта (10 бит на байт)"""
+        if self.corruption and self.random.random() < self.corruption:
+            data = bytearray(data)
+            data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+            data = bytes(data)
+            self.corrupted += 1
+        now = time.perf_counter()
+        if self.baudrate:
+            start = max(now, self._port_free_at)
+            self._port_free_at = start + len(data) * 10 / self.baudrate
+            if start > now:
+                time.sleep(start - now)
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.master, view)
+            except BlockingIOError:
+                time.sleep(0.0005)
+                continue
+            view = view[written:]
+        self.bytes_sent += len(data)
+        if key is not None and self.track_delivery:
+            self.sent_at[key] = time.perf_counter()
+
+    def send_json(self, payload, key=None):
+        if self.request_seq is not None:
+            payload = {**payload, "seq": self.request_seq}
+        self._write((json.dumps(payload, separators=(",", ":")) + "\r\n").encode(), key)
+
+    def error(self, message):
+        self.send_json({"status": "error", "message": message})
+
+    # Команды скетча
+
+    def handle_line(self, line):
+        """Строка команды, возможно с номером запроса: #17 STATUS"""
+        if self.sequence_ids and line.startswith("#"):
+            number, _, command = line[1:].partition(" ")
+            if number.isdigit():
+                self.request_seq = int(number)
+                line = command.strip()
+        try:
+            self.handle_command(line)
+        finally:
+            self.request_seq = None
+
+    def handle_command(self, command):
+        if command == "START":
+            self.collecting = True
+            self.streaming = False
+            self.group_index = 0
+            self.groups = []
+            self.last_latency = None
+            # Как в скетче: каждый запуск - своя сессия
+            self.session_id += 1
+            self.send_json({"status": "started", "session_id": self.session_id,
+                            "message": f"Measurement started {self.groups_count} groups "
+                                       f"{self.group_size} pulses"})
+            self._next_event = time.perf_counter()
+        elif command == "SEND":
+            if self.groups and self.group_index == self.groups_count:
+                self.send_json({"status": "sending", "message": "Preparing to send averaged data"})
+                self.send_json(self.averaged_data())
+            else:
+                self.error("Data not ready yet")
+        elif command.startswith("CONFIG"):
+            self.configure(command[6:].split())
+        elif command.startswith("STREAM"):
+            argument = command[6:].strip()
+            self.stream_limit = int(argument) if argument.isdigit() else 0
+            self.start_streaming()
+        elif command == "STOP":
+            if self.streaming:
+                self.stop_streaming()
+            else:
+                self.error("Streaming is not active")
+        elif command.startswith("LIVE"):
+            argument = command[4:].strip()
+            self.live_progress = int(argument) != 0 if argument.isdigit() else not argument
+            self.send_json({"status": "live", "enabled": self.live_progress})
+        elif command == "STATUS":
+            self.send_json({
+                "status": "status_report",
+                "groups_collected": self.group_index,
+                "measurements_in_current_group": 0,
+                "session_id": self.session_id,
+                "streaming": self.streaming,
+                "stream_count": self.stream_count,
+            })
+        elif command == "RESET":
+            self._reset_state()
+            self.send_json({"status": "reset", "message": "Measurements reset"})
+        elif command:
+            self.error(f"Unknown command: {command}")
+
+    def configure(self, args):
+        try:
+            delay_us, groups, size = (int(value) for value in args[:3])
+        except ValueError:
+            delay_us = groups = size = 0
+        if self.collecting or self.streaming:
+            self.error("Cannot configure while measuring")
+            return
+        if not (0 < delay_us <= 16383 and 0 < groups <= self.max_groups and 2 <= size <= MAX_GROUP_SIZE):
+            self.error("Bad CONFIG arguments")
+            return
+        self.delay_us, self.groups_count, self.group_size = delay_us, groups, size
+        self.group_index = 0
+        self.send_json({"status": "configured", "delay_between_pulses_us": delay_us,
+                        "groups": groups, "measurements_per_group": size})
+
+    def _emit_group(self):
+        latency = self.model.sample(self.group_size)
+        previous = np.concatenate(([latency[0]], latency[:-1]))
+        jitter = np.abs(latency - previous)
+        group = {
+            "avg": float(latency.mean()),
+            "min": float(latency.min()),
+            "max": float(latency.max()),
+            "jitter": float(jitter[1:].sum() / (self.group_size - 1)),
+        }
+        self.groups.append(group)
+        if self.live_progress:
+            self.send_json({"status": "group", "session_id": self.session_id, "group": self.group_index,
+                            "groups": self.groups_count, "avg": round(group["avg"], 1),
+                            "min": group["min"], "max": group["max"],
+                            "jitter": round(group["jitter"], 1)},
+                           key=("group", self.group_index))
+        self.group_index += 1
+        if self.group_index == self.groups_count:
+            self.collecting = False
+            self._next_event = None
+            self.send_json({"status": "data_ready", "message": "All groups collected"})
+        else:
+            self._next_event += self.group_size * self.pulse_interval()
+
+    def averaged_data(self):
+        """То же, что sendAveragedJsonData() в скетче"""
+        avg = [round(group["avg"], 2) for group in self.groups]
+        low = [group["min"] for group in self.groups]
+        high = [group["max"] for group in self.groups]
+        jitter = [round(group["jitter"], 2) for group in self.groups]
+        return {
+            "session_id": self.session_id,
+            "groups_count": self.groups_count,
+            "measurements_per_group": self.group_size,
+            "total_measurements": self.groups_count * self.group_size,
+            "timestamp": int(time.monotonic() * 1000),
+            "device": "Arduino Mega (simulated)",
+            "avg_latency_us": avg,
+            "min_latency_us": low,
+            "max_latency_us": high,
+            "avg_jitter_us": jitter,
+            "statistics": {
+                "latency": {
+                    "overall_avg_us": round(sum(avg) / len(avg), 2),
+                    "overall_min_us": min(low),
+                    "overall_max_us": max(high),
+                    "variation_us": max(high) - min(low),
+                },
+                "jitter": {"overall_avg_us": round(sum(jitter) / len(jitter), 2)},
+            },
+            "parameters": {
+                "delay_between_pulses_us": self.delay_us,
+                "groups": self.groups_count,
+                "measurements_per_group": self.group_size,
+            },
+        }
+
+    def start_streaming(self):
+        self.collecting = False
+        self.session_id += 1
+        self.stream_seq = 0
+        self.stream_count = 0
+        self.last_latency = None
+        self.send_json({"status": "stream_started", "session_id": self.session_id,
+                        "delay_between_pulses_us": self.delay_us, "limit": self.stream_limit})
+        self.streaming = True
+        self._next_event = time.perf_counter()
+
+    def _emit_stream_batch(self):
+        count = self.batch
+        if self.stream_limit:
+            count = min(count, self.stream_limit - self.stream_count)
+        latency = self.model.sample(count)
+        previous = np.concatenate(([latency[0] if self.last_latency is None else self.last_latency],
+                                   latency[:-1]))
+        jitter = np.abs(latency - previous)
+        seq = np.arange(self.stream_seq, self.stream_seq + count)
+        self.last_latency = int(latency[-1])
+        self.stream_seq += count
+        self.stream_count += count
+        self._write(encode_frames(seq, latency, jitter), key=("stream", int(seq[-1]) & 0xFFFF))
+
+        if self.stream_limit and self.stream_count >= self.stream_limit:
+            self.stop_streaming()
+        else:
+            self._next_event += count * self.pulse_interval()
+
+    def stop_streaming(self):
+        self.streaming = False
+        self._next_event = None
+        self.send_json({"status": "stream_stopped", "session_id": self.session_id,
+                        "pulses": self.stream_count, "dropped": 0})
+
+
+class PipelineProbe:
+    """Замеры на стороне ПК: время разбора в потоке чтения и задержка доставки"""
+
+    def __init__(self, receiver, simulator):
+        self.simulator = simulator
+        simulator.track_delivery = True
+        simulator.sent_at.clear()
+        self.parse_seconds = 0.0
+        self.chunks = 0
+        self.delivery = []
+        self.messages = 0
+        self.frames = 0
+
+        reader = receiver.reader
+        feed = reader.feed
+
+        def timed_feed(chunk, received_at):
+            started = time.perf_counter()
+            feed(chunk, received_at)
+            self.parse_seconds += time.perf_counter() - started
+            self.chunks += 1
+
+        reader.feed = timed_feed
+        reader.on("*", self.on_message)
+
+    def on_message(self, message):
+        now = time.perf_counter()
+        self.messages += 1
+        if message.kind == "samples":
+            frames = message.payload["frames"]
+            self.frames += len(frames)
+            key = ("stream", int(frames["seq"][-1])) if len(frames) else None
+        elif message.status == "group":
+            key = ("group", message.payload.get("group"))
+        else:
+            return
+        sent = self.simulator.sent_at.pop(key, None)
+        if sent is not None:
+            self.delivery.append(now - sent)
+
+    def delivery_us(self):
+        if not self.delivery:
+            return {}
+        values = np.asarray(self.delivery) * 1e6
+        p50, p99 = np.percentile(values, [50, 99])
+        return {"p50": p50, "p99": p99, "max": values.max()}
+
+
+def benchmark(pulses=100000, groups=50, group_size=500, rate=0, baudrate=500000,
+              batch=64, corruption=0.0, seed=1):
+    """Поток из pulses импульсов и запуск по группам через весь конвейер ПК"""
+    from pc_example import ArduinoDataReceiver
+
+    simulator = ArduinoSimulator(rate=rate, baudrate=baudrate, batch=batch,
+                                 corruption=corruption, max_groups=max(groups, MAX_GROUPS), seed=seed)
+    simulator.start()
+    results = {}
+    with tempfile.TemporaryDirectory() as store:
+        receiver = ArduinoDataReceiver(simulator.port, baudrate, store_path=store)
+        if not receiver.connect():
+            simulator.stop()
+            return None
+        try:
+            probe = PipelineProbe(receiver, simulator)
+            started = time.perf_counter()
+            receiver.start_stream(pulses)
+            receiver.wait_stream_stopped(timeout=max(60, pulses / 1000))
+            elapsed = time.perf_counter() - started
+            stream = receiver.last_stream
+            results["stream"] = {
+                "pulses": pulses,
+                "received": stream.count if stream else 0,
+                "lost": stream.lost if stream else 0,
+                "corrupt_bytes": receiver.reader.corrupt_bytes,
+                "seconds": elapsed,
+                "frames_per_s": (stream.count if stream else 0) / elapsed,
+                "bytes_per_s": simulator.bytes_sent / elapsed,
+                "parse_us_per_chunk": probe.parse_seconds / max(probe.chunks, 1) * 1e6,
+                "parse_ns_per_frame": probe.parse_seconds / max(probe.frames, 1) * 1e9,
+                "delivery_us": probe.delivery_us(),
+            }
+
+            probe = PipelineProbe(receiver, simulator)
+            receiver.configure(simulator.delay_us, groups, group_size)
+            # Итоги групп нужны для замера доставки
+            receiver.command("LIVE 1")
+            started = time.perf_counter()
+            receiver.start_measurement()
+            receiver.wait_for(lambda m: m.status == "data_ready", timeout=120)
+            receiver.request_data()
+            elapsed = time.perf_counter() - started
+            results["groups"] = {
+                "groups": groups,
+                "group_size": group_size,
+                "seconds": elapsed,
+                "messages_per_s": probe.messages / elapsed,
+                "parse_us_per_chunk": probe.parse_seconds / max(probe.chunks, 1) * 1e6,
+                "delivery_us": probe.delivery_us(),
+            }
+        finally:
+            receiver.close()
+            simulator.stop()
+
+    print("\n" + "=" * 60)
+    print("ПРОПУСКНАЯ СПОСОБНОСТЬ ПК (симулятор Arduino)")
+    print("=" * 60)
+    stream = results["stream"]
+    print(f"ПОТОК: {stream['received']:,} из {stream['pulses']:,} записей за {stream['seconds']:.2f} с, "
+          f"потеряно {stream['lost']:,}, повреждено байт {stream['corrupt_bytes']:,}")
+    print(f"  {stream['frames_per_s']:,.0f} записей/с, {stream['bytes_per_s']:,.0f} байт/с")
+    print(f"  разбор: {stream['parse_us_per_chunk']:.1f} мкс на чтение, "
+          f"{stream['parse_ns_per_frame']:.0f} нс на запись")
+    _print_delivery(stream["delivery_us"])
+    groups = results["groups"]
+    print(f"ГРУППЫ: {groups['groups']} × {groups['group_size']} за {groups['seconds']:.2f} с, "
+          f"{groups['messages_per_s']:,.0f} сообщений/с, разбор {groups['parse_us_per_chunk']:.1f} мкс на чтение")
+    _print_delivery(groups["delivery_us"])
+    print("=" * 60)
+    return results
+
+
+def _print_delivery(delivery):
+    if delivery:
+        print(f"  доставка (запись в pty -> обработчик): P50 {delivery['p50']:.0f} мкс, "
+              f"P99 {delivery['p99']:.0f} мкс, макс {delivery['max']:.0f} мкс")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Симулятор Arduino на псевдотерминале")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="замерить конвейер pc_example.py и выйти")
+    parser.add_argument('--pulses', type=int, default=100000, help="импульсов в потоке для замера")
+    parser.add_argument('--groups', type=int, default=50, help="групп для замера")
+    parser.add_argument('--group-size', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=None,
+                        help="импульсов в секунду (0 - без ограничения, по умолчанию - по задержке)")
+    parser.add_argument('--baudrate', type=int, default=500000,
+                        help="ограничение скорости порта, бод (0 - без ограничения)")
+    parser.add_argument('--batch', type=int, default=64, help="записей потока в одной записи в pty")
+    parser.add_argument('--corruption', type=float, default=0.0,
+                        help="вероятность испортить байт в записи или строке")
+    parser.add_argument('--base-latency', type=float, default=40, help="базовая задержка, мкс")
+    parser.add_argument('--spike-rate', type=float, default=0.001, help="доля выбросов")
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args.pulses, args.groups, args.group_size, args.rate or 0, args.baudrate,
+                  args.batch, args.corruption, args.seed)
+        return
+
+    model = LatencyModel(args.base_latency, spike_rate=args.spike_rate, seed=args.seed)
+    simulator = ArduinoSimulator(model, rate=args.rate, baudrate=args.baudrate, batch=args.batch,
+                                 corruption=args.corruption, seed=args.seed)
+    simulator.start()
+    print(f"Симулятор Arduino на порту {simulator.port} (сессия {simulator.session_id})")
+    print(f"Подключение: python pc_example.py --port {simulator.port}")
+    try:
+        while simulator.is_alive():
+            simulator.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Потоковый режим: по одной бинарной записи на каждый импульс.
+
+Формат записи (8 байт, little-endian), совпадает с arduino_example.ino:
+
+    0      uint8   0xA5 - маркер начала записи
+    1..2   uint16  номер импульса (по модулю 65536)
+    3..4   uint16  latency, мкс (насыщается на 65535)
+    5..6   uint16  jitter, мкс (насыщается на 65535)
+    7      uint8   CRC-8 (полином 0x07) по байтам 1..6
+
+Записи разбираются пачками через numpy.frombuffer, CRC проверяется
+векторно по всей пачке.
+"""
+
+import numpy as np
+
+from latency_stats import SessionStats
+
+FRAME_SYNC = 0xA5
+FRAME_SIZE = 8
+
+FRAME_DTYPE = np.dtype([
+    ("sync", "u1"),
+    ("seq", "<u2"),
+    ("latency_us", "<u2"),
+    ("jitter_us", "<u2"),
+    ("crc", "u1"),
+])
+
+
+def _crc8_table(poly=0x07):
+    table = np.zeros(256, dtype=np.uint8)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x80 else (crc << 1)
+        table[i] = crc & 0xFF
+    return table
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    """CRC-8 одной последовательности байт (для формирования записей)"""
+    crc = 0
+    for byte in data:
+        crc = int(CRC8_TABLE[crc ^ byte])
+    return crc
+
+
+def encode_frames(seq, latency_us, jitter_us):
+    """Формирование записей (используется в тестовых стендах и при воспроизведении)"""
+    seq = np.asarray(seq)
+    frames = np.zeros(len(seq), dtype=FRAME_DTYPE)
+    frames["sync"] = FRAME_SYNC
+    frames["seq"] = seq & 0xFFFF
+    frames["latency_us"] = np.minimum(latency_us, 0xFFFF)
+    frames["jitter_us"] = np.minimum(jitter_us, 0xFFFF)
+    frames["crc"] = _crc8_columns(frames.view(np.uint8).reshape(-1, FRAME_SIZE))
+    return frames.tobytes()
+
+
+def _crc8_columns(raw):
+    """CRC-8 для всех записей пачки сразу: один проход по каждому столбцу байт"""
+    crc = np.zeros(len(raw), dtype=np.uint8)
+    for column in range(1, FRAME_SIZE - 1):
+        crc = CRC8_TABLE[crc ^ raw[:, column]]
+    return crc
+
+
+def decode_frames(buffer):
+    """Разбор подряд идущих записей в начале буфера.
+
+    Возвращает (frames, consumed): массив корректных записей FRAME_DTYPE
+    и число использованных байт. Разбор останавливается на первой записи
+    с неверным маркером или CRC.
+    """
+    count = len(buffer) // FRAME_SIZE
+    if count == 0:
+        return np.zeros(0, dtype=FRAME_DTYPE), 0
+
+    frames = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=count)
+    raw = frames.view(np.uint8).reshape(count, FRAME_SIZE)
+    valid = (frames["sync"] == FRAME_SYNC) & (_crc8_columns(raw) == frames["crc"])
+
+    if not valid.all():
+        count = int(np.argmin(valid))
+    return frames[:count].copy(), count * FRAME_SIZE
+
+
+def _signed_steps(steps):
+    """Шаг номера по модулю 65536 в диапазоне -32768..32767"""
+    return ((steps + 0x8000) & 0xFFFF) - 0x8000
+
+
+class StreamSession:
+    """Накопление записей одного потокового сеанса.
+
+    Номер импульса в записи 16-битный; здесь он разворачивается в
+    непрерывный по шагу со знаком от последней принятой записи, так что
+    переход через 65535 - это шаг +1, а не сброс. Разрывы в нумерации
+    считаются потерянными импульсами (lost). Повторы и записи с номером
+    назад отбрасываются и считаются отдельно (out_of_order). Запись со
+    скачком вперед придерживается до следующей: если та продолжает
+    нумерацию до скачка, скачок - одиночный испорченный номер, он тоже
+    уходит в out_of_order и не сдвигает остальные записи. Все принятые
+    записи попадают в гистограммы stats.
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        self.seq_chunks = []
+        self.latency_chunks = []
+        self.jitter_chunks = []
+        self.stats = SessionStats()
+        self.stats.sessions = 1
+        self.count = 0
+        self.lost = 0
+        self.out_of_order = 0
+        # Развернутый номер последней принятой записи
+        self._last_seq = None
+        # Запись со скачком номера вперед: (номер, latency, jitter)
+        self._held = None
+
+    def add_frames(self, frames):
+        if len(frames) == 0:
+            return
+
+        raw = frames["seq"].astype(np.int64)
+        if self._last_seq is None:
+            self._last_seq = int(raw[0]) - 1
+        steps = _signed_steps(np.diff(raw, prepend=self._last_seq & 0xFFFF))
+        if self._held is None and np.all(steps == 1):
+            # Обычный случай: номера подряд
+            seq = self._last_seq + np.cumsum(steps)
+            self._accept(seq, frames["latency_us"].astype(np.uint32),
+                         frames["jitter_us"].astype(np.uint32))
+            return
+
+        accepted = ([], [], [])
+        for number, latency, jitter in zip(raw.tolist(), frames["latency_us"].tolist(),
+                                           frames["jitter_us"].tolist()):
+            seq = self._last_seq + int(_signed_steps(number - (self._last_seq & 0xFFFF)))
+            if self._held is not None:
+                held, self._held = self._held, None
+                if self._last_seq < seq < held[0]:
+                    # Нумерация продолжается от записи до скачка
+                    self.out_of_order += 1
+                else:
+                    self._take(accepted, *held)
+                    seq = self._last_seq + int(_signed_steps(number - (self._last_seq & 0xFFFF)))
+            if seq == self._last_seq + 1:
+                self._take(accepted, seq, latency, jitter)
+            elif seq > self._last_seq:
+                self._held = (seq, latency, jitter)
+            else:
+                self.out_of_order += 1
+        if accepted[0]:
+            self._accept(np.array(accepted[0], dtype=np.int64), np.array(accepted[1], dtype=np.uint32),
+                         np.array(accepted[2], dtype=np.uint32), counted=True)
+
+    def finish(self):
+        """Конец сеанса: придержанная запись со скачком номера принимается"""
+        if self._held is not None:
+            seq, latency, jitter = self._held
+            self._held = None
+            self.lost += seq - self._last_seq - 1
+            self._last_seq = seq
+            self._accept(np.array([seq], dtype=np.int64), np.array([latency], dtype=np.uint32),
+                         np.array([jitter], dtype=np.uint32), counted=True)
+
+    def _take(self, accepted, seq, latency, jitter):
+        self.lost += seq - self._last_seq - 1
+        self._last_seq = seq
+        accepted[0].append(seq)
+        accepted[1].append(latency)
+        accepted[2].append(jitter)
+
+    def _accept(self, seq, latency, jitter, counted=False):
+        if not counted:
+            self.lost += int(seq[0] - self._last_seq - 1)
+            self._last_seq = int(seq[-1])
+        self.seq_chunks.append(seq)
+        self.latency_chunks.append(latency)
+        self.jitter_chunks.append(jitter)
+        self.count += len(seq)
+
+        # У первого импульса сессии jitter не определен
+        self.stats.record(latency, jitter[seq != 0])
+
+    def arrays(self):
+        """Все накопленные значения одним набором массивов"""
+        if not self.seq_chunks:
+            empty = np.zeros(0, dtype=np.uint32)
+            return {"seq": np.zeros(0, dtype=np.int64), "latency_us": empty, "jitter_us": empty}
+        return {
+            "seq": np.concatenate(self.seq_chunks),
+            "latency_us": np.concatenate(self.latency_chunks),
+            "jitter_us": np.concatenate(self.jitter_chunks),
+        }
@@ -0,0 +1,463 @@
+"""
+Телеметрия платы во время сессий измерений.
+
+На Lichee запускается рядом с lichee_example.c:
+
+    python3 board_telemetry.py --listen 9300 --period 0.05
+
+и ждет команд от pc_example.py (``--telemetry <IP платы>``) по UDP:
+``START <метка> <сессия>`` начинает отсчеты, ``STOP <метка>`` завершает.
+Пока сессия идет, с периодом period читаются /proc/stat (время CPU по
+видам, ctxt, процессы, softirq), /proc/interrupts (по линиям), /proc/vmstat
+(подкачка, reclaim, compaction) и scaling_cur_freq всех CPU. Файлы открыты
+один раз, каждый отсчет - один pread на файл.
+
+На ПК уходят только изменения: для счетчиков - приращения с прошлого
+отсчета, для мгновенных значений (частота, procs_running) - новое
+значение, если оно изменилось. Формат пачки (little-endian):
+
+    "TLM1" <I метка> <I номер пачки> <H отсчетов>
+    отсчет: <Q CLOCK_MONOTONIC, нс> <H изменений> и столько пар <H метрика> <i значение>
+
+Имена метрик приходят в JSON-подтверждении начала. Время отсчетов - те
+же часы, что у меток событий в latency_breakdown, поэтому выбросы
+задержки сопоставляются с событиями на плате напрямую.
+
+На ПК TelemetryClient хранит отсчеты сессии и отдает их таблицей
+telemetry (t_ns, metric, value) для SessionStore.
+"""
+
+import argparse
+import glob
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b"TLM1"
+HEADER = struct.Struct("<4sIIH")
+SAMPLE = struct.Struct("<QH")
+CHANGE = struct.Struct("<Hi")
+DEFAULT_PORT = 9300
+MAX_DATAGRAM = 1400
+FLUSH_INTERVAL = 0.1
+# Без STOP от ПК (ПК пропал) сессия завершается сама
+MAX_SESSION_S = 3600
+
+STAT_PATH = "/proc/stat"
+INTERRUPTS_PATH = "/proc/interrupts"
+VMSTAT_PATH = "/proc/vmstat"
+CPUFREQ_GLOB = "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"
+
+CPU_FIELDS = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal")
+SOFTIRQ_NAMES = ("HI", "TIMER", "NET_TX", "NET_RX", "BLOCK", "IRQ_POLL", "TASKLET", "SCHED",
+                 "HRTIMER", "RCU")
+VMSTAT_KEYS = ("pgfault", "pgmajfault", "pswpin", "pswpout", "pgscan_kswapd", "pgscan_direct",
+               "pgsteal_kswapd", "pgsteal_direct", "allocstall_normal", "allocstall_movable",
+               "compact_stall", "workingset_refault_file", "thp_fault_alloc")
+# Мгновенные значения, остальное - счетчики
+GAUGE_PREFIXES = ("cpufreq.", "procs_running", "procs_blocked")
+
+
+class TelemetrySampler:
+    """Чтение счетчиков платы через заранее открытые файлы"""
+
+    def __init__(self, vmstat_keys=VMSTAT_KEYS):
+        self.stat_fd = os.open(STAT_PATH, os.O_RDONLY)
+        self.interrupts_fd = os.open(INTERRUPTS_PATH, os.O_RDONLY)
+        self.vmstat_fd = os.open(VMSTAT_PATH, os.O_RDONLY)
+        self.freq_fds = []
+        for path in sorted(glob.glob(CPUFREQ_GLOB)):
+            cpu = path.split("/")[5]
+            try:
+                self.freq_fds.append((f"cpufreq.{cpu}_khz", os.open(path, os.O_RDONLY)))
+            except OSError:
+                pass
+        self.vmstat_keys = {key.encode(): key for key in vmstat_keys}
+        self.names = list(self.read())
+        self.gauges = [i for i, name in enumerate(self.names) if name.startswith(GAUGE_PREFIXES)]
+        self.gauge_set = frozenset(self.gauges)
+
+    def close(self):
+        for fd in [self.stat_fd, self.interrupts_fd, self.vmstat_fd] + [fd for _, fd in self.freq_fds]:
+            os.close(fd)
+
+    @staticmethod
+    def _pread_all(fd, size=65536):
+        return os.pread(fd, size, 0)
+
+    def read(self):
+        """Все метрики одним словарем имя -> целое"""
+        values = {}
+        for line in self._pread_all(self.stat_fd).split(b"\n"):
+            fields = line.split()
+            if not fields:
+                continue
+            key = fields[0]
+            if key == b"cpu":
+                for name, value in zip(CPU_FIELDS, fields[1:]):
+                    values[f"cpu.{name}"] = int(value)
+            elif key in (b"ctxt", b"processes", b"procs_running", b"procs_blocked"):
+                values[key.decode()] = int(fields[1])
+            elif key == b"intr":
+                values["intr"] = int(fields[1])
+            elif key == b"softirq":
+                for name, value in zip(SOFTIRQ_NAMES, fields[2:]):
+                    values[f"softirq.{name}"] = int(value)
+
+        for line in self._pread_all(self.interrupts_fd).split(b"\n")[1:]:
+            irq, _, rest = line.partition(b":")
+            fields = rest.split()
+            counts = 0
+            used = 0
+            for field in fields:
+                if not field.isdigit():
+                    break
+                counts += int(field)
+                used += 1
+            if not irq.strip() or not used:
+                continue
+            device = fields[-1].decode(errors="replace") if len(fields) > used else ""
+            name = irq.strip().decode()
+            values[f"irq.{name}:{device}" if device and name.isdigit() else f"irq.{name}"] = counts
+
+        for line in self._pread_all(self.vmstat_fd).split(b"\n"):
+            key, _, value = line.partition(b" ")
+            name = self.vmstat_keys.get(key)
+            if name is not None:
+                values[f"vm.{name}"] = int(value)
+
+        for name, fd in self.freq_fds:
+            try:
+                values[name] = int(os.pread(fd, 32, 0))
+            except (OSError, ValueError):
+                pass
+        return values
+
+    def vector(self):
+        values = self.read()
+        return [values.get(name, 0) for name in self.names]
+
+
+class TelemetryServer:
+    """Сторона платы: сессии отсчетов по командам ПК"""
+
+    def __init__(self, port=DEFAULT_PORT, period=0.05, sampler=None):
+        self.sampler = sampler if sampler is not None else TelemetrySampler()
+        self.period = period
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", port))
+        self.session = None
+
+    def serve(self):
+        print(f"Телеметрия платы: UDP {self.sock.getsockname()[1]}, {len(self.sampler.names)} метрик, "
+              f"период {self.period * 1000:.0f} мс")
+        while True:
+            timeout = None
+            if self.session is not None:
+                timeout = max(self.session['next'] - time.monotonic(), 0)
+            readable, _, _ = select.select([self.sock], [], [], timeout)
+            if readable:
+                data, address = self.sock.recvfrom(256)
+                self.handle(data.decode(errors="replace").split(), address)
+
+            session = self.session
+            if session is None:
+                continue
+            now = time.monotonic()
+            if now >= session['next']:
+                self.sample(session)
+                # Отставшие отсчеты не догоняются
+                session['next'] = max(session['next'] + self.period, now)
+            if now - session['flushed'] >= FLUSH_INTERVAL:
+                self.flush(session)
+            if now - session['started'] > MAX_SESSION_S:
+                self.stop(session)
+
+    def handle(self, command, address):
+        if not command:
+            return
+        if command[0] == "START" and len(command) >= 2:
+            if self.session is not None:
+                self.stop(self.session)
+            self.start(int(command[1]), command[2] if len(command) > 2 else "", address)
+        elif command[0] == "STOP" and self.session is not None:
+            if len(command) < 2 or command[1] == str(self.session['token']):
+                self.stop(self.session)
+        elif command[0] == "PING":
+            self.reply(address, {"status": "telemetry_ready", "metrics": len(self.sampler.names)})
+
+    def reply(self, address, payload):
+        self.sock.sendto(json.dumps(payload, separators=(",", ":")).encode(), address)
+
+    def start(self, token, session_id, address):
+        now = time.monotonic()
+        self.session = {
+            'token': token, 'address': address, 'started': now, 'next': now, 'flushed': now,
+            'previous': None, 'samples': 0, 'batch': 0, 'buffer': [], 'size': HEADER.size,
+            'cpu': time.process_time(),
+        }
+        self.reply(address, {"status": "telemetry_started", "token": token, "session_id": session_id,
+                             "metrics": self.sampler.names, "gauges": self.sampler.gauges,
+                             "period_s": self.period})
+
+    def sample(self, session):
+        t_ns = time.monotonic_ns()
+        current = self.sampler.vector()
+        previous = session['previous']
+        gauges = self.sampler.gauge_set
+        if previous is None:
+            changes = [(i, current[i]) for i in self.sampler.gauges]
+        else:
+            changes = [(i, value if i in gauges else value - previous[i])
+                       for i, value in enumerate(current) if value != previous[i]]
+        session['previous'] = current
+        session['samples'] += 1
+
+        record = SAMPLE.pack(t_ns, len(changes)) + b"".join(
+            CHANGE.pack(i, max(min(value, 0x7FFFFFFF), -0x80000000)) for i, value in changes)
+        if session['size'] + len(record) > MAX_DATAGRAM:
+            self.flush(session)
+        session['buffer'].append(record)
+        session['size'] += len(record)
+
+    def flush(self, session):
+        session['flushed'] = time.monotonic()
+        if not session['buffer']:
+            return
+        header = HEADER.pack(MAGIC, session['token'], session['batch'], len(session['buffer']))
+        try:
+            self.sock.sendto(header + b"".join(session['buffer']), session['address'])
+        except OSError as e:
+            print(f"Ошибка отправки телеметрии: {e}")
+        session['batch'] += 1
+        session['buffer'] = []
+        session['size'] = HEADER.size
+
+    def stop(self, session):
+        self.sample(session)
+        self.flush(session)
+        self.reply(session['address'], {
+            "status": "telemetry_stopped", "token": session['token'], "samples": session['samples'],
+            "batches": session['batch'], "cpu_s": round(time.process_time() - session['cpu'], 4)})
+        self.session = None
+
+
+class TelemetryRecording:
+    """Отсчеты одной сессии на стороне ПК"""
+
+    def __init__(self, token, session_id):
+        self.token = token
+        self.session_id = session_id
+        self.metrics = []
+        self.gauges = []
+        self.period_s = None
+        self.t_ns = []
+        self.metric = []
+        self.value = []
+        self.samples = 0
+        self.lost_batches = 0
+        self.next_batch = 0
+        self.summary = {}
+        self.started = threading.Event()
+        self.stopped = threading.Event()
+
+
+class TelemetryClient(threading.Thread):
+    """Сторона ПК: запуск и остановка отсчетов, прием пачек"""
+
+    def __init__(self, host, port=DEFAULT_PORT):
+        super().__init__(name="board-telemetry", daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.sock.settimeout(0.2)
+        self.address = (host, port)
+        self.recordings = {}
+        self.current = None
+        self._token = int(time.time()) & 0xFFFF
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.sock.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                datagram = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop_event.is_set():
+                    break
+                # ICMP port unreachable: телеметрия на плате еще не запущена
+                continue
+            self.feed(datagram)
+
+    def begin(self, session_id):
+        """Начало отсчетов для сессии; возвращает TelemetryRecording"""
+        with self._lock:
+            self._token += 1
+            recording = TelemetryRecording(self._token, session_id)
+            self.recordings[recording.token] = recording
+            self.current = recording
+        self._send(f"START {recording.token} {session_id}")
+        return recording
+
+    def end(self):
+        """Остановка текущих отсчетов; возвращает их TelemetryRecording"""
+        with self._lock:
+            recording, self.current = self.current, None
+        if recording is not None:
+            self._send(f"STOP {recording.token}")
+        return recording
+
+    def forget(self, recording):
+        """Отказ от отсчетов (запуск прерван или не был запрошен)"""
+        if recording is not None:
+            with self._lock:
+                self.recordings.pop(recording.token, None)
+
+    def collect(self, recording, timeout=1.0):
+        """Таблица telemetry и сведения для хранилища или None, если плата не ответила"""
+        recording.stopped.wait(timeout)
+        with self._lock:
+            self.recordings.pop(recording.token, None)
+        if not recording.started.is_set():
+            print(f"Телеметрия платы {self.address[0]} не получена")
+            return None
+        import numpy as np
+
+        table = {
+            't_ns': np.asarray(recording.t_ns, dtype=np.uint64),
+            'metric': np.asarray(recording.metric, dtype=np.uint16),
+            'value': np.asarray(recording.value, dtype=np.int64),
+        }
+        meta = {
+            'metrics': recording.metrics,
+            'gauges': recording.gauges,
+            'period_s': recording.period_s,
+            'samples': recording.samples,
+            'lost_batches': recording.lost_batches,
+            'complete': recording.stopped.is_set(),
+            **recording.summary,
+        }
+        return table, meta
+
+    def _send(self, command):
+        try:
+            self.sock.send(command.encode())
+        except OSError as e:
+            print(f"Телеметрия платы: {e}")
+
+    def feed(self, datagram):
+        if datagram[:1] == b"{":
+            message = json.loads(datagram)
+            with self._lock:
+                recording = self.recordings.get(message.get("token"))
+            if recording is None:
+                return
+            if message.get("status") == "telemetry_started":
+                recording.metrics = message["metrics"]
+                recording.gauges = message["gauges"]
+                recording.period_s = message["period_s"]
+                recording.started.set()
+            elif message.get("status") == "telemetry_stopped":
+                recording.summary = {key: message[key] for key in ("batches", "cpu_s") if key in message}
+                recording.stopped.set()
+            return
+
+        if len(datagram) < HEADER.size:
+            return
+        magic, token, batch, count = HEADER.unpack_from(datagram)
+        with self._lock:
+            recording = self.recordings.get(token)
+        if magic != MAGIC or recording is None:
+            return
+        recording.lost_batches += batch - recording.next_batch
+        recording.next_batch = batch + 1
+
+        offset = HEADER.size
+        for _ in range(count):
+            t_ns, changes = SAMPLE.unpack_from(datagram, offset)
+            offset += SAMPLE.size
+            for metric, value in CHANGE.iter_unpack(datagram[offset:offset + changes * CHANGE.size]):
+                recording.t_ns.append(t_ns)
+                recording.metric.append(metric)
+                recording.value.append(value)
+            offset += changes * CHANGE.size
+            recording.samples += 1
+
+
+def format_telemetry(table, meta, top=3):
+    """Короткая сводка: частоты событий за сессию и диапазон частоты CPU"""
+    import numpy as np
+
+    if meta['samples'] < 2 or len(table['t_ns']) == 0:
+        return [f"ТЕЛЕМЕТРИЯ ПЛАТЫ: отсчетов {meta['samples']}"]
+    duration = (int(table['t_ns'].max()) - int(table['t_ns'].min())) / 1e9 or 1.0
+    names = meta['metrics']
+    gauges = set(meta['gauges'])
+    totals = np.bincount(table['metric'], weights=table['value'], minlength=len(names))
+    counters = {names[i]: totals[i] for i in range(len(names)) if i not in gauges}
+
+    def rate(name):
+        return counters.get(name, 0) / duration
+
+    lines = [f"ТЕЛЕМЕТРИЯ ПЛАТЫ: отсчетов {meta['samples']:,} за {duration:.1f} с, "
+             f"CPU сборщика {meta.get('cpu_s', 0):.2f} с"]
+    lines.append(f"  ПЕРЕКЛЮЧЕНИЙ КОНТЕКСТА: {rate('ctxt'):,.0f}/с, ПРЕРЫВАНИЙ: {rate('intr'):,.0f}/с, "
+                 f"SOFTIRQ TIMER/SCHED/RCU: {rate('softirq.TIMER'):,.0f}/{rate('softirq.SCHED'):,.0f}/"
+                 f"{rate('softirq.RCU'):,.0f} в с")
+    irqs = sorted((name for name in counters if name.startswith("irq.")), key=rate, reverse=True)
+    if irqs:
+        lines.append("  ЧАЩЕ ВСЕГО: " + ", ".join(f"{name[4:]} {rate(name):,.0f}/с"
+                                                   for name in irqs[:top] if counters[name]))
+    faults = counters.get('vm.pgmajfault', 0)
+    if faults:
+        lines.append(f"  СТРАНИЧНЫХ ПРОМАХОВ С ДИСКА: {faults:,.0f}")
+    freq = [i for i in gauges if names[i].startswith("cpufreq.")]
+    if freq:
+        values = table['value'][np.isin(table['metric'], freq)]
+        lines.append(f"  ЧАСТОТА CPU: {values.min() / 1000:.0f}-{values.max() / 1000:.0f} МГц")
+    return lines
+
+
+def parse_address(value):
+    """HOST или HOST:PORT -> (host, port)"""
+    host, _, port = value.partition(":")
+    return host, int(port) if port else DEFAULT_PORT
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Телеметрия платы для сессий rt-tests")
+    parser.add_argument('--listen', type=int, default=DEFAULT_PORT, help="UDP-порт команд ПК")
+    parser.add_argument('--period', type=float, default=0.05, help="период отсчетов, с")
+    parser.add_argument('--once', action='store_true',
+                        help="вывести текущие значения метрик и время одного отсчета и выйти")
+    args = parser.parse_args()
+
+    if args.once:
+        sampler = TelemetrySampler()
+        started = time.perf_counter()
+        values = sampler.read()
+        elapsed = time.perf_counter() - started
+        for name, value in values.items():
+            print(f"{name:<40} {value}")
+        print(f"\n{len(values)} метрик, отсчет {elapsed * 1e6:.0f} мкс")
+        return
+
+    try:
+        TelemetryServer(args.listen, args.period).serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
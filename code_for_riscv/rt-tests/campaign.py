@@ -0,0 +1,277 @@
+"""
+Пакетный прогон матрицы RT-тестов без участия оператора.
+
+Файл сценариев (JSON):
+
+    {
+      "defaults": {"delay_us": 300, "groups": 50, "group_size": 500, "repetitions": 3},
+      "scenarios": [
+        {"name": "rt_without_stress_99_50",
+         "tags": {"rt": 1, "stress": 0, "priority": 99, "load": 50}},
+        {"name": "rt_stress_99_50",
+         "tags": {"rt": 1, "stress": 1, "priority": 99, "load": 50},
+         "setup": "ssh root@192.168.213.186 'stress-ng --cpu 1 --cpu-load 50'",
+         "teardown": "ssh root@192.168.213.186 'pkill stress-ng'",
+         "settle_s": 5},
+        {"name": "stream_10ms", "mode": "stream", "pulses": 200000, "delay_us": 10000}
+      ]
+    }
+
+Нагрузка и приоритеты задаются на плате, поэтому сценарий может
+указать команды setup (запускается в фоне перед измерениями) и teardown
+(после них), а значения попадают в теги сессий. После получения
+результатов очередного повтора следующий START отправляется сразу, а
+сохранение и графики выполняются, пока Arduino уже измеряет.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+
+from latency_stats import SessionStats, format_stats
+
+SCENARIO_DEFAULTS = {
+    'mode': 'groups',        # groups - усреднение на Arduino, stream - каждое измерение
+    'delay_us': 300,
+    'groups': 50,
+    'group_size': 500,
+    'pulses': 100000,        # для mode=stream
+    'repetitions': 1,
+    'tags': {},
+    'setup': None,
+    'teardown': None,
+    'settle_s': 0,
+}
+
+
+def load_scenarios(path):
+    """Чтение файла сценариев с подстановкой значений по умолчанию"""
+    with open(path) as f:
+        config = json.load(f)
+
+    defaults = dict(SCENARIO_DEFAULTS)
+    defaults.update(config.get('defaults', {}))
+
+    scenarios = []
+    for i, item in enumerate(config.get('scenarios', [])):
+        scenario = dict(defaults)
+        scenario.update(item)
+        scenario['tags'] = {**defaults.get('tags', {}), **item.get('tags', {})}
+        scenario.setdefault('name', f"scenario_{i + 1}")
+        if scenario['mode'] not in ('groups', 'stream'):
+            raise ValueError(f"{scenario['name']}: неизвестный режим {scenario['mode']}")
+        scenarios.append(scenario)
+
+    if not scenarios:
+        raise ValueError(f"В файле {path} нет сценариев")
+    return scenarios
+
+
+def measurement_timeout(scenario):
+    """Оценка длительности измерения с запасом.
+
+    Ответ фиксируется по спадающему фронту, то есть на каждое измерение
+    уходит два импульса.
+    """
+    count = scenario['pulses'] if scenario['mode'] == 'stream' \
+        else scenario['groups'] * scenario['group_size']
+    return 2 * count * (scenario['delay_us'] + 50) / 1e6 * 1.5 + 10
+
+
+def stop_process_group(process, timeout=5):
+    """Завершение процесса и всех его потомков: SIGTERM, через timeout с - SIGKILL"""
+    deadline = time.time() + timeout
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+            # Группа жива, пока в ней есть хоть один процесс
+            while time.time() < deadline:
+                process.poll()
+                os.killpg(process.pid, 0)
+                time.sleep(0.1)
+        except ProcessLookupError:
+            break
+    process.wait()
+
+
+class CampaignRunner:
+    """Последовательный прогон сценариев на одном стенде"""
+
+    def __init__(self, receiver, scenarios, report_dir="arduino_measurements", name="campaign"):
+        self.receiver = receiver
+        self.scenarios = scenarios
+        self.report_dir = report_dir
+        self.name = name
+        self.base_tags = dict(receiver.tags)
+        self.results = []
+
+    def run(self):
+        started = time.time()
+        print(f"\nКАМПАНИЯ: {len(self.scenarios)} сценариев")
+        for number, scenario in enumerate(self.scenarios, 1):
+            print("\n" + "#"*60)
+            print(f"СЦЕНАРИЙ {number}/{len(self.scenarios)}: {scenario['name']}")
+            print("#"*60)
+            self.results.append(self.run_scenario(scenario))
+
+        report = self.build_report(time.time() - started)
+        self.write_report(report)
+        return report
+
+    def run_scenario(self, scenario):
+        result = {'scenario': scenario['name'], 'mode': scenario['mode'], 'runs': [], 'failed': 0}
+        background = None
+        try:
+            if scenario['setup']:
+                print(f"Подготовка: {scenario['setup']}")
+                # Своя группа процессов: нагрузка завершается вместе с запущенным ею ssh/stress-ng
+                background = subprocess.Popen(scenario['setup'], shell=True, start_new_session=True)
+            if scenario['settle_s']:
+                time.sleep(scenario['settle_s'])
+
+            if not self.receiver.configure(scenario['delay_us'], scenario['groups'],
+                                           scenario['group_size']):
+                result['failed'] = scenario['repetitions']
+                return result
+
+            if scenario['mode'] == 'stream':
+                self._run_stream(scenario, result)
+            else:
+                self._run_groups(scenario, result)
+        finally:
+            if scenario['teardown']:
+                print(f"Завершение: {scenario['teardown']}")
+                subprocess.run(scenario['teardown'], shell=True)
+            if background is not None:
+                stop_process_group(background)
+        return result
+
+    def _set_tags(self, scenario, repetition):
+        self.receiver.tags = {
+            **self.base_tags,
+            'scenario': scenario['name'],
+            'mode': scenario['mode'],
+            'delay_us': scenario['delay_us'],
+            **scenario['tags'],
+            'repetition': repetition,
+        }
+
+    def _run_groups(self, scenario, result):
+        receiver = self.receiver
+        timeout = measurement_timeout(scenario)
+        receiver.start_measurement()
+
+        for repetition in range(scenario['repetitions']):
+            if receiver.wait_for(lambda m: m.status == 'data_ready', timeout) is None:
+                print(f"Повтор {repetition + 1}: данные не готовы")
+                result['failed'] += 1
+                receiver.reset()
+                if repetition + 1 < scenario['repetitions']:
+                    receiver.start_measurement()
+                continue
+
+            message = receiver.command("SEND", 10)
+
+            # Следующий повтор запускается до сохранения и графиков текущего
+            if repetition + 1 < scenario['repetitions']:
+                receiver.start_measurement()
+
+            if message is None:
+                print(f"Повтор {repetition + 1}: данные не получены")
+                result['failed'] += 1
+                continue
+
+            self._set_tags(scenario, repetition)
+            self._process(result, lambda: receiver.process_data_with_plot(message.payload))
+
+    def _run_stream(self, scenario, result):
+        receiver = self.receiver
+        timeout = measurement_timeout(scenario)
+        receiver.start_stream(scenario['pulses'])
+
+        for repetition in range(scenario['repetitions']):
+            message = receiver.wait_for(lambda m: m.status == 'stream_stopped', timeout)
+            if message is not None and repetition + 1 < scenario['repetitions']:
+                receiver.start_stream(scenario['pulses'])
+
+            if message is None:
+                print(f"Повтор {repetition + 1}: поток не завершился")
+                result['failed'] += 1
+                receiver.reset()
+                receiver.finished_streams.clear()
+                receiver.stream = None
+                if repetition + 1 < scenario['repetitions']:
+                    receiver.start_stream(scenario['pulses'])
+                continue
+
+            self._set_tags(scenario, repetition)
+            self._process(result, lambda: receiver.process_stream_data(message.payload))
+
+    def _process(self, result, process):
+        runs_before = len(self.receiver.runs)
+        process()
+        if len(self.receiver.runs) > runs_before:
+            result['runs'].append(self.receiver.runs[-1])
+        else:
+            result['failed'] += 1
+
+    def build_report(self, duration):
+        store = self.receiver.store
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'duration_s': round(duration, 1),
+            'tags': self.base_tags,
+            'scenarios': [],
+        }
+        for result in self.results:
+            item = {
+                'scenario': result['scenario'],
+                'mode': result['mode'],
+                'runs': [entry['run_id'] for entry in result['runs']],
+                'failed': result['failed'],
+            }
+            if result['runs'] and result['mode'] == 'groups':
+                groups = store.load('groups', result['runs'])
+                item['latency'] = {
+                    'avg_us': round(float(np.mean(groups['avg_latency_us'])), 3),
+                    'min_us': float(np.min(groups['min_latency_us'])),
+                    'max_us': float(np.max(groups['max_latency_us'])),
+                    'p99_group_max_us': round(float(np.percentile(groups['max_latency_us'], 99)), 3),
+                }
+                item['jitter'] = {'avg_us': round(float(np.mean(groups['avg_jitter_us'])), 3)}
+            elif result['runs']:
+                stats = SessionStats()
+                for entry in result['runs']:
+                    stats.merge(SessionStats.from_dict(entry['meta']['stats']))
+                item.update(stats.describe())
+            report['scenarios'].append(item)
+        return report
+
+    def write_report(self, report):
+        os.makedirs(self.report_dir, exist_ok=True)
+        filename = os.path.join(self.report_dir,
+                                f"{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print("\n" + "="*60)
+        print(f"ИТОГИ КАМПАНИИ ({report['duration_s']} с)")
+        print("="*60)
+        for item in report['scenarios']:
+            print(f"{item['scenario']}: запусков {len(item['runs'])}, ошибок {item['failed']}")
+            latency = item.get('latency')
+            if item['mode'] == 'groups' and latency:
+                print(f"  LATENCY (мкс): среднее {latency['avg_us']:.2f}, мин {latency['min_us']:.0f}, "
+                      f"макс {latency['max_us']:.0f}, p99 макс. по группам {latency['p99_group_max_us']:.2f}")
+                print(f"  JITTER (мкс): среднее {item['jitter']['avg_us']:.2f}")
+            elif latency:
+                for line in format_stats(latency, "  LATENCY") + format_stats(item['jitter'], "  JITTER"):
+                    print(line)
+        print("="*60)
+        print(f"✓ Отчет сохранен: {filename}")
+        return filename
@@ -0,0 +1,213 @@
+"""
+Команды Arduino с номерами запросов и подтверждениями.
+
+ПК отправляет команду с префиксом номера: ``#17 STATUS``. Скетч повторяет
+номер полем ``seq`` в ответе на эту команду (и в данных по SEND), поэтому
+ответ сопоставляется с запросом по номеру, а не по тому, какая строка
+пришла следующей. Несколько команд могут ждать ответа одновременно,
+например опрос STATUS во время передачи данных SEND; у каждой свой
+таймаут.
+
+Какой ответ считается окончательным, задает таблица REPLIES: на SEND
+сначала приходит подтверждение ``sending``, а запрос завершается
+данными. Ответ со ``status: error`` и тем же номером завершает запрос
+ошибкой CommandError.
+
+Ответы на ожидаемые запросы забираются из очереди SerialReader
+(message.claimed), остальные сообщения - data_ready, записи потока,
+ответы на команды без ожидания - обрабатываются как раньше.
+
+Старый скетч без номеров отвечает на ``#N ...`` ошибкой Unknown command;
+handshake() это замечает и переключает канал в режим без номеров, где
+ответ сопоставляется с самым старым запросом, который его ожидает.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from serial_reader import MSG_DATA
+
+# Окончательный ответ на команду (по первому слову): status или тип сообщения
+REPLIES = {
+    "START": ("started",),
+    "SEND": (MSG_DATA,),
+    "CONFIG": ("configured",),
+    "STREAM": ("stream_started",),
+    "STOP": ("stream_stopped",),
+    "LIVE": ("live",),
+    "STATUS": ("status_report",),
+    "RESET": ("reset",),
+}
+
+# Номер повторяется в ответе как unsigned long; по кругу, чтобы не расти бесконечно
+MAX_SEQ = 1 << 31
+
+
+class CommandError(Exception):
+    """Arduino ответил на команду ошибкой"""
+
+
+class Request:
+    """Команда, ожидающая ответа"""
+
+    __slots__ = ("seq", "command", "expect", "ordered", "future", "deadline", "sent_at", "ack")
+
+    def __init__(self, seq, command, expect, timeout, ordered=False):
+        self.seq = seq
+        self.command = command
+        self.expect = expect
+        # Ответ может прийти без номера (проверка, поддерживает ли скетч номера)
+        self.ordered = ordered
+        self.future = Future()
+        self.sent_at = time.monotonic()
+        self.deadline = self.sent_at + timeout
+        self.ack = None
+
+    def accepts(self, message):
+        return message.status in self.expect or message.kind in self.expect
+
+    def result(self, timeout=None):
+        """Ответ (SerialMessage); CommandError или TimeoutError при неудаче"""
+        remaining = self.deadline - time.monotonic()
+        if timeout is not None:
+            remaining = min(remaining, timeout)
+        return self.future.result(max(remaining, 0))
+
+
+class CommandChannel:
+    """Запросы к Arduino поверх SerialReader"""
+
+    def __init__(self, write, reader, sequenced=True, timeout=5):
+        # write(line) отправляет строку команды без перевода строки
+        self.write = write
+        self.reader = reader
+        self.sequenced = sequenced
+        self.timeout = timeout
+        self._seq = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        reader.on("*", self._on_message)
+
+    def next_seq(self):
+        return (next(self._seq) - 1) % (MAX_SEQ - 1) + 1
+
+    def format(self, command, seq):
+        return f"#{seq} {command}" if self.sequenced else command
+
+    def send(self, command):
+        """Команда без ожидания: ответ попадет в очередь SerialReader"""
+        self.write(self.format(command, self.next_seq()))
+
+    def request(self, command, expect=None, timeout=None, ordered=False):
+        """Отправка команды; возвращает Request, ответ - request.result()"""
+        if expect is None:
+            expect = REPLIES.get(command.split()[0].upper(), ()) if command.strip() else ()
+        request = Request(self.next_seq(), command, tuple(expect),
+                          self.timeout if timeout is None else timeout, ordered)
+        with self._lock:
+            self._expire(request.sent_at)
+            self._pending[request.seq] = request
+        try:
+            self.write(self.format(command, request.seq))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(request.seq, None)
+            request.future.set_exception(e)
+        return request
+
+    def call(self, command, timeout=None, expect=None):
+        """Команда с ожиданием ответа: SerialMessage или None (причина выводится)"""
+        request = self.request(command, expect, timeout)
+        try:
+            return request.result()
+        except FutureTimeout:
+            self.cancel(request)
+            print(f"Нет ответа на {command} за {request.deadline - request.sent_at:.1f} с")
+        except CommandError as e:
+            print(f"Arduino отклонил {command}: {e}")
+        except OSError as e:
+            print(f"Ошибка отправки {command}: {e}")
+        return None
+
+    def cancel(self, request):
+        with self._lock:
+            waiting = self._pending.pop(request.seq, None) is not None
+        if waiting:
+            request.future.cancel()
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    def handshake(self, timeout=5, interval=0.3):
+        """Ожидание готовности скетча вместо фиксированной паузы после открытия порта.
+
+        При открытии порта Arduino перезагружается, и загрузчик отбрасывает
+        команды, поэтому STATUS повторяется, пока не придет ответ.
+        Возвращает True, если скетч ответил.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            wait = min(interval, max(deadline - time.monotonic(), 0))
+            request = self.request("STATUS", expect=("status_report", "error"), timeout=wait,
+                                   ordered=True)
+            try:
+                message = request.result()
+            except FutureTimeout:
+                self.cancel(request)
+                continue
+            if self.sequenced and "seq" not in message.payload:
+                # Старый скетч: номер не повторил (или не понял команду с номером)
+                self.sequenced = False
+                print("Скетч не поддерживает номера команд, ответы сопоставляются по порядку")
+                if message.status == "error":
+                    continue
+            return True
+        return False
+
+    def _on_message(self, message):
+        payload = message.payload if isinstance(message.payload, dict) else {}
+        seq = payload.get("seq")
+        with self._lock:
+            if self._pending:
+                self._expire(time.monotonic())
+            if seq is not None:
+                request = self._pending.get(seq)
+            else:
+                request = self._oldest_waiting(message)
+            if request is None:
+                return
+            if message.status == "error":
+                del self._pending[request.seq]
+            elif request.accepts(message):
+                del self._pending[request.seq]
+            else:
+                # Промежуточное подтверждение (sending перед данными SEND)
+                request.ack = message
+                message.claimed = True
+                return
+        message.claimed = True
+        if message.status == "error" and not request.accepts(message):
+            request.future.set_exception(CommandError(payload.get("message", "error")))
+        else:
+            request.future.set_result(message)
+
+    def _oldest_waiting(self, message):
+        """Режим без номеров: самый старый запрос, ожидающий такой ответ"""
+        if not message.status and message.kind != MSG_DATA:
+            return None
+        for request in self._pending.values():
+            if self.sequenced and not request.ordered:
+                continue
+            if message.status == "error" or request.accepts(message):
+                return request
+        return None
+
+    def _expire(self, now):
+        # Вызывается под self._lock
+        for seq, request in list(self._pending.items()):
+            if now > request.deadline:
+                del self._pending[seq]
+                request.future.set_exception(FutureTimeout())
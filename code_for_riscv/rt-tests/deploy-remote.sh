@@ -61,7 +61,7 @@ for file in "$@"; do
 done
 
 echo "🔧 Компиляция на RISC-V одноплатнике..."
-echo "💡 Используется команда: gcc lichee_example.c -o lichee_example -lgpiod"
+echo "💡 Используется команда: gcc lichee_example.c -o lichee_example -lgpiod -lpthread"
 
 # Компилируем на удаленной машине с библиотекой gpiod
 ssh $REMOTE_USER@$REMOTE_HOST "
@@ -73,13 +73,13 @@ ssh $REMOTE_USER@$REMOTE_HOST "
     
     # Основная команда компиляции
     if [ -f 'lichee_example.c' ]; then
-        gcc lichee_example.c -o $TARGET_NAME -lgpiod 2>&1
+        gcc lichee_example.c -o $TARGET_NAME -lgpiod -lpthread 2>&1
     else
         # Если файл называется иначе
         C_FILE=\$(ls *.c | head -1)
         if [ -n \"\$C_FILE\" ]; then
             echo \"📄 Используем файл: \$C_FILE\"
-            gcc \"\$C_FILE\" -o $TARGET_NAME -lgpiod 2>&1
+            gcc \"\$C_FILE\" -o $TARGET_NAME -lgpiod -lpthread 2>&1
         else
             echo '❌ Не найден ни один .c файл!'
             exit 1
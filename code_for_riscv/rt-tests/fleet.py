@@ -0,0 +1,152 @@
+"""
+Одновременный прогон кампании на нескольких стендах.
+
+Каждому найденному Arduino (или порту из списка) выделяется свой поток с
+отдельным ArduinoDataReceiver и CampaignRunner. Все стенды пишут в один
+экземпляр SessionStore, сессии помечаются тегом board, поэтому после
+прогона платы сравниваются одной выборкой из хранилища.
+
+Имена плат задаются JSON-файлом {"порт или серийный номер Arduino": "имя"},
+например {"/dev/ttyACM0": "lichee-01", "75833353035351F0E1A1": "mango-03"}.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from campaign import CampaignRunner
+
+
+class Bench:
+    """Один стенд: порт Arduino и имя исследуемой платы"""
+
+    def __init__(self, port, name, serial_number=None):
+        self.port = port
+        self.name = name
+        self.serial_number = serial_number
+        self.report = None
+        self.error = None
+
+    def __repr__(self):
+        return f"Bench({self.name!r}, {self.port!r})"
+
+
+def discover_benches(receiver_class, ports=None, names_file=None):
+    """Список стендов: явно заданные порты или все найденные Arduino"""
+    names = {}
+    if names_file:
+        with open(names_file) as f:
+            names = json.load(f)
+
+    if ports:
+        found = [(port, None) for port in ports]
+    else:
+        found = [(port.device, port.serial_number) for port in receiver_class.auto_detect_ports()]
+
+    benches = []
+    for port, serial_number in found:
+        name = names.get(port) or (names.get(serial_number) if serial_number else None) \
+            or f"board_{os.path.basename(port)}"
+        benches.append(Bench(port, name, serial_number))
+    return benches
+
+
+class FleetRunner:
+    """Параллельный прогон одной кампании на всех стендах"""
+
+    def __init__(self, receiver_factory, benches, scenarios, report_dir="arduino_measurements"):
+        """receiver_factory(bench) должен вернуть неподключенный ArduinoDataReceiver"""
+        self.receiver_factory = receiver_factory
+        self.benches = benches
+        self.scenarios = scenarios
+        self.report_dir = report_dir
+
+    def run(self):
+        started = time.time()
+        print(f"\nСТЕНДОВ: {len(self.benches)}")
+        for bench in self.benches:
+            print(f"  {bench.name}: {bench.port}")
+
+        threads = [threading.Thread(target=self._run_bench, args=(bench,),
+                                    name=f"bench-{bench.name}", daemon=True)
+                   for bench in self.benches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report = self.build_report(time.time() - started)
+        self.write_report(report)
+        return report
+
+    def _run_bench(self, bench):
+        receiver = self.receiver_factory(bench)
+        receiver.tags = {**receiver.tags, 'board': bench.name}
+        if bench.serial_number:
+            receiver.tags['arduino_sn'] = bench.serial_number
+
+        try:
+            if not receiver.connect():
+                bench.error = "нет соединения"
+                return
+            runner = CampaignRunner(receiver, self.scenarios, self.report_dir,
+                                    name=f"campaign_{bench.name}")
+            bench.report = runner.run()
+        except Exception as e:
+            bench.error = str(e)
+            print(f"[{bench.name}] Ошибка: {e}")
+        finally:
+            receiver.close()
+
+    def build_report(self, duration):
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'duration_s': round(duration, 1),
+            'boards': {},
+            'scenarios': {},
+        }
+        for bench in self.benches:
+            report['boards'][bench.name] = {'port': bench.port, 'error': bench.error}
+            if not bench.report:
+                continue
+            for item in bench.report['scenarios']:
+                row = {'board': bench.name, 'runs': len(item['runs']), 'failed': item['failed']}
+                latency = item.get('latency', {})
+                row['avg_us'] = latency.get('avg_us')
+                row['max_us'] = latency.get('max_us')
+                row['p99_us'] = latency.get('p99_us', latency.get('p99_group_max_us'))
+                report['scenarios'].setdefault(item['scenario'], []).append(row)
+
+        # Платы внутри сценария - от лучшей к худшей по хвосту задержки
+        for rows in report['scenarios'].values():
+            rows.sort(key=lambda row: (row['p99_us'] is None, row['p99_us'] or 0))
+        return report
+
+    def write_report(self, report):
+        os.makedirs(self.report_dir, exist_ok=True)
+        filename = os.path.join(self.report_dir,
+                                f"fleet_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print("\n" + "="*60)
+        print(f"СРАВНЕНИЕ ПЛАТ ({report['duration_s']} с)")
+        print("="*60)
+        for name, board in report['boards'].items():
+            if board['error']:
+                print(f"✗ {name} ({board['port']}): {board['error']}")
+        for scenario, rows in report['scenarios'].items():
+            print(f"\n{scenario}:")
+            print(f"  {'плата':<20}{'среднее':>10}{'p99':>10}{'макс':>10}{'запусков':>10}")
+            for row in rows:
+                print(f"  {row['board']:<20}{_fmt(row['avg_us']):>10}{_fmt(row['p99_us']):>10}"
+                      f"{_fmt(row['max_us']):>10}{row['runs']:>10}")
+        print("="*60)
+        print(f"✓ Отчет сохранен: {filename}")
+        return filename
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.1f}"
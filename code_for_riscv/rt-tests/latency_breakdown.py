@@ -0,0 +1,223 @@
+"""
+Разложение задержки ответа Lichee на составляющие.
+
+lichee_example.c, запущенный с адресом ПК (``./lichee_example <IP ПК>``),
+на каждое событие записывает время фронта из ядра (gpiod_edge_event,
+CLOCK_MONOTONIC), время возврата из чтения события и время после записи
+в выходной пин и пачками шлет их по UDP. BoardTraceCollector принимает
+пачки в отдельном потоке в кольцевой буфер постоянного размера.
+
+В потоковом режиме Arduino измеряет задержку по спадающему фронту
+ответа, поэтому запись с номером seq соответствует seq-му спадающему
+фронту на Lichee с начала потока. decompose() сопоставляет их по номеру
+события на линии (line_seqno: разрывы - потерянные ядром события) и
+делит каждую задержку на части:
+
+    irq             фронт на пине -> метка времени в обработчике прерывания
+                    (остаток: полная задержка Arduino минус две части ниже)
+    kernel_to_user  метка времени -> возврат из чтения события в RT-цикле
+    user_to_pin     возврат из чтения -> конец записи в выходной пин
+
+micros() на Arduino считает с шагом 4 мкс, поэтому у irq погрешность того
+же порядка. Часы платы переводятся во время ПК по минимальной разнице
+между временем приема пачки и ее отправки (задержка UDP в локальной сети
+мала), этого достаточно, чтобы выбрать события сессии.
+"""
+
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from latency_stats import LatencyHistogram
+
+MAGIC = b"LTR1"
+HEADER = struct.Struct("<4sIIHHQ")
+RECORD_DTYPE = np.dtype({
+    'names': ['event_ns', 'wake_ns', 'write_ns', 'line_seqno', 'edge'],
+    'formats': ['<u8', '<u4', '<u4', '<u4', 'u1'],
+    'offsets': [0, 8, 12, 16, 20],
+    'itemsize': 24,
+})
+EDGE_RISING, EDGE_FALLING = 1, 2
+DEFAULT_PORT = 9200
+
+COMPONENTS = (
+    ('irq_ns', "IRQ -> ЯДРО"),
+    ('kernel_to_user_ns', "ЯДРО -> ПОЛЬЗОВАТЕЛЬ"),
+    ('user_to_pin_ns', "ПОЛЬЗОВАТЕЛЬ -> ПИН"),
+)
+
+
+class BoardTraceCollector(threading.Thread):
+    """Прием пачек событий от lichee_example.c в кольцевой буфер"""
+
+    def __init__(self, port=DEFAULT_PORT, host="0.0.0.0", capacity=1 << 20):
+        super().__init__(name="board-trace", daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+
+        self.ring = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.written = 0
+        self.batches = 0
+        self.lost_batches = 0
+        self.board_dropped = 0
+        # Время ПК = время платы (с) + offset
+        self.offset = None
+        self.last_batch_at = 0.0
+        self._next_batch = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.sock.close()
+
+    def run(self):
+        buffer = bytearray(HEADER.size + 64 * RECORD_DTYPE.itemsize)
+        while not self._stop_event.is_set():
+            try:
+                size = self.sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.feed(memoryview(buffer)[:size], time.time())
+
+    def feed(self, datagram, received_at):
+        """Разбор одной датаграммы"""
+        if len(datagram) < HEADER.size:
+            return
+        magic, batch, dropped, count, _, sent_ns = HEADER.unpack_from(datagram)
+        if magic != MAGIC or len(datagram) < HEADER.size + count * RECORD_DTYPE.itemsize:
+            return
+        records = np.frombuffer(datagram, RECORD_DTYPE, count, HEADER.size)
+
+        with self._lock:
+            if self._next_batch is not None and batch != self._next_batch:
+                self.lost_batches += (batch - self._next_batch) & 0xFFFFFFFF
+            self._next_batch = (batch + 1) & 0xFFFFFFFF
+            self.batches += 1
+            self.board_dropped = dropped
+            offset = received_at - sent_ns / 1e9
+            self.offset = offset if self.offset is None else min(self.offset, offset)
+            self.last_batch_at = received_at
+
+            capacity = len(self.ring)
+            start = self.written % capacity
+            first = min(count, capacity - start)
+            self.ring[start:start + first] = records[:first]
+            self.ring[:count - first] = records[first:]
+            self.written += count
+
+    def events(self, since=None, until=None, edge=None):
+        """Копия событий в окне времени ПК (с), по возрастанию номера события"""
+        with self._lock:
+            count = min(self.written, len(self.ring))
+            start = (self.written - count) % len(self.ring)
+            events = np.roll(self.ring, -start)[:count] if start else self.ring[:count].copy()
+            offset = self.offset
+        if offset is None:
+            return events[:0]
+        times = events['event_ns'] / 1e9 + offset
+        mask = np.ones(len(events), dtype=bool)
+        if since is not None:
+            mask &= times >= since
+        if until is not None:
+            mask &= times <= until
+        if edge is not None:
+            mask &= events['edge'] == edge
+        return events[mask]
+
+    def wait_settled(self, after, timeout=1.0, quiet=0.1):
+        """Ожидание последних пачек: тишина quiet с после момента after (время ПК)"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            now = time.time()
+            if now - max(self.last_batch_at, after) >= quiet:
+                return True
+            time.sleep(quiet / 4)
+        return False
+
+
+def decompose(samples, events, max_shift=3):
+    """Сопоставление записей Arduino со спадающими фронтами на плате.
+
+    samples - StreamSession.arrays(), events - спадающие фронты сессии
+    из BoardTraceCollector.events(). Возвращает (таблица, сведения) или
+    (None, причина). Сдвиг в пределах max_shift выбирается так, чтобы
+    задержка Arduino реже всего оказывалась меньше измеренной на плате
+    части (что физически невозможно); при равенстве - ближайший к нулю.
+    """
+    if len(samples['seq']) == 0 or len(events) == 0:
+        return None, "нет событий платы для этой сессии"
+
+    # Фронты чередуются, поэтому номер спадающего фронта - разность line_seqno пополам
+    seqno = events['line_seqno'].astype(np.int64)
+    seqno += np.cumsum(np.diff(seqno, prepend=seqno[0]) < 0) << 32
+    index = (seqno - seqno[0]) // 2
+
+    sample_seq = samples['seq'] - samples['seq'][0]
+    latency_ns = samples['latency_us'].astype(np.int64) * 1000
+    board_ns = events['wake_ns'].astype(np.int64) + events['write_ns'].astype(np.int64)
+
+    best = None
+    for shift in sorted(range(-max_shift, max_shift + 1), key=abs):
+        common, sample_pos, event_pos = np.intersect1d(sample_seq, index + shift,
+                                                       assume_unique=True, return_indices=True)
+        if len(common) == 0:
+            continue
+        violations = int(np.count_nonzero(latency_ns[sample_pos] < board_ns[event_pos]))
+        score = (violations / len(common), -len(common))
+        if best is None or score < best[0]:
+            best = (score, shift, sample_pos, event_pos, violations)
+    if best is None:
+        return None, "номера событий платы не пересекаются с записями Arduino"
+
+    _, shift, sample_pos, event_pos, violations = best
+    matched = events[event_pos]
+    table = {
+        'seq': samples['seq'][sample_pos],
+        'latency_us': samples['latency_us'][sample_pos],
+        'event_ns': matched['event_ns'],
+        'irq_ns': latency_ns[sample_pos] - board_ns[event_pos],
+        'kernel_to_user_ns': matched['wake_ns'],
+        'user_to_pin_ns': matched['write_ns'],
+    }
+    info = {
+        'shift': shift,
+        'matched': len(sample_pos),
+        'samples': len(sample_seq),
+        'events': len(events),
+        'violations': violations,
+        'components': {column: describe_ns(table[column]) for column, _ in COMPONENTS},
+    }
+    return table, info
+
+
+def describe_ns(values_ns):
+    """Распределение составляющей в мкс (отрицательные irq - погрешность micros())"""
+    histogram = LatencyHistogram()
+    histogram.record(np.clip(np.rint(np.asarray(values_ns) / 1000), 0, None).astype(np.int64))
+    return histogram.describe()
+
+
+def format_breakdown(info):
+    """Строки для вывода разложения в консоль"""
+    lines = [f"РАЗЛОЖЕНИЕ ЗАДЕРЖКИ: сопоставлено {info['matched']:,} из {info['samples']:,} "
+             f"(событий платы {info['events']:,}, сдвиг {info['shift']:+d}, "
+             f"противоречий {info['violations']:,})"]
+    for column, title in COMPONENTS:
+        description = info['components'][column]
+        if description['count']:
+            lines.append(f"  {title:<22} среднее {description['avg_us']:8.2f}  "
+                         f"P50 {description['p50_us']:>6}  P99 {description['p99_us']:>6}  "
+                         f"P99.9 {description['p99.9_us']:>6}  макс {description['max_us']:>6} мкс")
+    return lines
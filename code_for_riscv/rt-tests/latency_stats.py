@@ -0,0 +1,208 @@
+"""
+Статистика задержек на стороне ПК.
+
+LatencyHistogram - гистограмма в духе HDR Histogram: значения в
+микросекундах раскладываются по логарифмически-линейным корзинам, поэтому
+память постоянна (несколько десятков КБ) при любом числе измерений, а
+относительная погрешность перцентилей не превышает 1 / 2**sub_bucket_bits.
+Запись и перцентили считаются векторно через numpy, гистограммы разных
+сессий складываются через merge().
+"""
+
+import numpy as np
+
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9, 99.99)
+
+
+class LatencyHistogram:
+    """Гистограмма целочисленных значений (мкс) с постоянной памятью"""
+
+    def __init__(self, max_value_us=1 << 26, sub_bucket_bits=7):
+        self.max_value_us = int(max_value_us)
+        self.sub_bucket_bits = int(sub_bucket_bits)
+        self.counts = np.zeros(self._index(np.array([self.max_value_us]))[0] + 1, dtype=np.int64)
+        self.total = 0
+        self.overflow = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.sum_sq = 0.0
+
+    def _index(self, values):
+        """Номер корзины для каждого значения.
+
+        Значения меньше 2**(bits+1) хранятся точно; дальше каждая степень
+        двойки делится на 2**bits корзин.
+        """
+        values = values.astype(np.int64)
+        bit_length = np.frexp(values.astype(np.float64))[1].astype(np.int64)
+        shift = np.maximum(bit_length - (self.sub_bucket_bits + 1), 0)
+        return (shift << self.sub_bucket_bits) + (values >> shift)
+
+    def _value_at(self, index):
+        """Нижняя граница корзины"""
+        index = np.asarray(index, dtype=np.int64)
+        shift = np.maximum((index >> self.sub_bucket_bits) - 1, 0)
+        return (index - (shift << self.sub_bucket_bits)) << shift
+
+    def _upper_value_at(self, index):
+        """Наибольшее значение, попадающее в корзину"""
+        return self._value_at(np.asarray(index) + 1) - 1
+
+    def record(self, values):
+        """Добавление массива значений"""
+        values = np.asarray(values)
+        if values.size == 0:
+            return
+        values = np.clip(values.ravel(), 0, None).astype(np.int64)
+
+        over = values > self.max_value_us
+        if over.any():
+            self.overflow += int(over.sum())
+            values = np.minimum(values, self.max_value_us)
+
+        self.counts += np.bincount(self._index(values), minlength=len(self.counts))
+        self.total += int(values.size)
+
+        values_min, values_max = int(values.min()), int(values.max())
+        self.min = values_min if self.min is None else min(self.min, values_min)
+        self.max = values_max if self.max is None else max(self.max, values_max)
+
+        as_float = values.astype(np.float64)
+        self.sum += float(as_float.sum())
+        self.sum_sq += float(np.dot(as_float, as_float))
+
+    def merge(self, other):
+        """Добавление другой гистограммы с такими же параметрами"""
+        if (other.max_value_us, other.sub_bucket_bits) != (self.max_value_us, self.sub_bucket_bits):
+            raise ValueError("Гистограммы с разными параметрами нельзя объединить")
+        self.counts += other.counts
+        self.total += other.total
+        self.overflow += other.overflow
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        """Значения перцентилей (верхняя граница корзины, не больше max)"""
+        if self.total == 0:
+            return {p: 0 for p in percentiles}
+
+        cumulative = np.cumsum(self.counts)
+        ranks = np.ceil(np.asarray(percentiles, dtype=np.float64) / 100.0 * self.total)
+        ranks = np.clip(ranks, 1, self.total)
+        indexes = np.searchsorted(cumulative, ranks)
+        values = np.minimum(self._upper_value_at(indexes), self.max)
+        return {p: int(v) for p, v in zip(percentiles, values)}
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
+
+    def std(self):
+        if self.total < 2:
+            return 0.0
+        mean = self.mean()
+        return float(np.sqrt(max(self.sum_sq / self.total - mean * mean, 0.0)))
+
+    def buckets(self, bins=50):
+        """Грубая гистограмма для графиков: (границы, количества)"""
+        if self.total == 0:
+            return np.zeros(bins + 1), np.zeros(bins, dtype=np.int64)
+
+        nonzero = np.nonzero(self.counts)[0]
+        edges = np.linspace(self.min, self.max + 1, bins + 1)
+        counts, _ = np.histogram(self._value_at(nonzero), bins=edges, weights=self.counts[nonzero])
+        return edges, counts.astype(np.int64)
+
+    def describe(self, percentiles=DEFAULT_PERCENTILES):
+        result = {
+            'count': self.total,
+            'min_us': self.min if self.min is not None else 0,
+            'max_us': self.max if self.max is not None else 0,
+            'avg_us': round(self.mean(), 3),
+            'std_us': round(self.std(), 3),
+        }
+        for p, value in self.percentiles(percentiles).items():
+            result[f"p{p:g}_us"] = value
+        if self.overflow:
+            result['overflow'] = self.overflow
+        return result
+
+    def to_dict(self):
+        """Компактное представление (только непустые корзины) для хранения"""
+        nonzero = np.nonzero(self.counts)[0]
+        return {
+            'max_value_us': self.max_value_us,
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'index': nonzero.tolist(),
+            'counts': self.counts[nonzero].tolist(),
+            'total': self.total,
+            'overflow': self.overflow,
+            'min': self.min,
+            'max': self.max,
+            'sum': self.sum,
+            'sum_sq': self.sum_sq,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['max_value_us'], data['sub_bucket_bits'])
+        histogram.counts[np.asarray(data['index'], dtype=np.int64)] = data['counts']
+        histogram.total = data['total']
+        histogram.overflow = data.get('overflow', 0)
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram.sum = data['sum']
+        histogram.sum_sq = data['sum_sq']
+        return histogram
+
+
+class SessionStats:
+    """Распределения latency и jitter одной или нескольких сессий"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.jitter = LatencyHistogram()
+        self.sessions = 0
+
+    def record(self, latency_us, jitter_us=None):
+        self.latency.record(latency_us)
+        if jitter_us is not None:
+            self.jitter.record(jitter_us)
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.jitter.merge(other.jitter)
+        self.sessions += other.sessions
+        return self
+
+    def describe(self):
+        return {'latency': self.latency.describe(), 'jitter': self.jitter.describe()}
+
+    def to_dict(self):
+        return {'sessions': self.sessions,
+                'latency': self.latency.to_dict(),
+                'jitter': self.jitter.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.sessions = data.get('sessions', 1)
+        stats.latency = LatencyHistogram.from_dict(data['latency'])
+        stats.jitter = LatencyHistogram.from_dict(data['jitter'])
+        return stats
+
+
+def format_stats(description, title):
+    """Строки для вывода describe() в консоль"""
+    lines = [f"{title} (мкс): n={description['count']:,}"]
+    if description['count']:
+        lines.append(f"  СРЕДНЕЕ: {description['avg_us']:.2f}  СКО: {description['std_us']:.2f}")
+        lines.append(f"  МИН: {description['min_us']}  МАКС: {description['max_us']}")
+        lines.append("  " + "  ".join(f"{key[:-3].upper()}: {value}"
+                                      for key, value in description.items()
+                                      if key.startswith('p') and key.endswith('_us')))
+    return lines
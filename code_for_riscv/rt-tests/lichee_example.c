@@ -8,6 +8,12 @@
 #include <string.h>
 #include <stdio.h>
 #include <dirent.h>
+#include <pthread.h>
+#include <stdatomic.h>
+#include <stdint.h>
+#include <time.h>
+#include <arpa/inet.h>
+#include <sys/socket.h>
 
 #define GPIO_CHIP      "/dev/gpiochip0"
 #define GPIO_LINE 4
@@ -18,6 +24,154 @@
 
 static volatile int running = 1;
 
+/*
+ * Трассировка ответов для разложения задержки на ПК (latency_breakdown.py).
+ *
+ * RT-цикл на каждое событие кладет в кольцевой буфер время фронта из
+ * ядра (gpiod_edge_event, CLOCK_MONOTONIC), время возврата из чтения
+ * события и время после записи в выходной пин. Поток без RT-приоритета
+ * раз в TRACE_PERIOD_MS отправляет накопленное пачками по UDP.
+ * Запуск с трассировкой: ./lichee_example <IP ПК> [порт]
+ *
+ * Формат датаграммы (little-endian): заголовок trace_header и count
+ * записей trace_record.
+ */
+#define TRACE_RING_SIZE   4096            /* степень двойки */
+#define TRACE_RING_MASK   (TRACE_RING_SIZE - 1)
+#define TRACE_BATCH       56              /* записей в датаграмме, < 1500 байт */
+#define TRACE_PERIOD_MS   20
+#define TRACE_PORT        9200
+#define TRACE_MAGIC       "LTR1"
+
+#define EDGE_RISING       1
+#define EDGE_FALLING      2
+
+struct trace_record {
+    uint64_t event_ns;        /* время фронта из ядра */
+    uint32_t wake_ns;         /* от фронта до возврата из чтения события */
+    uint32_t write_ns;        /* от возврата из чтения до конца записи в пин */
+    uint32_t line_seqno;      /* номер события на линии (разрывы - потери в ядре) */
+    uint8_t  edge;
+    uint8_t  reserved[3];
+} __attribute__((packed));
+
+struct trace_header {
+    char     magic[4];
+    uint32_t batch;           /* номер пачки (разрывы - потери UDP) */
+    uint32_t dropped;         /* записей, не поместившихся в буфер, всего */
+    uint16_t count;
+    uint16_t reserved;
+    uint64_t sent_ns;         /* CLOCK_MONOTONIC при отправке */
+} __attribute__((packed));
+
+static struct trace_record trace_ring[TRACE_RING_SIZE];
+static atomic_uint trace_head;   /* пишет RT-цикл */
+static atomic_uint trace_tail;   /* читает поток отправки */
+static atomic_uint trace_dropped;
+static int trace_enabled = 0;
+
+static inline uint64_t monotonic_ns(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000ull + ts.tv_nsec;
+}
+
+static inline void trace_push(uint64_t event_ns, uint64_t wake_ns, uint64_t done_ns,
+                              unsigned long seqno, int edge)
+{
+    unsigned int head = atomic_load_explicit(&trace_head, memory_order_relaxed);
+    unsigned int tail = atomic_load_explicit(&trace_tail, memory_order_acquire);
+    struct trace_record *rec;
+
+    if (head - tail >= TRACE_RING_SIZE) {
+        atomic_fetch_add_explicit(&trace_dropped, 1, memory_order_relaxed);
+        return;
+    }
+
+    rec = &trace_ring[head & TRACE_RING_MASK];
+    rec->event_ns = event_ns;
+    rec->wake_ns = wake_ns > event_ns ? (uint32_t)(wake_ns - event_ns) : 0;
+    rec->write_ns = (uint32_t)(done_ns - wake_ns);
+    rec->line_seqno = (uint32_t)seqno;
+    rec->edge = edge;
+    atomic_store_explicit(&trace_head, head + 1, memory_order_release);
+}
+
+static void *trace_sender(void *arg)
+{
+    struct sockaddr_in *addr = arg;
+    unsigned char packet[sizeof(struct trace_header) + TRACE_BATCH * sizeof(struct trace_record)];
+    struct trace_header header;
+    struct timespec period = { 0, TRACE_PERIOD_MS * 1000000L };
+    uint32_t batch = 0;
+    int sock;
+
+    sock = socket(AF_INET, SOCK_DGRAM, 0);
+    if (sock < 0) {
+        perror("socket");
+        return NULL;
+    }
+
+    memcpy(header.magic, TRACE_MAGIC, 4);
+    header.reserved = 0;
+
+    while (running) {
+        nanosleep(&period, NULL);
+
+        for (;;) {
+            unsigned int tail = atomic_load_explicit(&trace_tail, memory_order_relaxed);
+            unsigned int head = atomic_load_explicit(&trace_head, memory_order_acquire);
+            unsigned int count = head - tail;
+            unsigned int i;
+
+            if (count == 0)
+                break;
+            if (count > TRACE_BATCH)
+                count = TRACE_BATCH;
+
+            for (i = 0; i < count; i++)
+                memcpy(packet + sizeof(header) + i * sizeof(struct trace_record),
+                       &trace_ring[(tail + i) & TRACE_RING_MASK], sizeof(struct trace_record));
+            atomic_store_explicit(&trace_tail, tail + count, memory_order_release);
+
+            header.batch = batch++;
+            header.dropped = atomic_load_explicit(&trace_dropped, memory_order_relaxed);
+            header.count = count;
+            header.sent_ns = monotonic_ns();
+            memcpy(packet, &header, sizeof(header));
+
+            if (sendto(sock, packet, sizeof(header) + count * sizeof(struct trace_record), 0,
+                       (struct sockaddr *)addr, sizeof(*addr)) < 0)
+                perror("sendto");
+        }
+    }
+
+    close(sock);
+    return NULL;
+}
+
+static int start_trace_sender(pthread_t *thread, struct sockaddr_in *addr)
+{
+    pthread_attr_t attr;
+    struct sched_param sp = { .sched_priority = 0 };
+    int ret;
+
+    /* Поток отправки не наследует SCHED_FIFO и не мешает ответам */
+    pthread_attr_init(&attr);
+    pthread_attr_setinheritsched(&attr, PTHREAD_EXPLICIT_SCHED);
+    pthread_attr_setschedpolicy(&attr, SCHED_OTHER);
+    pthread_attr_setschedparam(&attr, &sp);
+    ret = pthread_create(thread, &attr, trace_sender, addr);
+    pthread_attr_destroy(&attr);
+    if (ret != 0) {
+        fprintf(stderr, "pthread_create: %s\n", strerror(ret));
+        return -1;
+    }
+    return 0;
+}
+
 static void setup_rt(int pid)
 {
     struct sched_param sp = {
@@ -77,7 +231,7 @@ static void set_irq_thread_priority(int irq_number)
     closedir(dir);
 }
 
-int main(void)
+int main(int argc, char **argv)
 {
     struct gpiod_chip *chip;
     struct gpiod_line_request *req;
@@ -85,6 +239,19 @@ int main(void)
     struct gpiod_line_config *line_cfg;
     struct gpiod_request_config *req_cfg;
     unsigned int offsets[2];
+    struct sockaddr_in trace_addr;
+    pthread_t trace_thread;
+
+    if (argc > 1) {
+        memset(&trace_addr, 0, sizeof(trace_addr));
+        trace_addr.sin_family = AF_INET;
+        trace_addr.sin_port = htons(argc > 2 ? atoi(argv[2]) : TRACE_PORT);
+        if (inet_pton(AF_INET, argv[1], &trace_addr.sin_addr) != 1) {
+            fprintf(stderr, "Неверный адрес ПК: %s\n", argv[1]);
+            return 1;
+        }
+        trace_enabled = 1;
+    }
 
     // Calculate offsets
     offsets[0] = (GPIO_LINE * 32) + GPIO_IN_LINE;   // Input
@@ -111,6 +278,7 @@ int main(void)
 
     gpiod_line_settings_set_direction(in_cfg, GPIOD_LINE_DIRECTION_INPUT);
     gpiod_line_settings_set_edge_detection(in_cfg, GPIOD_LINE_EDGE_BOTH);
+    gpiod_line_settings_set_event_clock(in_cfg, GPIOD_LINE_CLOCK_MONOTONIC);
 
     out_cfg = gpiod_line_settings_new();
     if (!out_cfg) {
@@ -150,16 +318,24 @@ int main(void)
 
     int wait_status = 0;
     struct gpiod_edge_event *ev;
+    uint64_t wake_ns = 0;
+    int rising;
+
+    if (trace_enabled && start_trace_sender(&trace_thread, &trace_addr) < 0)
+        trace_enabled = 0;
 
     while (running) {
 
         wait_status = gpiod_line_request_read_edge_events(req, evbuf,1);;
+        if (trace_enabled)
+            wake_ns = monotonic_ns();
 
         ev = gpiod_edge_event_buffer_get_event(evbuf, 0);
 
         //printf("\nEvent!");
 
-        if (gpiod_edge_event_get_event_type(ev) == GPIOD_EDGE_EVENT_RISING_EDGE) {
+        rising = gpiod_edge_event_get_event_type(ev) == GPIOD_EDGE_EVENT_RISING_EDGE;
+        if (rising) {
           
             gpiod_line_request_set_value(req, offsets[1], 1);
         
@@ -170,8 +346,16 @@ int main(void)
             gpiod_line_request_set_value(req, offsets[1], 0);
         
         }
+
+        if (trace_enabled)
+            trace_push(gpiod_edge_event_get_timestamp_ns(ev), wake_ns, monotonic_ns(),
+                       gpiod_edge_event_get_line_seqno(ev),
+                       rising ? EDGE_RISING : EDGE_FALLING);
     }
 
+    if (trace_enabled)
+        pthread_join(trace_thread, NULL);
+
     gpiod_edge_event_buffer_free(evbuf);
     gpiod_line_request_release(req);
     gpiod_chip_close(chip);
@@ -0,0 +1,347 @@
+"""
+Живой график задержек во время измерения.
+
+Обработчики потока чтения только складывают новые значения в буфер под
+блокировкой и сразу возвращают управление. Перерисовка идет в главном
+потоке не чаще max_fps раз в секунду, и только анимированные элементы
+(линии и текст) рисуются поверх сохраненного фона (blitting). Полная
+перерисовка выполняется, лишь когда значения выходят за пределы осей.
+
+Верхний график - средняя и максимальная задержка: по группам в обычном
+режиме и по каждому обновлению экрана в потоковом. Нижний - скользящая
+гистограмма последних window значений (в потоковом режиме - отдельных
+импульсов, в обычном - средних по группам).
+
+Закрытие окна или клавиша q прерывают запуск: RESET для групп и STOP
+для потокового режима.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from serial_reader import MSG_SAMPLES
+
+INTERACTIVE_BACKENDS = ("TkAgg", "QtAgg", "Qt5Agg", "GTK3Agg", "MacOSX")
+
+
+def _pyplot(backend=None):
+    """pyplot с оконным backend; остальной код работает с Agg"""
+    import matplotlib.pyplot as plt
+
+    for name in ([backend] if backend else INTERACTIVE_BACKENDS):
+        try:
+            plt.switch_backend(name)
+            return plt
+        except (ImportError, ValueError, RuntimeError):
+            continue
+    raise RuntimeError("Нет оконного backend matplotlib для живого графика "
+                       f"(пробовали: {backend or ', '.join(INTERACTIVE_BACKENDS)})")
+
+
+class LiveDashboard:
+    """Инкрементальный график текущего запуска"""
+
+    def __init__(self, receiver, max_fps=5, window=20000, bins=80, backend=None):
+        self.receiver = receiver
+        self.period = 1.0 / max(max_fps, 0.1)
+        self.window = int(window)
+        self.bins = int(bins)
+        self.backend = backend
+
+        self._lock = threading.Lock()
+        self._pending_groups = []
+        self._pending_samples = []
+        self._pending_count = 0
+        self._finished = threading.Event()
+        self.aborted = False
+        self.stream_mode = False
+        self.total = 0
+
+        # Скользящее окно значений для гистограммы
+        self._ring = np.zeros(self.window, dtype=np.uint32)
+        self._ring_pos = 0
+        self._ring_fill = 0
+
+        # Точки верхнего графика
+        self._x = []
+        self._avg = []
+        self._max = []
+        self._x_limit = None
+
+        self.fig = None
+        self.canvas = None
+        self._background = None
+        self._artists = []
+        self._hist_hi = None
+        self._hist_top = 0
+        self._hist_count_max = 0
+        self._y_hi = None
+        self._trend_max = 0
+
+    # --- обработчики потока чтения ----------------------------------------
+
+    def _handlers(self):
+        return [
+            ('group', self._on_group),
+            (MSG_SAMPLES, self._on_samples),
+            ('stream_started', self._on_stream_started),
+            ('data_ready', self._on_finished),
+            ('stream_stopped', self._on_finished),
+            ('reset', self._on_finished),
+        ]
+
+    def attach(self):
+        for key, callback in self._handlers():
+            self.receiver.reader.on(key, callback)
+
+    def detach(self):
+        if self.receiver.reader:
+            for key, callback in self._handlers():
+                self.receiver.reader.off(key, callback)
+
+    def _on_group(self, message):
+        with self._lock:
+            self._pending_groups.append(message.payload)
+
+    def _on_samples(self, message):
+        latency = message.payload['frames']['latency_us']
+        with self._lock:
+            self._pending_samples.append(latency)
+            self._pending_count += len(latency)
+            # Если экран не успевает, старше окна данные не нужны
+            while self._pending_count - len(self._pending_samples[0]) >= self.window:
+                self._pending_count -= len(self._pending_samples.pop(0))
+
+    def _on_stream_started(self, message):
+        limit = message.payload.get('limit', 0)
+        if limit:
+            self._x_limit = limit
+
+    def _on_finished(self, message):
+        self._finished.set()
+
+    # --- главный цикл ---------------------------------------------------------
+
+    def run(self, start, stream=False, pulses=0):
+        """Запуск измерения через start() и показ графика до его окончания.
+
+        Возвращает True, если измерение завершилось само, и False, если
+        оно прервано или окно не удалось открыть.
+        """
+        try:
+            plt = _pyplot(self.backend)
+        except RuntimeError as e:
+            print(e)
+            return False
+
+        self.stream_mode = stream
+        self._x_limit = pulses or None
+        self._build(plt)
+        self.attach()
+        try:
+            start()
+            next_draw = 0.0
+            while not self._finished.is_set():
+                if not plt.fignum_exists(self.fig.number):
+                    self.abort()
+                    break
+                now = time.monotonic()
+                if now >= next_draw:
+                    self.update()
+                    next_draw = now + self.period
+                self.canvas.flush_events()
+                time.sleep(0.02)
+            else:
+                self.update()
+        finally:
+            self.detach()
+            plt.close(self.fig)
+
+        if self.aborted:
+            print("Запуск прерван с живого графика")
+        return not self.aborted
+
+    def abort(self):
+        if self.aborted or self._finished.is_set():
+            return
+        self.aborted = True
+        if self.stream_mode:
+            self.receiver.send_command("STOP")
+        else:
+            self.receiver.reset()
+        self._finished.set()
+
+    def _on_key(self, event):
+        if event.key == 'q':
+            self.abort()
+
+    def _build(self, plt):
+        self.fig, (self.ax_trend, self.ax_hist) = plt.subplots(2, 1, figsize=(10, 7))
+        self.canvas = self.fig.canvas
+        unit = "импульс" if self.stream_mode else "группа"
+        self.ax_trend.set_title(f"Задержка по ходу измерения ({unit})")
+        self.ax_trend.set_xlabel('Номер импульса' if self.stream_mode else 'Номер группы')
+        self.ax_trend.set_ylabel('Latency (µs)')
+        self.ax_trend.grid(True, alpha=0.3)
+        self.ax_hist.set_title("Скользящая гистограмма " +
+                               ("импульсов" if self.stream_mode else "средних по группам"))
+        self.ax_hist.set_xlabel('Latency (µs)')
+        self.ax_hist.set_ylabel('Количество')
+        self.ax_hist.grid(True, alpha=0.3)
+
+        self.line_avg, = self.ax_trend.plot([], [], 'b.-', label='Среднее', animated=True)
+        self.line_max, = self.ax_trend.plot([], [], 'r.:', label='Максимум', animated=True)
+        self.ax_trend.legend(loc='upper left')
+        self.line_hist, = self.ax_hist.plot([], [], 'g-', drawstyle='steps-mid', animated=True)
+        self.text = self.ax_hist.text(0.98, 0.95, "", transform=self.ax_hist.transAxes,
+                                      ha='right', va='top', family='monospace', animated=True)
+        self._artists = [self.line_avg, self.line_max, self.line_hist, self.text]
+
+        self._set_trend_limits(self._x_limit or 10, 100)
+        self._set_hist_limits(100)
+        self.fig.tight_layout()
+
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('key_press_event', self._on_key)
+        plt.show(block=False)
+        self.canvas.draw()
+        self.canvas.flush_events()
+
+    # --- отрисовка ---------------------------------------------------------
+
+    def _on_draw(self, event):
+        """После полной перерисовки (в т.ч. изменения размера) обновляем фон"""
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._artists:
+            self.fig.draw_artist(artist)
+
+    def _set_trend_limits(self, x_hi, y_hi):
+        self.ax_trend.set_xlim(0, x_hi)
+        self.ax_trend.set_ylim(0, y_hi)
+        self._y_hi = y_hi
+
+    def _set_hist_limits(self, hi):
+        self._hist_hi = hi
+        self.ax_hist.set_xlim(0, hi)
+
+    def update(self):
+        with self._lock:
+            groups, self._pending_groups = self._pending_groups, []
+            samples, self._pending_samples = self._pending_samples, []
+            self._pending_count = 0
+
+        changed = self._add_groups(groups) | self._add_samples(samples)
+        if not changed:
+            return
+        self._update_histogram()
+
+        if self._rescale():
+            self.canvas.draw()   # фон и анимированные элементы через _on_draw
+        else:
+            self._blit()
+
+    def _add_groups(self, groups):
+        for group in groups:
+            if self._x_limit is None and group.get('groups'):
+                self._x_limit = group['groups']
+            self._x.append(group.get('group', len(self._x)) + 1)
+            self._avg.append(group.get('avg', 0))
+            self._max.append(group.get('max', 0))
+            self._trend_max = max(self._trend_max, self._max[-1])
+            self._push(np.array([group.get('avg', 0)]))
+        return bool(groups)
+
+    def _add_samples(self, samples):
+        if not samples:
+            return False
+        latency = np.concatenate(samples)
+        self.total += len(latency)
+        # Одна точка тренда на обновление экрана
+        self._x.append(self.total)
+        self._avg.append(float(latency.mean()))
+        self._max.append(float(latency.max()))
+        self._trend_max = max(self._trend_max, self._max[-1])
+        self._push(latency)
+        return True
+
+    def _push(self, values):
+        values = values[-self.window:]
+        count = len(values)
+        end = self._ring_pos + count
+        if end <= self.window:
+            self._ring[self._ring_pos:end] = values
+        else:
+            split = self.window - self._ring_pos
+            self._ring[self._ring_pos:] = values[:split]
+            self._ring[:count - split] = values[split:]
+        self._ring_pos = end % self.window
+        self._ring_fill = min(self._ring_fill + count, self.window)
+
+    def _update_histogram(self):
+        values = self._ring[:self._ring_fill]
+        if len(values) == 0:
+            return
+        self._hist_top = int(values.max())
+        width = self._hist_hi / self.bins
+        counts = np.bincount(np.minimum(values / width, self.bins - 1).astype(np.int64),
+                             minlength=self.bins)
+        centers = (np.arange(self.bins) + 0.5) * width
+        self.line_hist.set_data(centers, counts)
+        self._hist_count_max = int(counts.max())
+
+        p50, p99 = np.percentile(values, [50, 99])
+        done = f"{self.total:,} имп." if self.stream_mode else f"{len(self._x)} гр."
+        lost = getattr(self.receiver.stream, 'lost', 0) if self.stream_mode else 0
+        self.text.set_text(f"{done}\nокно: {len(values):,}\nP50: {p50:.1f}\nP99: {p99:.1f}\n"
+                           f"МАКС: {values.max()}" + (f"\nпотеряно: {lost:,}" if lost else ""))
+
+        self.line_avg.set_data(self._x, self._avg)
+        self.line_max.set_data(self._x, self._max)
+
+    def _rescale(self):
+        """Расширение осей с запасом, чтобы полная перерисовка была редкой"""
+        rescale = False
+        x_hi = self.ax_trend.get_xlim()[1]
+        if self._x and self._x[-1] > x_hi:
+            x_hi = max(self._x_limit or 0, x_hi * 2, self._x[-1])
+            rescale = True
+        elif self._x_limit and x_hi != self._x_limit and self._x[-1] <= self._x_limit:
+            x_hi = self._x_limit
+            rescale = True
+        y_hi = self._y_hi
+        if self._trend_max > y_hi:
+            y_hi = _nice_limit(self._trend_max)
+            rescale = True
+        if rescale:
+            self._set_trend_limits(x_hi, y_hi)
+
+        if self._hist_top >= self._hist_hi:
+            self._set_hist_limits(_nice_limit(self._hist_top))
+            self._update_histogram()
+            rescale = True
+        if self._hist_count_max > self.ax_hist.get_ylim()[1] or \
+                self._hist_count_max < self.ax_hist.get_ylim()[1] / 4:
+            self.ax_hist.set_ylim(0, self._hist_count_max * 1.5 + 1)
+            rescale = True
+        return rescale
+
+    def _blit(self):
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        for artist in self._artists:
+            self.fig.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+
+
+def _nice_limit(value):
+    """Верхняя граница оси: ближайшее сверху 1, 2 или 5 * 10^n с запасом"""
+    value = max(float(value) * 1.2, 1.0)
+    magnitude = 10 ** np.floor(np.log10(value))
+    for step in (1, 2, 5, 10):
+        if value <= step * magnitude:
+            return float(step * magnitude)
+    return float(10 * magnitude)
@@ -1,36 +1,91 @@
+import argparse
+import collections
+import csv
 import serial
 import json
+import sys
 import time
-import pandas as pd
+import numpy as np
 from datetime import datetime
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 import os
 
-mpl.use("agg")
+from serial_reader import SerialReader, MSG_DATA, MSG_STATUS, MSG_SAMPLES
+from serial_capture import CaptureWriter, capture_path, replay
+from command_channel import CommandChannel
+from latency_breakdown import BoardTraceCollector, EDGE_FALLING, decompose, format_breakdown
+from board_telemetry import TelemetryClient, format_telemetry, parse_address
+from binary_stream import StreamSession
+from latency_stats import SessionStats, format_stats
+from session_store import SessionStore, parse_tags
+from plot_worker import PlotRenderer, render_session_plot, PLOT_POLICIES
+from campaign import CampaignRunner, load_scenarios
+from fleet import FleetRunner, discover_benches
+from session_summary import SessionSummary, plot_data, print_summary, render_summary_plot, write_summary
+
+# Модули, которые не должны загружаться при запуске (только при первом использовании)
+HEAVY_MODULES = ('pandas', 'matplotlib', 'matplotlib.pyplot')
+# Сколько завершенных запусков по группам может ждать SEND со своей телеметрией
+MAX_FINISHED_TELEMETRY = 4
 
 class ArduinoDataReceiver:
-    def __init__(self, port=None, baudrate=115200):
+    def __init__(self, port=None, baudrate=500000, store_path="arduino_measurements/store",
+                 tags=None, legacy_export=False, renderer=None, live_fps=5, capture=None,
+                 board_trace=None, telemetry=None):
         """Инициализация соединения с Arduino"""
         self.port = port
         self.baudrate = baudrate
         self.ser = None
-        self.data = []
+        # Все сессии пишутся в общее колоночное хранилище с тегами сценария;
+        # несколько стендов могут писать в один экземпляр хранилища
+        self.store = store_path if isinstance(store_path, SessionStore) else SessionStore(store_path)
+        self.tags = dict(tags or {})
+        self.runs = []
+        # Дополнительно писать отдельные JSON и CSV на каждую сессию, как раньше
+        self.legacy_export = legacy_export
+        # Графики строятся в пуле процессов; None - без графиков
+        self.renderer = renderer
+        self.owns_renderer = True
+        # Частота обновления живого графика (команда live)
+        self.live_fps = live_fps
+        # Файл для записи сырого обмена с Arduino (serial_capture); None - не писать
+        self.capture_path = capture
+        self.capture = None
+        # latency_breakdown.BoardTraceCollector: события ответов от lichee_example.c
+        self.board_trace = board_trace
+        # board_telemetry.TelemetryClient: счетчики платы на время каждой сессии
+        self.telemetry = telemetry
+        # Завершенные отсчеты запусков по группам: номер сессии -> TelemetryRecording
+        # (скетч дает каждому START новый номер; ждут, пока данные запроса SEND сохранятся)
+        self.finished_telemetry = collections.OrderedDict()
         self.session_id = None
         self.last_data_received = None
+        self.reader = None
+        self.channel = None
+        self.stream = None
+        self.finished_streams = collections.deque()
+        self.last_stream = None
+        # Распределения всех потоковых сессий с момента запуска
+        self.total_stats = SessionStats()
+        
+    @staticmethod
+    def auto_detect_ports():
+        """Все подключенные Arduino: список объектов serial.tools.list_ports"""
+        import serial.tools.list_ports
         
+        return [port for port in serial.tools.list_ports.comports()
+                if 'Arduino' in port.description or 'ACM' in port.description]
+
     def auto_detect_port(self):
         """Автоматическое определение порта Arduino"""
         import serial.tools.list_ports
         
-        ports = list(serial.tools.list_ports.comports())
-        for port in ports:
-            if 'Arduino' in port.description or 'ACM' in port.description:
-                print(f"Найден Arduino на порту: {port.device}")
-                return port.device
+        ports = self.auto_detect_ports()
+        if ports:
+            print(f"Найден Arduino на порту: {ports[0].device}")
+            return ports[0].device
         
         print("Доступные COM порты:")
-        for port in ports:
+        for port in serial.tools.list_ports.comports():
             print(f"  {port.device}: {port.description}")
         
         return None
@@ -45,66 +100,339 @@ class ArduinoDataReceiver:
         
         try:
             self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
-            time.sleep(2)
-            print(f"Соединение установлено: {self.port}")
-            return True
         except Exception as e:
             print(f"Ошибка соединения: {e}")
             return False
+
+        self.start_reader()
+        # Arduino перезагружается при открытии порта: ждем ответа скетча, а не фиксированное время
+        if not self.channel.handshake():
+            print(f"Arduino на {self.port} не отвечает")
+            self.disconnect()
+            return False
+        print(f"Соединение установлено: {self.port}")
+        return True
+
+    def start_reader(self):
+        """Запуск фонового потока чтения порта"""
+        self.reader = SerialReader(self.ser)
+        if self.capture_path and self.capture is None:
+            self.capture = CaptureWriter(self.capture_path, {
+                'port': self.port, 'baudrate': self.baudrate, 'tags': self.tags})
+            print(f"Запись обмена в {self.capture_path}")
+        self.reader.capture = self.capture
+        self.register_default_handlers()
+        self.channel = CommandChannel(self.write_line, self.reader)
+        self.reader.start()
+
+    def register_default_handlers(self):
+        """Вывод служебных сообщений Arduino сразу при получении"""
+        def show(prefix, hint=None):
+            def handler(message):
+                print(f"\n{prefix} {message.payload.get('message', '')}")
+                if hint:
+                    print(hint)
+            return handler
+
+        self.reader.on('data_ready', show("✓ [ARDUINO]",
+                                          "   Используйте 'send' для получения данных и графиков"))
+        self.reader.on('started', show("✓ [ARDUINO]"))
+        self.reader.on('sending', show("✓ [ARDUINO]"))
+        self.reader.on('reset', show("✓ [ARDUINO]"))
+        self.reader.on('error', show("✗ [ARDUINO] Ошибка:"))
+        self.reader.on('status_report', lambda message: print(
+            f"\n✓ [ARDUINO] Групп собрано: {message.payload.get('groups_collected', 0)}, "
+            f"измерений в текущей группе: {message.payload.get('measurements_in_current_group', 0)}, "
+            f"сессия: {message.payload.get('session_id', 'N/A')}"))
+        self.reader.on(MSG_DATA, lambda message: print("\n✓ [ARDUINO] Получены данные измерений!"))
+        if self.telemetry:
+            self.reader.on('started', self.on_measurement_started)
+            self.reader.on('data_ready', self.on_measurement_finished)
+            self.reader.on('reset', lambda message: self.discard_telemetry())
+
+        # Потоковый режим: записи складываются в текущую сессию прямо в потоке чтения
+        self.reader.on('stream_started', self.on_stream_started)
+        self.reader.on(MSG_SAMPLES, self.on_stream_samples)
+        self.reader.on('stream_stopped', self.on_stream_stopped)
+
+    def on_measurement_started(self, message):
+        # Предыдущий запуск, не дошедший до data_ready, прерван
+        self.telemetry.forget(self.telemetry.end())
+        self.telemetry.begin(message.payload.get('session_id', self.session_id or 0))
+
+    def on_measurement_finished(self, message):
+        recording = self.telemetry.end()
+        if recording is None:
+            return
+        # Прежний скетч не меняет номер сессии: незапрошенный запуск с тем же номером заменяется
+        self.telemetry.forget(self.finished_telemetry.pop(recording.session_id, None))
+        self.finished_telemetry[recording.session_id] = recording
+        while len(self.finished_telemetry) > MAX_FINISHED_TELEMETRY:
+            session_id, stale = self.finished_telemetry.popitem(last=False)
+            self.telemetry.forget(stale)
+            print(f"Телеметрия сессии {session_id} отброшена: данные запуска не запрошены")
+
+    def discard_telemetry(self):
+        """RESET: отсчеты текущего и завершенных, но не переданных запусков не сохраняются"""
+        self.telemetry.forget(self.telemetry.end())
+        while self.finished_telemetry:
+            self.telemetry.forget(self.finished_telemetry.popitem()[1])
+
+    def on_stream_started(self, message):
+        self.stream = StreamSession(message.payload.get('session_id'))
+        self.stream.parameters = message.payload
+        self.stream.started_at = message.received_at
+        self.stream.telemetry = self.telemetry.begin(self.stream.session_id) if self.telemetry else None
+        print(f"\n✓ [ARDUINO] Потоковый режим, сессия {self.stream.session_id}")
+
+    def on_stream_stopped(self, message):
+        # Сессия откладывается до обработки, следующий поток может начаться сразу
+        if self.stream is not None:
+            self.stream.finish()
+            self.stream.stopped_at = message.received_at
+            if self.telemetry:
+                self.telemetry.end()
+            self.finished_streams.append(self.stream)
+            self.stream = None
+        print(f"\n✓ [ARDUINO] Поток остановлен: импульсов {message.payload.get('pulses', 0)}, "
+              f"пропущено на Arduino {message.payload.get('dropped', 0)}")
+
+    def on_stream_samples(self, message):
+        if self.stream is not None:
+            self.stream.add_frames(message.payload['frames'])
+
+    def close(self):
+        """Остановка потока чтения, пула отрисовки и закрытие порта"""
+        if self.renderer and self.owns_renderer:
+            if self.renderer.pending():
+                print("Ожидание завершения отрисовки графиков...")
+            self.renderer.close()
+        if self.board_trace:
+            self.board_trace.stop()
+            self.board_trace = None
+        if self.telemetry:
+            self.telemetry.end()
+            self.telemetry.stop()
+            self.telemetry = None
+        self.disconnect()
+
+    def disconnect(self):
+        """Остановка потока чтения и закрытие порта и файла захвата"""
+        if self.reader:
+            self.reader.stop()
+            if self.reader.dropped:
+                print(f"Потеряно сообщений из-за переполнения очереди: {self.reader.dropped}")
+            self.reader = None
+        self.channel = None
+        if self.ser:
+            self.ser.close()
+            self.ser = None
+            print("Соединение закрыто")
+        if self.capture:
+            self.capture.close()
+            print(f"Захват сохранен: {self.capture_path} ({self.capture.bytes:,} байт)")
+            self.capture = None
     
+    def write_line(self, command):
+        """Запись строки команды в порт (номер запроса добавляет CommandChannel)"""
+        if not (self.ser and self.ser.is_open):
+            raise OSError("порт не открыт")
+        line = f"{command}\n".encode('utf-8')
+        self.ser.write(line)
+        if self.capture:
+            self.capture.sent(line)
+
     def send_command(self, command):
-        """Отправка команды на Arduino"""
-        if self.ser and self.ser.is_open:
-            self.ser.write(f"{command}\n".encode('utf-8'))
+        """Отправка команды на Arduino без ожидания ответа"""
+        if self.channel and self.ser and self.ser.is_open:
+            self.channel.send(command)
             print(f"Отправлена команда: {command}")
+
+    def command(self, command, timeout=5):
+        """Команда с ожиданием ответа на нее: SerialMessage или None"""
+        if not self.channel:
+            return None
+        print(f"Отправлена команда: {command}")
+        return self.channel.call(command, timeout)
     
-    def read_json_message(self):
-        """Чтение JSON сообщения от Arduino"""
-        if self.ser and self.ser.in_waiting > 0:
-            try:
-                line = self.ser.readline().decode('utf-8').strip()
-                if line:
-                    return json.loads(line)
-            except json.JSONDecodeError:
-                return None
-            except UnicodeDecodeError:
-                return None
-        return None
+    def read_json_message(self, timeout=0):
+        """Чтение очередного JSON сообщения от Arduino из очереди"""
+        if not self.reader:
+            return None
+        message = self.reader.get(timeout=timeout)
+        while message is not None and message.kind not in (MSG_DATA, MSG_STATUS):
+            message = self.reader.get(timeout=timeout)
+        return message.payload if message else None
     
+    def configure(self, delay_us, groups, group_size, timeout=5):
+        """Установка параметров измерений на Arduino (команда CONFIG)"""
+        if self.command(f"CONFIG {delay_us} {groups} {group_size}", timeout) is None:
+            print("Arduino не подтвердил параметры измерений")
+            return False
+        return True
+
     def start_measurement(self):
         """Начать измерения"""
         self.send_command("START")
     
-    def request_data(self):
+    def request_data(self, timeout=10):
         """Запросить данные измерений и автоматически построить графики"""
-        self.send_command("SEND")
-        self.wait_and_process_data()
-    
-    def wait_and_process_data(self, timeout=10):
-        """Ожидание данных и автоматическая обработка"""
-        start_time = time.time()
         print("Ожидание данных от Arduino...")
-        
-        while time.time() - start_time < timeout:
-            message = self.read_json_message()
-            if message:
-                if "avg_latency_us" in message:
-                    self.process_data_with_plot(message)
-                    return True
-                else:
-                    status = message.get('status', '')
-                    if status == 'data_ready':
-                        print(f"✓ [ARDUINO] {message.get('message', '')}")
-                    elif status == 'sending':
-                        print(f"✓ [ARDUINO] {message.get('message', '')}")
-                    elif status == 'error':
-                        print(f"✗ [ARDUINO] {message.get('message', '')}")
-            
-            time.sleep(0.1)
-        
-        print("Таймаут ожидания данных!")
-        return False
+        message = self.command("SEND", timeout)
+        if message is None:
+            return False
+        self.process_data_with_plot(message.payload)
+        return True
     
+    def wait_for(self, accept, timeout):
+        """Ожидание сообщения из очереди, для которого accept(message) истинно.
+
+        Возвращает сообщение, либо None по таймауту или при сообщении об ошибке.
+        Статусы выводятся обработчиками потока чтения, здесь они только
+        пропускаются.
+        """
+        deadline = time.time() + timeout
+        while self.reader and time.time() < deadline:
+            message = self.reader.get(timeout=max(deadline - time.time(), 0))
+            if message is None:
+                break
+            if accept(message):
+                return message
+            if message.status == 'error':
+                return None
+        return None
+
+    def run_live(self, pulses=None):
+        """Измерение с живым графиком.
+
+        pulses=None - обычный запуск по группам, иначе потоковый режим
+        (0 - до закрытия окна). Закрытие окна прерывает запуск по группам.
+        """
+        from live_view import LiveDashboard
+
+        if self.reader:
+            self.reader.clear()
+        dashboard = LiveDashboard(self, max_fps=self.live_fps)
+        if pulses is None:
+            # Итоги групп скетч шлет только по LIVE 1: их передача идет во время импульсов
+            self.command("LIVE 1")
+            try:
+                if dashboard.run(self.start_measurement):
+                    self.request_data()
+            finally:
+                self.command("LIVE 0")
+        else:
+            dashboard.run(lambda: self.start_stream(pulses), stream=True, pulses=pulses)
+            # Поток останавливается и по закрытию окна; принятые записи сохраняются
+            if dashboard.fig is not None:
+                self.wait_stream_stopped()
+
+    def start_stream(self, pulses=0):
+        """Запуск потокового режима (0 - до команды stop)"""
+        self.send_command(f"STREAM {pulses}" if pulses else "STREAM")
+
+    def stop_stream(self, timeout=5):
+        """Остановка потокового режима и обработка принятых записей"""
+        message = self.command("STOP", timeout)
+        if message is None:
+            return False
+        self.process_stream_data(message.payload)
+        return True
+
+    def wait_stream_stopped(self, timeout=5):
+        message = self.wait_for(lambda m: m.status == 'stream_stopped', timeout)
+        if message is None:
+            print("Таймаут ожидания остановки потока!")
+            return False
+        self.process_stream_data(message.payload)
+        return True
+
+    def process_stream_data(self, summary):
+        """Обработка завершенного потокового сеанса"""
+        stream = self.finished_streams.popleft() if self.finished_streams else None
+        if stream is None:
+            print("Нет данных потокового режима")
+            return False
+
+        print("\n" + "="*60)
+        print(f"ПОТОКОВАЯ СЕССИЯ: {stream.session_id}")
+        print(f"ПРИНЯТО ЗАПИСЕЙ: {stream.count:,} из {summary.get('pulses', 0):,}")
+        print(f"ПОТЕРЯНО: {stream.lost:,} | НЕ ПО ПОРЯДКУ: {stream.out_of_order:,} | "
+              f"ПОВРЕЖДЕНО БАЙТ: {self.reader.corrupt_bytes if self.reader else 0:,}")
+        print("-"*60)
+        description = stream.stats.describe()
+        for line in format_stats(description['latency'], "LATENCY") + \
+                format_stats(description['jitter'], "JITTER"):
+            print(line)
+        print("="*60 + "\n")
+
+        breakdown = self.board_breakdown(stream)
+        self.total_stats.merge(stream.stats)
+        self.last_stream = stream
+        self.save_stream_to_store(stream, summary, breakdown)
+        return True
+
+    def board_breakdown(self, stream):
+        """Разложение задержек сессии по событиям платы (если их принимаем)"""
+        started = getattr(stream, 'started_at', None)
+        stopped = getattr(stream, 'stopped_at', None)
+        if self.board_trace is None or started is None or stopped is None:
+            return None
+        self.board_trace.wait_settled(stopped)
+        events = self.board_trace.events(started - 0.05, stopped + 0.05, EDGE_FALLING)
+        table, info = decompose(stream.arrays(), events)
+        if table is None:
+            print(f"Разложение задержки: {info}")
+            return None
+        for line in format_breakdown(info):
+            print(line)
+        print()
+        return table, info
+
+    def save_stream_to_store(self, stream, summary, breakdown=None):
+        """Сохранение записей потоковой сессии в хранилище"""
+        try:
+            tables = {'samples': stream.arrays()}
+            meta = {
+                'mode': 'stream',
+                'parameters': getattr(stream, 'parameters', {}),
+                'pulses': summary.get('pulses', 0),
+                'dropped_on_device': summary.get('dropped', 0),
+                'lost': stream.lost,
+                'out_of_order': stream.out_of_order,
+                'stats': stream.stats.to_dict(),
+            }
+            if breakdown is not None:
+                tables['breakdown'], meta['breakdown'] = breakdown
+            self.add_telemetry(getattr(stream, 'telemetry', None), tables, meta)
+            entry = self.store.append(stream.session_id, tables, tags=self.tags, meta=meta)
+            self.runs.append(entry)
+            print(f"✓ Сессия сохранена в хранилище: {entry['run_id']}")
+        except Exception as e:
+            print(f"Ошибка при сохранении в хранилище: {e}")
+
+    def add_telemetry(self, recording, tables, meta):
+        """Отсчеты платы за сессию - таблицей telemetry рядом с задержками"""
+        if recording is None or not self.telemetry:
+            return
+        result = self.telemetry.collect(recording)
+        if result is None:
+            return
+        tables['telemetry'], meta['telemetry'] = result
+        for line in format_telemetry(*result):
+            print(line)
+
+    def print_total_stats(self):
+        """Вывод объединенной статистики всех потоковых сессий"""
+        if self.total_stats.latency.total == 0:
+            print("Нет данных потокового режима")
+            return
+        description = self.total_stats.describe()
+        print(f"\nСЕССИЙ: {self.total_stats.sessions}")
+        for line in format_stats(description['latency'], "LATENCY") + \
+                format_stats(description['jitter'], "JITTER"):
+            print(line)
+
     def get_status(self):
         """Получить статус"""
         self.send_command("STATUS")
@@ -125,22 +453,9 @@ class ArduinoDataReceiver:
         if "session_id" in data:
             self.session_id = data["session_id"]
         
-        # Сохраняем последние данные
+        # Сохраняем последние данные (все сессии - в хранилище)
         self.last_data_received = data
         
-        # Сохраняем усредненные данные
-        measurements = {
-            'session_id': data.get('session_id', 'unknown'),
-            'timestamp': datetime.now(),
-            'avg_latency_us': data.get('avg_latency_us', []),
-            'min_latency_us': data.get('min_latency_us', []),
-            'max_latency_us': data.get('max_latency_us', []),
-            'avg_jitter_us': data.get('avg_jitter_us', []),
-            'statistics': data.get('statistics', {})
-        }
-        
-        self.data.append(measurements)
-        
         # Получаем параметры измерений
         params = data.get('parameters', {})
         delay_between_pulses = params.get('delay_between_pulses_us', 0)
@@ -169,6 +484,14 @@ class ArduinoDataReceiver:
             if jitter_stats:
                 print(f"\nСТАТИСТИКА JITTER (мкс):")
                 print(f"  СРЕДНИЙ (по всем группам): {jitter_stats.get('overall_avg_us', 0):.2f}")
+
+            # Распределение по группам считаем сами: Arduino присылает только средние
+            group_stats = self.group_statistics(data)
+            if group_stats:
+                print("\nРАСПРЕДЕЛЕНИЕ ПО ГРУППАМ (мкс):")
+                print(f"  P50/P99 СРЕДНИХ: {group_stats['avg_p50_us']:.2f} / {group_stats['avg_p99_us']:.2f}")
+                print(f"  P99 МАКСИМУМОВ: {group_stats['max_p99_us']:.2f}")
+                print(f"  МАКС. РАЗБРОС В ГРУППЕ: {group_stats['max_variation_us']:.2f}")
             print("="*60 + "\n")
         
         # Автоматически строим графики
@@ -179,131 +502,71 @@ class ArduinoDataReceiver:
         
         return True
     
+    @staticmethod
+    def group_arrays(data):
+        """Групповые массивы из ответа Arduino в виде numpy"""
+        keys = ['avg_latency_us', 'min_latency_us', 'max_latency_us', 'avg_jitter_us']
+        if not all(key in data for key in keys):
+            return None
+        arrays = {key: np.asarray(data[key], dtype=np.float64) for key in keys}
+        arrays['latency_variation_us'] = arrays['max_latency_us'] - arrays['min_latency_us']
+        return arrays
+
+    def group_statistics(self, data):
+        """Статистика по групповым значениям сессии"""
+        arrays = self.group_arrays(data)
+        if arrays is None or len(arrays['avg_latency_us']) == 0:
+            return None
+        avg_p50, avg_p99 = np.percentile(arrays['avg_latency_us'], [50, 99])
+        return {
+            'avg_p50_us': float(avg_p50),
+            'avg_p99_us': float(avg_p99),
+            'max_p99_us': float(np.percentile(arrays['max_latency_us'], 99)),
+            'max_variation_us': float(arrays['latency_variation_us'].max()),
+        }
+
     def generate_mixed_plots(self, data):
-        try:
-            # Проверяем наличие необходимых данных
-            if "avg_latency_us" not in data:
-                print("Нет данных для построения графиков")
-                return
-            
-            avg_latency = data['avg_latency_us']
-            min_latency = data['min_latency_us']
-            max_latency = data['max_latency_us']
-            avg_jitter = data['avg_jitter_us']
-            
-            # Получаем общие средние значения из статистики
-            stats = data.get('statistics', {})
-            total_avg_latency = stats.get('latency', {}).get('overall_avg_us', 0)
-            total_avg_jitter = stats.get('jitter', {}).get('overall_avg_us', 0)
-            
-            # Получаем параметры измерений
-            params = data.get('parameters', {})
-            delay_between_pulses = params.get('delay_between_pulses_us', 0)
-            groups_count = data.get('groups_count', 0)
-            measurements_per_group = data.get('measurements_per_group', 0)
-            
-            # Создаем директорию если ее нет
-            data_dir = "arduino_measurements"
-            if not os.path.exists(data_dir):
-                os.makedirs(data_dir)
-            
-            # Создаем 2 графика (1x2)
-            fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-            
-            session_id = data.get('session_id', 'unknown')
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Обновленный заголовок с delay_between_pulses
-            fig.suptitle(f'Latency & Jitter Analysis | Session: {session_id}\n'
-                        f'Delay: {delay_between_pulses:,} µs | {timestamp}', 
-                        fontsize=14, fontweight='bold')
-            
-            # Импортируем необходимый модуль
-            from matplotlib.ticker import MaxNLocator
-            
-            # 1. График latency с диапазоном min-max
-            if len(avg_latency) > 0:
-                # Явно создаем список целых чисел для групп
-                groups = list(range(1, len(avg_latency) + 1))
-                
-                # Основная линия - средние значения
-                line1 = axes[0].plot(groups, avg_latency, 'b.-', markersize=8, linewidth=2, 
-                                label=f'Средняя latency по группам')[0]
-                
-                # Область min-max (заливка)
-                fill = axes[0].fill_between(groups, min_latency, max_latency, 
-                                        alpha=0.2, color='blue', label='Диапазон min-max')
-                
-                # Точки min и max
-                scatter_min = axes[0].scatter(groups, min_latency, color='green', s=20, 
-                                            marker='^', alpha=0.6, label=f'Min: {min(min_latency):.1f} µs')
-                scatter_max = axes[0].scatter(groups, max_latency, color='red', s=20, 
-                                            marker='v', alpha=0.6, label=f'Max: {max(max_latency):.1f} µs')
-                
-                # Линия общего среднего значения latency (горизонтальная)
-                axes[0].axhline(y=total_avg_latency, color='black', linestyle='--', 
-                            linewidth=2, alpha=0.7, 
-                            label=f'Общ. среднее: {total_avg_latency:.1f} µs')
-                
-                # Устанавливаем целочисленные метки на оси X
-                axes[0].xaxis.set_major_locator(MaxNLocator(integer=True))
-                axes[0].set_xticks(groups)  # Явно задаем позиции меток
-                
-                # Обновленный заголовок для первого графика с информацией о группах
-                axes[0].set_title(f'Latency по группам ({groups_count}×{measurements_per_group} измерений)', 
-                                fontsize=12)
-                axes[0].set_xlabel('Номер группы')
-                axes[0].set_ylabel('Latency (µs)')
-                axes[0].grid(True, alpha=0.3)
-                axes[0].legend(loc='best', fontsize=9)
-            
-            # 2. График среднего jitter (простая линия)
-            if len(avg_jitter) > 0:
-                # Используем тот же список групп
-                groups = list(range(1, len(avg_jitter) + 1))
-                
-                # Простая линия для среднего jitter
-                line2 = axes[1].plot(groups, avg_jitter, 'g.-', markersize=8, linewidth=2,
-                                label='Средний jitter по группам')[0]
-                
-                # Линия общего среднего значения jitter (горизонтальная)
-                axes[1].axhline(y=total_avg_jitter, color='black', linestyle='--', 
-                            linewidth=2, alpha=0.7,
-                            label=f'Общ. среднее: {total_avg_jitter:.1f} µs')
-                
-                # Устанавливаем целочисленные метки на оси X
-                axes[1].xaxis.set_major_locator(MaxNLocator(integer=True))
-                axes[1].set_xticks(groups)  # Явно задаем позиции меток
-                
-                # Обновленный заголовок для второго графика
-                axes[1].set_title(f'Jitter по группам ({groups_count}×{measurements_per_group} измерений)', 
-                                fontsize=12)
-                axes[1].set_xlabel('Номер группы')
-                axes[1].set_ylabel('Jitter (µs)')
-                axes[1].grid(True, alpha=0.3)
-                axes[1].legend(loc='best', fontsize=9)
-            
-            plt.tight_layout(rect=[0, 0, 1, 0.93])  # Немного увеличили отступ сверху для заголовка
-            
-            # Сохраняем график
-            timestamp_file = datetime.now().strftime("%Y%m%d_%H%M%S")
-            plot_filename = f"{data_dir}/latency_jitter_session_{session_id}_{timestamp_file}.png"
-            plt.savefig(plot_filename, dpi=150)
-            print(f"✓ Графики сохранены: {plot_filename}")
-            
-            # Показываем графики
-            plt.show(block=False)
-            plt.pause(0.1)
-            
-            # Закрываем фигуру
-            time.sleep(3)
-            plt.close(fig)
-            
-        except Exception as e:
-            print(f"Ошибка при построении графиков: {e}")
+        """Постановка графиков сессии в очередь отрисовки (не блокирует чтение порта)"""
+        if "avg_latency_us" not in data:
+            print("Нет данных для построения графиков")
+            return False
+        if self.renderer is None:
+            return False
+
+        received_at = datetime.now()
+        session_id = data.get('session_id', 'unknown')
+        board = f"{self.tags['board']}_" if 'board' in self.tags else ""
+        plot_filename = (f"arduino_measurements/latency_jitter_{board}session_{session_id}_"
+                         f"{received_at.strftime('%Y%m%d_%H%M%S')}.png")
+        return self.renderer.submit(plot_filename, render_session_plot, data, plot_filename, received_at)
             
     def save_mixed_data_to_file(self, data):
-        """Сохранение данных в файлы"""
+        """Сохранение данных в хранилище (и в отдельные файлы при legacy_export)"""
+        try:
+            arrays = self.group_arrays(data)
+            if arrays is not None:
+                groups = dict(arrays)
+                groups['group_num'] = np.arange(1, len(arrays['avg_latency_us']) + 1)
+                meta = {key: value for key, value in data.items() if key not in groups}
+                meta['mode'] = 'groups'
+                tables = {'groups': groups}
+                if self.telemetry:
+                    recording = self.finished_telemetry.pop(data.get('session_id'), None)
+                    if recording is None:
+                        print(f"Нет телеметрии платы для сессии {data.get('session_id', '?')}")
+                    self.add_telemetry(recording, tables, meta)
+                entry = self.store.append(data.get('session_id', 'unknown'), tables,
+                                          tags=self.tags, meta=meta)
+                self.runs.append(entry)
+                print(f"✓ Сессия сохранена в хранилище: {entry['run_id']}")
+        except Exception as e:
+            print(f"Ошибка при сохранении в хранилище: {e}")
+
+        if self.legacy_export:
+            self.export_session_files(data)
+
+    def export_session_files(self, data):
+        """Сохранение сессии в отдельные JSON и CSV файлы"""
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             session_id = data.get('session_id', 'unknown')
@@ -319,23 +582,18 @@ class ArduinoDataReceiver:
                 json.dump(data, f, indent=2)
             print(f"✓ JSON сохранен: {json_filename}")
             
-            # Сохраняем CSV если есть данные
-            if all(key in data for key in ['avg_latency_us', 'min_latency_us', 'max_latency_us',
-                                          'avg_jitter_us']):
-                groups_count = len(data['avg_latency_us'])
-                df_data = {
-                    'group_num': list(range(1, groups_count + 1)),
-                    'avg_latency_us': data['avg_latency_us'],
-                    'min_latency_us': data['min_latency_us'],
-                    'max_latency_us': data['max_latency_us'],
-                    'latency_variation_us': [max_val - min_val for max_val, min_val in 
-                                           zip(data['max_latency_us'], data['min_latency_us'])],
-                    'avg_jitter_us': data['avg_jitter_us']
-                }
-                
-                df = pd.DataFrame(df_data)
+            # Сохраняем CSV если есть данные (те же столбцы, что писал pandas.to_csv)
+            arrays = self.group_arrays(data)
+            if arrays is not None:
+                groups_count = len(arrays['avg_latency_us'])
+                columns = ['avg_latency_us', 'min_latency_us', 'max_latency_us',
+                           'latency_variation_us', 'avg_jitter_us']
                 csv_filename = f"{data_dir}/latency_jitter_session_{session_id}_{timestamp}.csv"
-                df.to_csv(csv_filename, index=False)
+                with open(csv_filename, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['group_num'] + columns)
+                    writer.writerows(zip(range(1, groups_count + 1),
+                                         *(arrays[column].tolist() for column in columns)))
                 print(f"✓ CSV сохранен: {csv_filename}")
                 
         except Exception as e:
@@ -346,29 +604,14 @@ class ArduinoDataReceiver:
         print("\n" + "="*60)
         print("ИНТЕРАКТИВНЫЙ РЕЖИМ УПРАВЛЕНИЯ ARDUINO")
         print("="*60)
-        print("Команды: start, send, status, reset, summary, save, help, exit")
+        print("Команды: start, send, live, stream, stop, status, reset, stats, summary, save, tag, help, exit")
         print("="*60)
         
         try:
             while True:
-                # Читаем сообщения от Arduino
-                message = self.read_json_message()
-                if message:
-                    status = message.get('status', '')
-                    
-                    if status == 'data_ready':
-                        print(f"\n✓ [ARDUINO] {message.get('message', '')}")
-                        print("   Используйте 'send' для получения данных и графиков")
-                    elif status == 'started':
-                        print(f"\n✓ [ARDUINO] {message.get('message', '')}")
-                    elif status == 'sending':
-                        print(f"\n✓ [ARDUINO] {message.get('message', '')}")
-                    elif status == 'error':
-                        print(f"\n✗ [ARDUINO] Ошибка: {message.get('message', '')}")
-                    elif "avg_latency_us" in message:
-                        print("\n✓ [ARDUINO] Получены данные измерений!")
-                        # Автоматическая обработка
-                        self.process_data_with_plot(message)
+                # Сообщения Arduino выводятся потоком чтения; здесь
+                # обрабатываем только результаты, пришедшие без запроса
+                self.process_pending_data()
                 
                 # Проверяем ввод пользователя
                 cmd = input("\nВведите команду: ").strip().lower()
@@ -378,28 +621,48 @@ class ArduinoDataReceiver:
                 elif cmd == "send":
                     print("Запрос данных...")
                     self.request_data()
+                elif cmd.startswith("live"):
+                    parts = cmd.split()
+                    if len(parts) > 1 and parts[1] == "stream":
+                        self.run_live(int(parts[2]) if len(parts) > 2 else 0)
+                    else:
+                        self.run_live()
+                elif cmd.startswith("stream"):
+                    parts = cmd.split()
+                    self.start_stream(int(parts[1]) if len(parts) > 1 else 0)
+                elif cmd == "stop":
+                    self.stop_stream()
                 elif cmd == "status":
                     self.get_status()
                 elif cmd == "reset":
                     self.reset()
-                elif cmd == "summary":
-                    self.create_summary_plot()
-                elif cmd == "save" and self.data:
+                elif cmd == "stats":
+                    self.print_total_stats()
+                elif cmd.startswith("summary"):
+                    self.create_summary_plot(cmd.split()[1:])
+                elif cmd == "save" and self.runs:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    all_data_filename = f"arduino_measurements/all_sessions_{timestamp}.json"
-                    with open(all_data_filename, 'w') as f:
-                        json.dump(self.data, f, indent=2)
+                    all_data_filename = f"arduino_measurements/all_sessions_{timestamp}.npz"
+                    self.store.export_npz(all_data_filename, self.runs)
                     print(f"✓ Все данные сохранены: {all_data_filename}")
+                elif cmd.startswith("tag"):
+                    self.set_tags(cmd.split()[1:])
                 elif cmd == "help":
                     print("\n" + "="*40)
                     print("КОМАНДЫ:")
                     print("="*40)
                     print("start   - Начать измерения")
                     print("send    - Получить данные и графики (АВТОМАТИЧЕСКИ)")
+                    print("live    - Измерения с живым графиком (закрыть окно или q - прервать)")
+                    print("live stream [N] - То же в потоковом режиме")
+                    print("stream [N] - Потоковый режим: каждое измерение отдельно")
+                    print("stop    - Остановить потоковый режим")
                     print("status  - Статус измерений")
                     print("reset   - Сбросить измерения")
-                    print("summary - График сравнения сессий")
-                    print("save    - Сохранить все данные")
+                    print("stats   - Перцентили по всем потоковым сессиям")
+                    print("summary [k=v ...] [by=k1,k2] - Сводка и графики по сценариям из хранилища")
+                    print("save    - Выгрузить сессии этого запуска в .npz")
+                    print("tag k=v - Теги сценария для следующих сессий (tag без аргументов - показать)")
                     print("exit    - Выход")
                     print("="*40)
                 elif cmd == "exit":
@@ -408,90 +671,237 @@ class ArduinoDataReceiver:
                 else:
                     print("Неизвестная команда. Введите 'help'")
                 
-                time.sleep(0.1)
-                
         except KeyboardInterrupt:
             print("\nПрервано пользователем")
         except Exception as e:
             print(f"\nОшибка: {e}")
         finally:
-            if self.ser:
-                self.ser.close()
-                print("Соединение закрыто")
-    
-    def create_summary_plot(self):
-        if not self.data:
-            print("Нет данных для построения сводного графика")
+            self.close()
+
+    def set_tags(self, items):
+        """Установка тегов сценария (rt, stress, priority и т.п.)"""
+        try:
+            self.tags.update(parse_tags(items))
+        except ValueError as e:
+            print(e)
+        print(f"Теги: {self.tags if self.tags else 'нет'}")
+
+    def process_pending_data(self):
+        """Обработка накопившихся в очереди результатов измерений"""
+        if not self.reader:
             return
-        
+        while True:
+            message = self.reader.get_nowait()
+            if message is None:
+                return
+            if message.kind == MSG_DATA:
+                self.process_data_with_plot(message.payload)
+            elif message.status == 'stream_stopped':
+                self.process_stream_data(message.payload)
+    
+    def create_summary_plot(self, items=()):
+        """Сводка по всем сессиям хранилища: таблица, JSON и графики по сценариям.
+
+        items - теги отбора ключ=значение и группировка by=тег1,тег2
+        (по умолчанию by=scenario).
+        """
+        group_by = ['scenario']
+        filters = []
+        for item in items:
+            if item.startswith("by="):
+                group_by = [name for name in item[3:].split(",") if name]
+            else:
+                filters.append(item)
         try:
-            fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-            
-            # Импортируем необходимый модуль
-            from matplotlib.ticker import MaxNLocator
-            
-            for i, session in enumerate(self.data):
-                session_id = session.get('session_id', f'Session_{i}')
-                
-                # Проверяем тип данных
-                if 'avg_latency_us' in session:
-                    # Latency/Jitter данные
-                    avg_latency = session['avg_latency_us']
-                    avg_jitter = session['avg_jitter_us']
-                    
-                    if avg_latency and len(avg_latency) > 0:
-                        groups = list(range(1, len(avg_latency) + 1))
-                        axes[0].plot(groups, avg_latency, '.-', 
-                                    label=session_id, alpha=0.7)
-                    
-                    if avg_jitter and len(avg_jitter) > 0:
-                        groups = list(range(1, len(avg_jitter) + 1))
-                        axes[1].plot(groups, avg_jitter, '.-', 
-                                    label=session_id, alpha=0.7)
-            
-            # Устанавливаем целочисленные метки на обеих осях X
-            axes[0].xaxis.set_major_locator(MaxNLocator(integer=True))
-            axes[1].xaxis.set_major_locator(MaxNLocator(integer=True))
-            
-            axes[0].set_title('Сравнение среднего Latency между сессиями')
-            axes[0].set_xlabel('Номер группы')
-            axes[0].set_ylabel('Latency (µs)')
-            axes[0].legend()
-            axes[0].grid(True, alpha=0.3)
-            
-            axes[1].set_title('Сравнение среднего Jitter между сессиями')
-            axes[1].set_xlabel('Номер группы')
-            axes[1].set_ylabel('Jitter (µs)')
-            axes[1].legend()
-            axes[1].grid(True, alpha=0.3)
-            
-            plt.tight_layout()
-            
-            # Сохраняем
-            data_dir = "arduino_measurements"
-            if not os.path.exists(data_dir):
-                os.makedirs(data_dir)
-            
+            tags = parse_tags(filters)
+        except ValueError as e:
+            print(e)
+            return None
+
+        summaries = SessionSummary(self.store, group_by).summarize(tags=tags)
+        if not summaries:
+            print("Нет сохраненных сессий для сводки")
+            return None
+
+        print_summary(summaries, group_by)
+        print(f"✓ Сводка сохранена: {write_summary(summaries, group_by)}")
+
+        items = plot_data(summaries)
+        if self.renderer is not None and items:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            plt.savefig(f"{data_dir}/summary_comparison_{timestamp}.png", dpi=150)
-            plt.show(block=False)
-            print("✓ Сводный график сохранен")
-            
-            time.sleep(3)
-            plt.close()
-            
-        except Exception as e:
-            print(f"Ошибка при построении сводного графика: {e}")
+            title = f"Сравнение сценариев ({', '.join(group_by)}) | {len(summaries)} групп запусков"
+            plot_filename = f"arduino_measurements/summary_comparison_{timestamp}.png"
+            self.renderer.submit(plot_filename, render_summary_plot, items, plot_filename, title)
+        return summaries
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Система измерения Arduino <-> Lichee")
+    parser.add_argument('--port', help="последовательный порт Arduino (по умолчанию - автопоиск)")
+    parser.add_argument('--baudrate', type=int, default=500000)
+    parser.add_argument('--store', default="arduino_measurements/store",
+                        help="каталог хранилища сессий")
+    parser.add_argument('--tag', action='append', default=[], metavar='КЛЮЧ=ЗНАЧЕНИЕ',
+                        help="тег сценария, например rt=1 stress=1 priority=99")
+    parser.add_argument('--legacy-export', action='store_true',
+                        help="дополнительно сохранять JSON и CSV на каждую сессию")
+    parser.add_argument('--campaign', metavar='ФАЙЛ',
+                        help="прогнать сценарии из JSON-файла без интерактивного режима")
+    parser.add_argument('--fleet', action='store_true',
+                        help="прогнать кампанию одновременно на всех найденных стендах")
+    parser.add_argument('--ports', nargs='+', metavar='ПОРТ',
+                        help="порты стендов для --fleet (по умолчанию - все найденные Arduino)")
+    parser.add_argument('--boards', metavar='ФАЙЛ',
+                        help="JSON с именами плат: {\"порт или серийный номер\": \"имя\"}")
+    parser.add_argument('--no-plots', action='store_true', help="не строить графики сессий")
+    parser.add_argument('--plot-workers', type=int, default=1,
+                        help="число процессов для построения графиков")
+    parser.add_argument('--plot-queue', type=int, default=4,
+                        help="сколько графиков может ждать отрисовки")
+    parser.add_argument('--plot-policy', choices=PLOT_POLICIES, default='coalesce',
+                        help="что делать, если отрисовка не успевает: ждать, пропускать "
+                             "новые или заменять ожидающие")
+    parser.add_argument('--summary', nargs='?', const='scenario', metavar='ТЕГИ',
+                        help="сводка по хранилищу без подключения к Arduino: группировка по "
+                             "тегам через запятую (по умолчанию scenario), отбор - через --tag")
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help="измерить время импорта модулей и выйти")
+    parser.add_argument('--live-fps', type=float, default=5,
+                        help="сколько раз в секунду обновлять живой график (команда live)")
+    parser.add_argument('--capture', nargs='?', const='auto', metavar='ФАЙЛ',
+                        help="записывать весь обмен с Arduino с временами приема "
+                             "(по умолчанию arduino_measurements/capture_<время>.scap)")
+    parser.add_argument('--replay', metavar='ФАЙЛ',
+                        help="прогнать записанный захват через разбор, статистику и хранилище")
+    parser.add_argument('--board-trace', nargs='?', type=int, const=9200, metavar='ПОРТ',
+                        help="принимать по UDP события ответов от lichee_example.c и раскладывать "
+                             "задержку потоковых сессий на составляющие (по умолчанию порт 9200)")
+    parser.add_argument('--telemetry', metavar='ХОСТ[:ПОРТ]',
+                        help="записывать счетчики платы (board_telemetry.py на плате, порт 9300) "
+                             "на время каждой сессии")
+    parser.add_argument('--replay-speed', type=float, default=0, metavar='X',
+                        help="скорость воспроизведения: 1 - реальное время, 0 - без пауз")
+    args = parser.parse_args()
+    if args.fleet and not args.campaign:
+        parser.error("для --fleet нужен файл сценариев --campaign")
+    try:
+        args.tags = parse_tags(args.tag)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def benchmark_startup(repeats=5):
+    """Время импорта модулей в чистом интерпретаторе (медиана из repeats запусков).
+
+    Каждый импорт выполняется в отдельном процессе, чтобы не мешал кэш
+    sys.modules. Для pc_example дополнительно проверяется, что тяжелые
+    зависимости не загружаются при запуске.
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    probe = ("import sys, time, json; t = time.perf_counter(); import {module}; "
+             "print(json.dumps([time.perf_counter() - t, "
+             "[m for m in {heavy!r} if m in sys.modules]]))")
+    modules = ['numpy', 'serial', 'pc_example', 'pandas', 'matplotlib.pyplot']
+
+    print(f"\nВРЕМЯ ИМПОРТА (медиана из {repeats}, мс):")
+    regressions = []
+    for module in modules:
+        times = []
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, '-c', probe.format(module=module, heavy=HEAVY_MODULES)],
+                                    cwd=here, capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+            times.append(elapsed * 1000)
+        if not times:
+            print(f"  {module:<18} не установлен")
+            continue
+        print(f"  {module:<18} {np.median(times):8.1f}")
+        if module == 'pc_example' and loaded:
+            regressions = loaded
+
+    if regressions:
+        print(f"✗ При запуске pc_example загружаются: {', '.join(regressions)}")
+        return False
+    print("✓ Тяжелые зависимости при запуске не загружаются")
+    return True
+
+def run_fleet(args, renderer):
+    """Кампания на всех стендах сразу, с общим хранилищем и пулом отрисовки"""
+    store = SessionStore(args.store)
+
+    def make_receiver(bench):
+        # Отрисовка общая: PlotRenderer закрывается один раз в конце
+        receiver = ArduinoDataReceiver(bench.port, args.baudrate, store, args.tags,
+                                       args.legacy_export, renderer,
+                                       capture=capture_path(args.capture, bench.name)
+                                       if args.capture else None)
+        receiver.owns_renderer = False
+        return receiver
+
+    try:
+        benches = discover_benches(ArduinoDataReceiver, args.ports, args.boards)
+        if not benches:
+            print("Стенды не найдены")
+            return
+        FleetRunner(make_receiver, benches, load_scenarios(args.campaign)).run()
+    finally:
+        if renderer:
+            renderer.close()
 
 def main():
     """Основная функция"""
+    args = parse_args()
+
+    if args.benchmark_startup:
+        sys.exit(0 if benchmark_startup() else 1)
+
     print("="*60)
     print("СИСТЕМА ИЗМЕРЕНИЯ ARDUINO <-> LICHEE")
     print("="*60)
     print("Автоматическое построение графиков при команде 'send'")
     print("="*60)
     
-    receiver = ArduinoDataReceiver()
+    renderer = None if args.no_plots else PlotRenderer(args.plot_workers, args.plot_queue,
+                                                       args.plot_policy)
+
+    if args.fleet:
+        run_fleet(args, renderer)
+        return
+
+    if args.summary:
+        receiver = ArduinoDataReceiver(store_path=args.store, renderer=renderer)
+        receiver.create_summary_plot(args.tag + [f"by={args.summary}"])
+        receiver.close()
+        return
+
+    if args.replay:
+        receiver = ArduinoDataReceiver(store_path=args.store, tags=args.tags,
+                                       legacy_export=args.legacy_export, renderer=renderer)
+        try:
+            replay(receiver, args.replay, args.replay_speed or None)
+        finally:
+            receiver.close()
+        return
+
+    board_trace = None
+    if args.board_trace:
+        board_trace = BoardTraceCollector(args.board_trace)
+        board_trace.start()
+        print(f"Прием событий платы на UDP-порту {board_trace.port}")
+
+    telemetry = None
+    if args.telemetry:
+        telemetry = TelemetryClient(*parse_address(args.telemetry))
+        telemetry.start()
+
+    receiver = ArduinoDataReceiver(args.port, args.baudrate, args.store,
+                                   args.tags, args.legacy_export, renderer,
+                                   args.live_fps,
+                                   capture_path(args.capture) if args.capture else None,
+                                   board_trace, telemetry)
     
     if not receiver.connect():
         port = input("Введите COM порт вручную: ")
@@ -499,6 +909,16 @@ def main():
         if not receiver.connect():
             return
     
+    if args.campaign:
+        try:
+            CampaignRunner(receiver, load_scenarios(args.campaign)).run()
+        except KeyboardInterrupt:
+            print("\nКампания прервана пользователем")
+            receiver.reset()
+        finally:
+            receiver.close()
+        return
+
     receiver.interactive_mode()
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+"""
+Построение графиков в отдельных процессах.
+
+PlotRenderer отправляет готовые данные сессии в пул процессов (backend
+Agg) и сразу возвращает управление, поэтому поток чтения порта не ждет
+matplotlib. Очередь ожидающих задач ограничена; когда отрисовка не
+успевает и очередь заполнена, задачи ждут места (block), новые
+отбрасываются (skip) или заменяют ожидающую задачу с тем же ключом,
+а без такой - самую старую (coalesce). Пропущенный график выводится.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+# BrokenExecutor - базовый класс BrokenProcessPool; сам пул процессов
+# (multiprocessing) загружается только при первой задаче
+from concurrent.futures import BrokenExecutor
+
+PLOT_POLICIES = ('block', 'skip', 'coalesce')
+
+
+def _pyplot():
+    """matplotlib загружается только в процессах пула"""
+    import matplotlib
+    matplotlib.use("agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+class PlotRenderer:
+    """Очередь задач отрисовки поверх пула процессов"""
+
+    def __init__(self, workers=1, queue_depth=4, policy='coalesce'):
+        if policy not in PLOT_POLICIES:
+            raise ValueError(f"Неизвестная политика {policy}, допустимые: {', '.join(PLOT_POLICIES)}")
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.policy = policy
+        self.skipped = 0
+        self.rendered = 0
+        self.failed = 0
+        self._pool = None
+        self._running = 0
+        self._waiting = OrderedDict()     # (ключ, номер) -> (функция, аргументы)
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def submit(self, key, func, *args):
+        """Постановка задачи; возвращает False, если задача отброшена.
+
+        key - результат задачи (имя файла графика): при политике coalesce
+        и полной очереди новая задача заменяет ожидающую с тем же ключом,
+        а если такой нет - самую старую ожидающую.
+        """
+        with self._condition:
+            if len(self._waiting) >= self.queue_depth and self._running >= self.workers:
+                if self.policy == 'skip':
+                    self.skipped += 1
+                    print(f"Отрисовка не успевает, график пропущен ({key})")
+                    return False
+                if self.policy == 'coalesce':
+                    same = [waiting for waiting in self._waiting if waiting[0] == key]
+                    dropped = same[0] if same else next(iter(self._waiting))
+                    del self._waiting[dropped]
+                    self.skipped += 1
+                    print(f"Отрисовка не успевает, график пропущен ({dropped[0]})")
+                else:
+                    while len(self._waiting) >= self.queue_depth and self._running >= self.workers:
+                        self._condition.wait()
+
+            # Ключи в очереди уникальны: задачи с одним ключом не заменяют друг друга,
+            # пока очередь не заполнена
+            self._sequence += 1
+            self._waiting[(key, self._sequence)] = (func, args)
+            self._dispatch()
+        return True
+
+    def _dispatch(self):
+        while self._waiting and self._running < self.workers:
+            _, (func, args) = self._waiting.popitem(last=False)
+            try:
+                future = self._executor().submit(func, *args)
+            except BrokenExecutor as e:
+                print(f"Ошибка при построении графиков: {e}")
+                self.failed += 1
+                self._reset_pool()
+                continue
+            self._running += 1
+            future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        broken = False
+        failed = True
+        try:
+            filename = future.result()
+            if filename:
+                print(f"✓ Графики сохранены: {filename}")
+            failed = False
+        except BrokenExecutor as e:
+            print(f"Ошибка при построении графиков: {e}")
+            broken = True
+        except Exception as e:
+            print(f"Ошибка при построении графиков: {e}")
+
+        with self._condition:
+            self._running -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.rendered += 1
+            if broken:
+                # Упавший процесс ломает весь пул - следующая задача создаст новый
+                self._reset_pool()
+            self._dispatch()
+            self._condition.notify_all()
+
+    def _reset_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: дочерние процессы не наследуют поток чтения порта
+            self._pool = ProcessPoolExecutor(self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def pending(self):
+        with self._condition:
+            return self._running + len(self._waiting)
+
+    def close(self, wait=True):
+        """Завершение пула; при wait=True дожидается ожидающих задач"""
+        with self._condition:
+            if wait:
+                while self._running or self._waiting:
+                    self._condition.wait()
+            else:
+                self._waiting.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+
+
+def render_session_plot(data, plot_filename, received_at):
+    """Графики latency и jitter по группам одной сессии (выполняется в процессе пула)"""
+    plt = _pyplot()
+
+    avg_latency = data['avg_latency_us']
+    min_latency = data['min_latency_us']
+    max_latency = data['max_latency_us']
+    avg_jitter = data['avg_jitter_us']
+
+    # Получаем общие средние значения из статистики
+    stats = data.get('statistics', {})
+    total_avg_latency = stats.get('latency', {}).get('overall_avg_us', 0)
+    total_avg_jitter = stats.get('jitter', {}).get('overall_avg_us', 0)
+
+    # Получаем параметры измерений
+    params = data.get('parameters', {})
+    delay_between_pulses = params.get('delay_between_pulses_us', 0)
+    groups_count = data.get('groups_count', 0)
+    measurements_per_group = data.get('measurements_per_group', 0)
+
+    # Создаем директорию если ее нет
+    os.makedirs(os.path.dirname(plot_filename) or ".", exist_ok=True)
+
+    # Создаем 2 графика (1x2)
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+
+    session_id = data.get('session_id', 'unknown')
+    timestamp = received_at.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Обновленный заголовок с delay_between_pulses
+    fig.suptitle(f'Latency & Jitter Analysis | Session: {session_id}\n'
+                f'Delay: {delay_between_pulses:,} µs | {timestamp}', 
+                fontsize=14, fontweight='bold')
+
+    # Импортируем необходимый модуль
+    from matplotlib.ticker import MaxNLocator
+
+    # 1. График latency с диапазоном min-max
+    if len(avg_latency) > 0:
+        # Явно создаем список целых чисел для групп
+        groups = list(range(1, len(avg_latency) + 1))
+
+        # Основная линия - средние значения
+        axes[0].plot(groups, avg_latency, 'b.-', markersize=8, linewidth=2, 
+                     label=f'Средняя latency по группам')
+
+        # Область min-max (заливка)
+        axes[0].fill_between(groups, min_latency, max_latency, 
+                             alpha=0.2, color='blue', label='Диапазон min-max')
+
+        # Точки min и max
+        axes[0].scatter(groups, min_latency, color='green', s=20, 
+                        marker='^', alpha=0.6, label=f'Min: {min(min_latency):.1f} µs')
+        axes[0].scatter(groups, max_latency, color='red', s=20, 
+                        marker='v', alpha=0.6, label=f'Max: {max(max_latency):.1f} µs')
+
+        # Линия общего среднего значения latency (горизонтальная)
+        axes[0].axhline(y=total_avg_latency, color='black', linestyle='--', 
+                    linewidth=2, alpha=0.7, 
+                    label=f'Общ. среднее: {total_avg_latency:.1f} µs')
+
+        # Устанавливаем целочисленные метки на оси X
+        axes[0].xaxis.set_major_locator(MaxNLocator(integer=True))
+        axes[0].set_xticks(groups)  # Явно задаем позиции меток
+
+        # Обновленный заголовок для первого графика с информацией о группах
+        axes[0].set_title(f'Latency по группам ({groups_count}×{measurements_per_group} измерений)', 
+                        fontsize=12)
+        axes[0].set_xlabel('Номер группы')
+        axes[0].set_ylabel('Latency (µs)')
+        axes[0].grid(True, alpha=0.3)
+        axes[0].legend(loc='best', fontsize=9)
+
+    # 2. График среднего jitter (простая линия)
+    if len(avg_jitter) > 0:
+        # Используем тот же список групп
+        groups = list(range(1, len(avg_jitter) + 1))
+
+        # Простая линия для среднего jitter
+        axes[1].plot(groups, avg_jitter, 'g.-', markersize=8, linewidth=2,
+                     label='Средний jitter по группам')
+
+        # Линия общего среднего значения jitter (горизонтальная)
+        axes[1].axhline(y=total_avg_jitter, color='black', linestyle='--', 
+                    linewidth=2, alpha=0.7,
+                    label=f'Общ. среднее: {total_avg_jitter:.1f} µs')
+
+        # Устанавливаем целочисленные метки на оси X
+        axes[1].xaxis.set_major_locator(MaxNLocator(integer=True))
+        axes[1].set_xticks(groups)  # Явно задаем позиции меток
+
+        # Обновленный заголовок для второго графика
+        axes[1].set_title(f'Jitter по группам ({groups_count}×{measurements_per_group} измерений)', 
+                        fontsize=12)
+        axes[1].set_xlabel('Номер группы')
+        axes[1].set_ylabel('Jitter (µs)')
+        axes[1].grid(True, alpha=0.3)
+        axes[1].legend(loc='best', fontsize=9)
+
+    plt.tight_layout(rect=[0, 0, 1, 0.93])  # Немного увеличили отступ сверху для заголовка
+
+    # Сохраняем график
+    fig.savefig(plot_filename, dpi=150)
+    plt.close(fig)
+    return plot_filename
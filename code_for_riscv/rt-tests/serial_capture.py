@@ -0,0 +1,203 @@
+"""
+Запись сырого обмена с Arduino и воспроизведение через конвейер ПК.
+
+Файл захвата (.scap) - только дописывается:
+
+    заголовок   b"SCAP1\\n" и одна строка JSON с параметрами (порт, теги...)
+    записи      <d время приема, с> <B направление> <I длина> <байты>
+
+Направление 0 - принято от Arduino (порция байт из одного read()),
+1 - команда, отправленная ПК. В файл попадает всё, включая строки,
+которые не разобрались как JSON, и поврежденные бинарные записи.
+Буфер сбрасывается на диск не реже раза в секунду; оборванная последняя
+запись при чтении пропускается.
+
+Воспроизведение подает принятые порции в SerialReader.feed() с исходными
+временами приема и тут же обрабатывает результаты, как
+process_pending_data(): статистика, хранилище и графики работают так же,
+как при живом сеансе. Без задержек (speed=None) это заодно
+воспроизводимый замер скорости разбора.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+MAGIC = b"SCAP1\n"
+RECORD = struct.Struct("<dBI")
+RX, TX = 0, 1
+FLUSH_INTERVAL = 1.0
+
+
+class CaptureWriter:
+    """Дописывание сырых порций обмена в файл захвата"""
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "ab", buffering=64 * 1024)
+        if self.file.tell() == 0:
+            header = dict(meta or {})
+            header.setdefault("created", datetime.now().isoformat(timespec="seconds"))
+            self.file.write(MAGIC + json.dumps(header, ensure_ascii=False).encode() + b"\n")
+        self.lock = threading.Lock()
+        self.records = 0
+        self.bytes = 0
+        self._flushed_at = time.monotonic()
+
+    def write(self, direction, data, timestamp=None):
+        """Запись порции; вызывается из потока чтения (RX) и из основного (TX)"""
+        if not data:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(RECORD.pack(timestamp, direction, len(data)))
+            self.file.write(data)
+            self.records += 1
+            self.bytes += len(data)
+            now = time.monotonic()
+            if now - self._flushed_at >= FLUSH_INTERVAL:
+                self.file.flush()
+                self._flushed_at = now
+
+    def received(self, chunk, received_at):
+        self.write(RX, chunk, received_at)
+
+    def sent(self, data):
+        self.write(TX, data)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_header(file):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Не файл захвата (нет заголовка SCAP1)")
+    return json.loads(file.readline())
+
+
+def read_capture(path):
+    """Параметры захвата и генератор записей (время, направление, байты)"""
+    file = open(path, "rb")
+    meta = read_header(file)
+
+    def records():
+        with file:
+            while True:
+                head = file.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                timestamp, direction, length = RECORD.unpack(head)
+                data = file.read(length)
+                if len(data) < length:
+                    # Запись оборвана (сеанс прерван во время сброса буфера)
+                    return
+                yield timestamp, direction, data
+
+    return meta, records()
+
+
+def capture_path(path, suffix=None, directory="arduino_measurements"):
+    """Имя файла захвата: path или capture_<время>.scap, для стенда - с суффиксом"""
+    if not path or path == "auto":
+        path = os.path.join(directory, f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S')}.scap")
+    if suffix:
+        root, ext = os.path.splitext(path)
+        path = f"{root}_{suffix}{ext}"
+    return path
+
+
+def replay(receiver, path, speed=None, show_commands=True):
+    """Подача захвата через конвейер receiver (ArduinoDataReceiver).
+
+    speed=None - без пауз, 1.0 - в реальном времени, 2.0 - вдвое быстрее.
+    Возвращает сводку: порций, байт, время и скорость разбора.
+    """
+    from serial_reader import SerialReader
+
+    meta, records = read_capture(path)
+    print(f"Воспроизведение {path}: порт {meta.get('port', '?')}, "
+          f"записан {meta.get('created', '?')}, теги {meta.get('tags') or 'нет'}")
+
+    # Сессии из захвата отличаются в хранилище тегом replay
+    receiver.tags = {**meta.get("tags", {}), **receiver.tags, "replay": os.path.basename(path)}
+    receiver.reader = SerialReader(None)
+    receiver.register_default_handlers()
+
+    chunks = 0
+    received = 0
+    first = None
+    feed_seconds = 0.0
+    started = time.perf_counter()
+    for timestamp, direction, data in records:
+        if first is None:
+            first = timestamp
+        if speed:
+            delay = (timestamp - first) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        if direction == TX:
+            if show_commands:
+                print(f"> {data.decode('utf-8', errors='replace').strip()}")
+            continue
+
+        feed_started = time.perf_counter()
+        receiver.reader.feed(data, timestamp)
+        feed_seconds += time.perf_counter() - feed_started
+        chunks += 1
+        received += len(data)
+        # Очередь ограничена: результаты обрабатываются сразу, как в интерактивном режиме
+        receiver.process_pending_data()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "chunks": chunks,
+        "bytes": received,
+        "seconds": elapsed,
+        "parse_seconds": feed_seconds,
+        "parse_mb_per_s": received / feed_seconds / 1e6 if feed_seconds else 0.0,
+        "corrupt_bytes": receiver.reader.corrupt_bytes,
+        "dropped": receiver.reader.dropped,
+    }
+    print(f"\nВоспроизведено порций: {chunks:,}, байт: {received:,} за {elapsed:.2f} с; "
+          f"разбор {feed_seconds:.3f} с ({summary['parse_mb_per_s']:.1f} МБ/с), "
+          f"повреждено байт: {summary['corrupt_bytes']:,}")
+    return summary
+
+
+def describe(path):
+    """Краткая сводка по файлу захвата без разбора содержимого"""
+    meta, records = read_capture(path)
+    counts = {RX: [0, 0], TX: [0, 0]}
+    first = last = None
+    commands = []
+    for timestamp, direction, data in records:
+        first = timestamp if first is None else first
+        last = timestamp
+        counts[direction][0] += 1
+        counts[direction][1] += len(data)
+        if direction == TX:
+            commands.append(data.decode("utf-8", errors="replace").strip())
+    print(f"{path}: {json.dumps(meta, ensure_ascii=False)}")
+    if first is not None:
+        print(f"  длительность {last - first:.1f} с")
+    print(f"  принято: {counts[RX][0]:,} порций, {counts[RX][1]:,} байт")
+    print(f"  отправлено команд: {counts[TX][0]}: {', '.join(commands[:20])}"
+          f"{' ...' if len(commands) > 20 else ''}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    for capture in sys.argv[1:]:
+        describe(capture)
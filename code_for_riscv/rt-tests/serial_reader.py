@@ -0,0 +1,217 @@
+"""
+Фоновое чтение последовательного порта Arduino.
+
+Отдельный поток непрерывно вычитывает порт, разбирает строки в сообщения
+и складывает их в ограниченную очередь. Для каждого значения поля
+``status`` можно зарегистрировать обработчик, который вызывается сразу
+при получении сообщения.
+
+В потоковом режиме (между status stream_started и stream_stopped) между
+строками идут бинарные записи binary_stream; они передаются только
+обработчикам MSG_SAMPLES и в очередь не попадают. Так же обрабатываются
+строки о ходе измерений (PROGRESS_STATUSES): они нужны только живому
+графику и не должны вытеснять из очереди результаты.
+"""
+
+import json
+import queue
+import threading
+import time
+
+from binary_stream import FRAME_SIZE, FRAME_SYNC, decode_frames
+
+# Типы сообщений
+MSG_STATUS = "status"   # служебное сообщение с полем status
+MSG_DATA = "data"       # результаты измерений (avg_latency_us и т.п.)
+MSG_RAW = "raw"         # строка, которую не удалось разобрать как JSON
+MSG_SAMPLES = "samples" # пачка бинарных записей потокового режима
+
+JSON_START = ord("{")
+
+# Статусы, которые передаются только обработчикам
+PROGRESS_STATUSES = ("group",)
+
+
+class SerialMessage:
+    """Сообщение от Arduino с временем получения"""
+
+    __slots__ = ("kind", "status", "payload", "raw", "received_at", "claimed")
+
+    def __init__(self, kind, payload=None, raw=b"", received_at=None):
+        self.kind = kind
+        self.payload = payload if payload is not None else {}
+        self.status = self.payload.get("status", "") if isinstance(self.payload, dict) else ""
+        self.raw = raw
+        self.received_at = received_at if received_at is not None else time.time()
+        # Ответ забрал обработчик (command_channel) - в очередь не кладется
+        self.claimed = False
+
+    def __repr__(self):
+        return f"SerialMessage(kind={self.kind!r}, status={self.status!r})"
+
+
+def parse_line(line, received_at=None):
+    """Преобразование одной строки из порта в SerialMessage"""
+    try:
+        payload = json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return SerialMessage(MSG_RAW, raw=line, received_at=received_at)
+
+    if not isinstance(payload, dict):
+        return SerialMessage(MSG_RAW, raw=line, received_at=received_at)
+    if "avg_latency_us" in payload:
+        return SerialMessage(MSG_DATA, payload, line, received_at)
+    return SerialMessage(MSG_STATUS, payload, line, received_at)
+
+
+class SerialReader(threading.Thread):
+    """Поток, вычитывающий порт в ограниченную очередь сообщений"""
+
+    def __init__(self, ser, maxsize=256):
+        super().__init__(name="serial-reader", daemon=True)
+        self.ser = ser
+        self.messages = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._handlers = {}
+        self._handlers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._buffer = bytearray()
+        self.streaming = False
+        self.corrupt_bytes = 0
+        # serial_capture.CaptureWriter: копия всех принятых байт
+        self.capture = None
+
+    def on(self, key, callback):
+        """Регистрация обработчика.
+
+        key - значение поля status, тип сообщения (MSG_DATA, MSG_RAW)
+        или "*" для всех сообщений. Обработчик вызывается в потоке чтения,
+        поэтому должен быть быстрым.
+        """
+        with self._handlers_lock:
+            self._handlers.setdefault(key, []).append(callback)
+
+    def off(self, key, callback):
+        """Удаление обработчика, зарегистрированного через on()"""
+        with self._handlers_lock:
+            callbacks = self._handlers.get(key, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def get(self, timeout=None):
+        """Следующее сообщение из очереди или None по таймауту"""
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_nowait(self):
+        return self.get(timeout=0) if not self.messages.empty() else None
+
+    def clear(self):
+        """Удаление накопившихся сообщений"""
+        while True:
+            try:
+                self.messages.get_nowait()
+            except queue.Empty:
+                return
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # При timeout у порта read() возвращается не позднее него
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    print(f"Ошибка чтения порта: {e}")
+                break
+
+            if chunk:
+                received_at = time.time()
+                if self.capture is not None:
+                    self.capture.received(chunk, received_at)
+                self.feed(chunk, received_at)
+
+    def feed(self, chunk, received_at):
+        """Разбор очередной порции байт из порта"""
+        self._buffer += chunk
+        while self._buffer:
+            if self.streaming and self._buffer[0] != JSON_START:
+                if not self._feed_frames(received_at):
+                    return
+                continue
+
+            end = self._buffer.find(b"\n")
+            if end < 0:
+                return
+            line = bytes(self._buffer[:end]).strip()
+            del self._buffer[:end + 1]
+            if line:
+                self._publish(parse_line(line, received_at))
+
+    def _feed_frames(self, received_at):
+        """Разбор бинарных записей в начале буфера.
+
+        Возвращает False, если для продолжения нужно дождаться данных.
+        """
+        if self._buffer[0] == FRAME_SYNC:
+            frames, consumed = decode_frames(self._buffer)
+            if consumed:
+                del self._buffer[:consumed]
+                self._dispatch(SerialMessage(MSG_SAMPLES, {"frames": frames},
+                                             received_at=received_at))
+                return True
+            if len(self._buffer) < FRAME_SIZE:
+                return False
+            # Маркер есть, но CRC не сошелся - сдвигаемся на байт
+            del self._buffer[:1]
+            self.corrupt_bytes += 1
+            return True
+
+        # Мусор между записями: ищем ближайший маркер или начало JSON
+        skip = len(self._buffer)
+        for marker in (FRAME_SYNC, JSON_START):
+            index = self._buffer.find(bytes([marker]))
+            if 0 <= index < skip:
+                skip = index
+        del self._buffer[:skip]
+        self.corrupt_bytes += skip
+        return bool(self._buffer)
+
+    def _publish(self, message):
+        if message.status == "stream_started":
+            self.streaming = True
+        elif message.status == "stream_stopped":
+            self.streaming = False
+
+        self._dispatch(message)
+        if message.claimed or message.status in PROGRESS_STATUSES:
+            return
+
+        # Очередь ограничена: при переполнении выбрасываем самое старое
+        while True:
+            try:
+                self.messages.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.messages.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _dispatch(self, message):
+        with self._handlers_lock:
+            callbacks = (self._handlers.get(message.status, []) if message.status else []) \
+                + self._handlers.get(message.kind, []) \
+                + self._handlers.get("*", [])
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"Ошибка обработчика сообщения {message!r}: {e}")
@@ -0,0 +1,314 @@
+"""
+Колоночное хранилище сессий измерений.
+
+Структура каталога:
+
+    store/
+        sessions.jsonl            индекс: одна строка на каждый запуск
+        <таблица>/schema.json     типы столбцов таблицы
+        <таблица>/<столбец>.bin   значения столбца подряд для всех запусков
+
+Данные только дописываются в конец. Строка индекса пишется после
+столбцов, поэтому оборванная запись не попадает в выборки. Перед
+дописыванием столбцы и индекс обрезаются до того, что учтено в индексе:
+остатки записи, прерванной сбоем, не сдвигают следующие запуски. При
+чтении столбцы открываются через numpy.memmap, и с диска читаются
+только нужные запуски и столбцы.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+INDEX_FILE = "sessions.jsonl"
+SCHEMA_FILE = "schema.json"
+
+# Типы столбцов известных таблиц; для новых таблиц тип берется из данных
+TABLE_SCHEMAS = {
+    'groups': {
+        'group_num': '<u4',
+        'avg_latency_us': '<f4',
+        'min_latency_us': '<f4',
+        'max_latency_us': '<f4',
+        'latency_variation_us': '<f4',
+        'avg_jitter_us': '<f4',
+    },
+    'samples': {
+        'seq': '<i8',
+        'latency_us': '<u4',
+        'jitter_us': '<u4',
+    },
+    'breakdown': {
+        'seq': '<i8',
+        'latency_us': '<u4',
+        'event_ns': '<u8',
+        'irq_ns': '<i8',
+        'kernel_to_user_ns': '<u4',
+        'user_to_pin_ns': '<u4',
+    },
+    'telemetry': {
+        't_ns': '<u8',
+        'metric': '<u2',
+        'value': '<i8',
+    },
+}
+
+
+class SessionStore:
+    """Хранилище запусков с выборкой по сессии, тегам и времени"""
+
+    def __init__(self, path="arduino_measurements/store"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = []
+        self._index_size = 0
+        self._schemas = {}
+        self._memmaps = {}
+        os.makedirs(self.path, exist_ok=True)
+
+    # --- запись -----------------------------------------------------------
+
+    def append(self, session_id, tables, tags=None, meta=None, timestamp=None):
+        """Добавление запуска.
+
+        tables - {таблица: {столбец: массив}}; все столбцы одной таблицы
+        должны быть одной длины. Возвращает строку индекса.
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        run_id = f"{session_id}_{datetime.fromtimestamp(timestamp).strftime('%Y%m%d_%H%M%S_%f')}"
+
+        with self._lock:
+            self._read_index()
+            self._truncate(os.path.join(self.path, INDEX_FILE), self._index_size)
+            entry = {
+                'run_id': run_id,
+                'session_id': session_id,
+                'time': timestamp,
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(timespec='seconds'),
+                'tags': dict(tags or {}),
+                'tables': {},
+                'meta': meta or {},
+            }
+            for table, columns in tables.items():
+                entry['tables'][table] = self._append_table(table, columns)
+
+            with open(os.path.join(self.path, INDEX_FILE), 'a') as f:
+                f.write(json.dumps(entry, separators=(',', ':'), default=_json_default) + "\n")
+        return entry
+
+    def _append_table(self, table, columns):
+        schema = self._schema(table, columns)
+        if set(columns) != set(schema):
+            raise ValueError(f"Столбцы {sorted(columns)} не совпадают со схемой таблицы "
+                             f"{table}: {sorted(schema)}")
+
+        arrays = {name: np.ascontiguousarray(columns[name], dtype=dtype)
+                  for name, dtype in schema.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Столбцы таблицы {table} разной длины")
+        rows = lengths.pop() if lengths else 0
+
+        offset = self._committed_rows(table)
+        for name, array in arrays.items():
+            path = self._column_path(table, name)
+            self._truncate(path, offset * array.itemsize)
+            with open(path, 'ab') as f:
+                f.write(array.tobytes())
+        return {'offset': offset, 'rows': rows}
+
+    def _schema(self, table, columns=None):
+        if table in self._schemas:
+            return self._schemas[table]
+
+        schema_path = os.path.join(self.path, table, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                schema = json.load(f)
+        elif columns is not None:
+            known = TABLE_SCHEMAS.get(table, {})
+            schema = {name: known.get(name, np.asarray(values).dtype.newbyteorder('<').str)
+                      for name, values in columns.items()}
+            os.makedirs(os.path.join(self.path, table), exist_ok=True)
+            with open(schema_path, 'w') as f:
+                json.dump(schema, f, indent=2)
+        else:
+            raise KeyError(f"Таблица {table} не найдена")
+
+        self._schemas[table] = schema
+        return schema
+
+    def _column_path(self, table, column):
+        return os.path.join(self.path, table, f"{column}.bin")
+
+    def _committed_rows(self, table):
+        """Строк таблицы, учтенных в индексе (вызывается под self._lock)"""
+        rows = 0
+        for entry in self._index:
+            part = entry['tables'].get(table)
+            if part is not None:
+                rows = max(rows, part['offset'] + part['rows'])
+        return rows
+
+    @staticmethod
+    def _truncate(path, size):
+        """Отбрасывание хвоста, не учтенного в индексе (оборванная запись)"""
+        if not os.path.exists(path):
+            if size:
+                raise ValueError(f"{path}: нет данных, учтенных в индексе")
+            return
+        actual = os.path.getsize(path)
+        if actual < size:
+            raise ValueError(f"{path}: {actual} байт, а по индексу должно быть не меньше {size}")
+        if actual > size:
+            print(f"Хранилище: отброшено {actual - size} байт оборванной записи в {path}")
+            os.truncate(path, size)
+
+    # --- чтение -----------------------------------------------------------
+
+    def sessions(self, session_id=None, tags=None, since=None, until=None, table=None):
+        """Строки индекса, подходящие под условия.
+
+        tags - {тег: значение или список допустимых значений};
+        since/until - datetime или время в секундах epoch.
+        """
+        since = _as_epoch(since)
+        until = _as_epoch(until)
+        session_ids = None
+        if session_id is not None:
+            session_ids = {str(s) for s in (session_id if isinstance(session_id, (list, tuple, set))
+                                            else [session_id])}
+
+        result = []
+        for entry in self._load_index():
+            if session_ids is not None and str(entry['session_id']) not in session_ids:
+                continue
+            if since is not None and entry['time'] < since:
+                continue
+            if until is not None and entry['time'] > until:
+                continue
+            if table is not None and table not in entry['tables']:
+                continue
+            if tags and not _tags_match(entry['tags'], tags):
+                continue
+            result.append(entry)
+        return result
+
+    def load(self, table, entries=None, columns=None):
+        """Значения столбцов таблицы для выбранных запусков одним массивом.
+
+        Дополнительный столбец run хранит номер запуска в списке entries.
+        """
+        if entries is None:
+            entries = self.sessions(table=table)
+        schema = self._schema(table)
+        columns = list(columns) if columns else list(schema)
+
+        slices = [(i, entry['tables'][table]) for i, entry in enumerate(entries)
+                  if table in entry['tables']]
+        result = {}
+        for name in columns:
+            column = self._memmap(table, name)
+            parts = [column[part['offset']:part['offset'] + part['rows']] for _, part in slices]
+            result[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=schema[name])
+        result['run'] = np.repeat(np.array([i for i, _ in slices], dtype=np.int32),
+                                  [part['rows'] for _, part in slices])
+        return result
+
+    def iter_runs(self, table, entries=None, columns=None):
+        """Запуски по одному: (строка индекса, {столбец: memmap-срез}) без копирования"""
+        if entries is None:
+            entries = self.sessions(table=table)
+        columns = list(columns) if columns else list(self._schema(table))
+        for entry in entries:
+            part = entry['tables'].get(table)
+            if part is None:
+                continue
+            yield entry, {name: self._memmap(table, name)[part['offset']:part['offset'] + part['rows']]
+                          for name in columns}
+
+    def export_npz(self, filename, entries, tables=None):
+        """Выгрузка выбранных запусков в один .npz файл"""
+        arrays = {'index': np.array(json.dumps(entries, default=_json_default))}
+        for table in tables or sorted({t for entry in entries for t in entry['tables']}):
+            for name, values in self.load(table, entries).items():
+                arrays[f"{table}/{name}"] = values
+        np.savez_compressed(filename, **arrays)
+        return filename
+
+    def _memmap(self, table, column):
+        path = self._column_path(table, column)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        cached = self._memmaps.get((table, column))
+        if cached is not None and cached[0] == size:
+            return cached[1]
+
+        dtype = np.dtype(self._schema(table)[column])
+        if size == 0:
+            array = np.zeros(0, dtype=dtype)
+        else:
+            array = np.memmap(path, dtype=dtype, mode='r', shape=(size // dtype.itemsize,))
+        self._memmaps[(table, column)] = (size, array)
+        return array
+
+    def _load_index(self):
+        """Индекс читается целиком один раз, далее дочитываются только новые строки"""
+        path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(path):
+            return self._index
+
+        with self._lock:
+            self._read_index()
+        return self._index
+
+    def _read_index(self):
+        # Вызывается под self._lock
+        path = os.path.join(self.path, INDEX_FILE)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size != self._index_size:
+            with open(path, 'rb') as f:
+                f.seek(self._index_size)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index.append(json.loads(line))
+                    self._index_size += len(line)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _as_epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+def _tags_match(entry_tags, wanted):
+    for key, value in wanted.items():
+        allowed = value if isinstance(value, (list, tuple, set)) else [value]
+        if str(entry_tags.get(key)) not in {str(v) for v in allowed}:
+            return False
+    return True
+
+
+def parse_tags(items):
+    """Разбор тегов вида ключ=значение из командной строки"""
+    tags = {}
+    for item in items or []:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Тег должен иметь вид ключ=значение: {item}")
+        tags[key.strip()] = value.strip()
+    return tags
@@ -0,0 +1,240 @@
+"""
+Сводка по сохраненным сессиям с группировкой по тегам сценария.
+
+Запуски из хранилища делятся на группы по значениям тегов (по умолчанию
+scenario) и режиму измерений, и для каждой группы собирается гистограмма
+LatencyHistogram:
+
+    groups   - средние значения по группам Arduino (столбец avg_latency_us)
+               и отдельно максимумы групп (max_latency_us);
+    stream   - гистограммы потоковых сессий из meta['stats'], отдельные
+               записи с диска не читаются.
+
+Столбцы таблицы groups читаются одним вызовом SessionStore.load и
+раскладываются по сценариям через argsort, поэтому время сводки растет
+линейно с числом строк, а не с числом сессий. Графики (box, violin, CDF)
+строятся по гистограммам: объем данных для отрисовки зависит только от
+числа сценариев и числа корзин.
+"""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from latency_stats import LatencyHistogram, SessionStats, format_stats
+
+MISSING_TAG = "-"
+# Больше сценариев на одном графике не читается
+MAX_PLOTTED = 40
+
+
+class ScenarioSummary:
+    """Распределения одной группы запусков"""
+
+    def __init__(self, key, group_by):
+        self.key = key
+        self.tags = dict(zip(group_by, key[:-1]))
+        self.mode = key[-1]
+        self.runs = 0
+        self.sessions = set()
+        self.stats = SessionStats()
+        self.group_max = LatencyHistogram()
+        self.first = None
+        self.last = None
+
+    @property
+    def label(self):
+        return ", ".join(str(value) for value in self.key)
+
+    def add_entry(self, entry):
+        self.runs += 1
+        self.sessions.add(str(entry['session_id']))
+        self.first = entry['time'] if self.first is None else min(self.first, entry['time'])
+        self.last = entry['time'] if self.last is None else max(self.last, entry['time'])
+
+    def describe(self):
+        result = {
+            'tags': self.tags,
+            'runs': self.runs,
+            'sessions': len(self.sessions),
+            'mode': self.mode,
+            'first': datetime.fromtimestamp(self.first).isoformat(timespec='seconds') if self.first else None,
+            'last': datetime.fromtimestamp(self.last).isoformat(timespec='seconds') if self.last else None,
+        }
+        result.update(self.stats.describe())
+        if self.group_max.total:
+            result['group_max'] = self.group_max.describe()
+        return result
+
+
+class SessionSummary:
+    """Сводка по хранилищу SessionStore"""
+
+    def __init__(self, store, group_by=('scenario',)):
+        self.store = store
+        self.group_by = tuple(group_by)
+
+    def key(self, entry):
+        """Значения тегов группировки и режим: средние групп и отдельные
+        импульсы в одну гистограмму не смешиваются"""
+        tags = entry['tags']
+        mode = 'groups' if 'groups' in entry['tables'] else 'stream'
+        return tuple(str(tags.get(name, MISSING_TAG)) for name in self.group_by) + (mode,)
+
+    def summarize(self, tags=None, since=None, until=None):
+        """Сводки по сценариям, отсортированные по ключу группировки"""
+        entries = self.store.sessions(tags=tags, since=since, until=until)
+        summaries = {}
+        groups_entries = []
+        groups_keys = []
+
+        for entry in entries:
+            key = self.key(entry)
+            summary = summaries.get(key)
+            if summary is None:
+                summary = summaries[key] = ScenarioSummary(key, self.group_by)
+            summary.add_entry(entry)
+
+            if summary.mode == 'groups':
+                groups_entries.append(entry)
+                groups_keys.append(key)
+            elif 'stats' in entry['meta']:
+                summary.stats.merge(SessionStats.from_dict(entry['meta']['stats']))
+
+        if groups_entries:
+            self._add_groups(summaries, groups_entries, groups_keys)
+        return [summaries[key] for key in sorted(summaries)]
+
+    def _add_groups(self, summaries, entries, keys):
+        columns = self.store.load('groups', entries,
+                                  columns=['avg_latency_us', 'max_latency_us', 'avg_jitter_us'])
+        if len(columns['run']) == 0:
+            return
+
+        # Номер сценария для каждой строки и одна сортировка вместо выборки по маске
+        unique_keys = sorted(set(keys))
+        key_index = {key: i for i, key in enumerate(unique_keys)}
+        run_to_key = np.array([key_index[key] for key in keys], dtype=np.int64)
+        row_keys = run_to_key[columns['run']]
+        order = np.argsort(row_keys, kind='stable')
+        bounds = np.searchsorted(row_keys[order], np.arange(len(unique_keys) + 1))
+
+        for i, key in enumerate(unique_keys):
+            rows = order[bounds[i]:bounds[i + 1]]
+            if len(rows) == 0:
+                continue
+            summary = summaries[key]
+            summary.stats.record(np.rint(columns['avg_latency_us'][rows]),
+                                 np.rint(columns['avg_jitter_us'][rows]))
+            summary.group_max.record(np.rint(columns['max_latency_us'][rows]))
+
+
+def plot_data(summaries, bins=100):
+    """Компактные данные для render_summary_plot (передаются в процесс пула)"""
+    items = []
+    for summary in summaries:
+        histogram = summary.stats.latency
+        if histogram.total == 0:
+            continue
+        p = histogram.percentiles((1, 25, 50, 75, 99))
+        # Значения целые: корзин не больше, чем различных значений, иначе часть пустая
+        edges, counts = histogram.buckets(min(bins, histogram.max - histogram.min + 1))
+        items.append({
+            'label': summary.label,
+            'runs': summary.runs,
+            'count': histogram.total,
+            'box': {'med': p[50], 'q1': p[25], 'q3': p[75], 'whislo': p[1], 'whishi': p[99],
+                    'mean': histogram.mean(), 'fliers': [histogram.min, histogram.max]},
+            'edges': edges.tolist(),
+            'counts': counts.tolist(),
+            'min': histogram.min,
+            'max': histogram.max,
+        })
+
+    # При большом числе сценариев оставляем худшие по хвосту задержки
+    if len(items) > MAX_PLOTTED:
+        items = sorted(items, key=lambda item: item['box']['whishi'])[-MAX_PLOTTED:]
+        items.sort(key=lambda item: item['label'])
+    return items
+
+
+def render_summary_plot(items, plot_filename, title):
+    """Box, violin и CDF по сценариям (выполняется в процессе пула)"""
+    from plot_worker import _pyplot
+    plt = _pyplot()
+
+    os.makedirs(os.path.dirname(plot_filename) or ".", exist_ok=True)
+    fig, axes = plt.subplots(3, 1, figsize=(max(12, 4 + len(items) * 0.4), 16))
+    fig.suptitle(title, fontsize=14, fontweight='bold')
+    positions = np.arange(1, len(items) + 1)
+    labels = [f"{item['label']}\n({item['runs']})" for item in items]
+
+    # 1. Box plot по заранее посчитанным перцентилям (усы - P1 и P99)
+    axes[0].bxp([dict(item['box'], label=label) for item, label in zip(items, labels)],
+                positions=positions, showmeans=True)
+    axes[0].set_title('Latency: P1, P25, P50, P75, P99, мин/макс')
+
+    # 2. Violin по корзинам гистограммы
+    vpstats = []
+    for item in items:
+        edges = np.asarray(item['edges'])
+        vpstats.append({
+            'coords': (edges[:-1] + edges[1:]) / 2,
+            'vals': np.asarray(item['counts'], dtype=np.float64),
+            'mean': item['box']['mean'],
+            'median': item['box']['med'],
+            'min': item['min'],
+            'max': item['max'],
+        })
+    axes[1].violin(vpstats, positions=positions, showmedians=True)
+    axes[1].set_title('Распределение latency')
+
+    for ax in axes[:2]:
+        ax.set_xticks(positions)
+        ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=8)
+        ax.set_ylabel('Latency (µs)')
+        ax.grid(True, alpha=0.3)
+
+    # 3. CDF
+    for item in items:
+        counts = np.asarray(item['counts'])
+        cdf = np.cumsum(counts) / max(counts.sum(), 1)
+        axes[2].step(item['edges'][1:], cdf, where='post', label=item['label'])
+    axes[2].set_title('CDF latency')
+    axes[2].set_xlabel('Latency (µs)')
+    axes[2].set_ylabel('Доля измерений')
+    axes[2].grid(True, alpha=0.3)
+    if len(items) <= 12:
+        axes[2].legend(loc='lower right', fontsize=8)
+
+    plt.tight_layout(rect=[0, 0, 1, 0.96])
+    fig.savefig(plot_filename, dpi=150)
+    plt.close(fig)
+    return plot_filename
+
+
+def print_summary(summaries, group_by):
+    print("\n" + "="*60)
+    print(f"СВОДКА ПО СЕССИЯМ (группировка: {', '.join(group_by)})")
+    print("="*60)
+    for summary in summaries:
+        print(f"\n{summary.label}: запусков {summary.runs}, сессий {len(summary.sessions)}")
+        description = summary.stats.describe()
+        title = "  LATENCY" if summary.mode == 'stream' else "  LATENCY (средние групп)"
+        for line in format_stats(description['latency'], title):
+            print(line)
+        if summary.group_max.total:
+            for line in format_stats(summary.group_max.describe(), "  МАКСИМУМЫ ГРУПП"):
+                print(line)
+    print("="*60)
+
+
+def write_summary(summaries, group_by, report_dir="arduino_measurements"):
+    os.makedirs(report_dir, exist_ok=True)
+    filename = os.path.join(report_dir, f"summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(filename, 'w') as f:
+        json.dump({'group_by': list(group_by),
+                   'scenarios': [summary.describe() for summary in summaries]}, f, indent=2)
+    return filename